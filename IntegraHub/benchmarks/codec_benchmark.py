@@ -0,0 +1,74 @@
+"""
+codec_benchmark.py
+
+Mide (sin broker) el costo de serializar el sobre de eventos con cada codec disponible:
+
+- encode:  EventEnvelope.to_dict() -> bytes
+- decode:  bytes -> dict (lo que hace cada consumidor al recibir)
+- header:  lectura de event_id/event_type/correlation_id desde las properties AMQP,
+           sin decodificar el cuerpo (read_event_header)
+- compresión: ratio y costo de compress/decompress (gzip/zstd) del cuerpo JSON de un
+              carrito de --large-items items
+
+Uso (desde IntegraHub/):
+    PYTHONPATH=. python benchmarks/codec_benchmark.py -n 100000 --items 5 --large-items 200
+"""
+
+import argparse
+import time
+import pika
+from shared.infrastructure.codecs import available_codecs, get_codec
+from shared.infrastructure.compression import PayloadCompressor, available_algorithms, decompress
+from shared.infrastructure.messaging import build_event, envelope_properties, read_event_header
+
+def _payload(items: int) -> dict:
+    return {
+        "order_id": "bench-order",
+        "customer_id": "bench-customer",
+        "total_amount": 100.0 * items,
+        "items": [{"product_id": f"prod_{i}", "quantity": 1, "price": 100.0} for i in range(items)],
+        "status": "PENDING"
+    }
+
+def _per_op_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1_000_000
+
+def run_compression(n: int, items: int):
+    _, envelope = build_event("bench", "BenchEvent", _payload(items))
+    body = get_codec("json").encode(envelope.to_dict())
+
+    print(f"\nJSON body of {items} items: {len(body)} bytes")
+    print(f"{'algorithm':<10} {'bytes':>7} {'ratio':>7} {'compress us':>12} {'decompress us':>14}")
+    for algorithm in available_algorithms():
+        compressor = PayloadCompressor(algorithm, threshold_bytes=0)
+        compressed, encoding = compressor.compress(body)
+        compress_us = _per_op_us(lambda: compressor.compress(body), n)
+        decompress_us = _per_op_us(lambda: decompress(compressed, encoding), n)
+        print(f"{algorithm:<10} {len(compressed):>7} {len(compressed) / len(body):>7.3f} "
+              f"{compress_us:>12.2f} {decompress_us:>14.2f}")
+
+def run(n: int, items: int):
+    _, envelope = build_event("bench", "BenchEvent", _payload(items))
+    body = envelope.to_dict()
+
+    print(f"{'codec':<10} {'bytes':>7} {'encode us':>10} {'decode us':>10} {'header us':>10}")
+    for name, codec in available_codecs().items():
+        payload = codec.encode(body)
+        properties = pika.BasicProperties(delivery_mode=2, **envelope_properties(envelope, codec))
+        encode_us = _per_op_us(lambda: codec.encode(body), n)
+        decode_us = _per_op_us(lambda: codec.decode(payload), n)
+        header_us = _per_op_us(lambda: read_event_header(properties), n)
+        print(f"{name:<10} {len(payload):>7} {encode_us:>10.2f} {decode_us:>10.2f} {header_us:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event codec benchmark")
+    parser.add_argument("-n", type=int, default=100000, help="iteraciones por medición")
+    parser.add_argument("--items", type=int, default=5, help="items por orden en el payload")
+    parser.add_argument("--large-items", type=int, default=200, help="items del carrito grande (compresión)")
+    args = parser.parse_args()
+    run(args.n, args.items)
+    # La compresión es mucho más cara por operación: se mide con menos iteraciones.
+    run_compression(max(1, args.n // 10), args.large_items)
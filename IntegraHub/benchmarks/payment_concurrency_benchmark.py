@@ -0,0 +1,98 @@
+"""
+payment_concurrency_benchmark.py
+
+Mide el throughput del consumidor de payment_service (payment_queue) con un gateway que tarda
+--latency-ms por cobro (el MockPaymentGateway tarda 500ms), sobre el broker en memoria (memory://):
+
+- decorator:  el cobro protegido con @breaker (pybreaker retiene su lock durante toda la llamada:
+              los workers se serializan, como antes)
+- concurrent: el mismo breaker vía ConcurrentCircuitBreaker (la llamada corre fuera del lock)
+
+para cada cantidad de workers (pagos en vuelo), con ACKs en orden de entrega. Se reporta
+pagos/segundo hasta que la cola queda vacía y todos los ACK llegaron.
+
+Uso (desde IntegraHub/; no requiere infraestructura):
+    PYTHONPATH=. python benchmarks/payment_concurrency_benchmark.py -n 200 --workers 1 4 16 32
+"""
+
+import argparse
+import io
+import sys
+import time
+import threading
+import uuid
+from pathlib import Path
+import pybreaker
+from shared.infrastructure.memory_broker import InMemoryBroker
+from shared.infrastructure.messaging import channel_pool_from_url
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "services" / "payment_service"))
+from src.domain.ports import PaymentGateway  # noqa: E402
+from src.infrastructure.adapters.circuit_breaker import ConcurrentCircuitBreaker  # noqa: E402
+from src.infrastructure.adapters.rabbitmq_consumer import RabbitMQConsumer  # noqa: E402
+from src.infrastructure.adapters.rabbitmq_publisher import RabbitMQPublisher  # noqa: E402
+
+class SlowGateway(PaymentGateway):
+    """Gateway sin fallos aleatorios: solo la latencia del cobro."""
+    def __init__(self, latency: float, concurrent: bool):
+        breaker = pybreaker.CircuitBreaker(fail_max=3, reset_timeout=10)
+        self.latency = latency
+        self._call = ConcurrentCircuitBreaker(breaker).call if concurrent else breaker.call
+
+    def charge(self, order_id: str, amount: float) -> str:
+        return self._call(self._charge, order_id)
+
+    def _charge(self, order_id: str) -> str:
+        time.sleep(self.latency)
+        return f"trans_{order_id[:8]}"
+
+def _drained(broker: InMemoryBroker) -> bool:
+    queue = broker.stats()["queues"].get("payment_queue", {})
+    return queue.get("messages", 1) == 0 and queue.get("unacked", 0) == 0
+
+def run_mode(label: str, workers: int, concurrent: bool, args) -> dict:
+    broker_name = f"payment-bench-{label}-{workers}"
+    amqp_url = f"memory://{broker_name}"
+    InMemoryBroker.reset(broker_name)
+    broker = InMemoryBroker.named(broker_name)
+
+    consumer = RabbitMQConsumer(amqp_url, publisher_confirms=True, workers=workers,
+                                gateway=SlowGateway(args.latency_ms / 1000.0, concurrent))
+    threading.Thread(target=consumer.start_consuming, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while broker.consumer_count("payment_queue") == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    publisher = RabbitMQPublisher(channel_pool_from_url(amqp_url, max_size=1), confirm_delivery=True)
+    started = time.perf_counter()
+    publisher.publish_batch([("inventory", "InventoryReserved", {"order_id": str(uuid.uuid4())})
+                             for _ in range(args.n)])
+    deadline = time.monotonic() + 600
+    while not _drained(broker) and time.monotonic() < deadline:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    return {"payments_per_s": args.n / elapsed, "seconds": elapsed}
+
+def run(args):
+    report = sys.stdout
+    print(f"{'breaker':>10} {'workers':>8} {'payments':>9} {'payments/s':>11} {'seconds':>8}")
+    for label, concurrent in (("decorator", False), ("concurrent", True)):
+        for workers in args.workers:
+            # Los adaptadores loguean con print: se silencian salvo --verbose. Los consumidores
+            # siguen vivos (hilos daemon) hasta que termina el proceso.
+            if not args.verbose:
+                sys.stdout = io.StringIO()
+            try:
+                result = run_mode(label, workers, concurrent, args)
+            finally:
+                sys.stdout = report
+            print(f"{label:>10} {workers:>8} {args.n:>9} {result['payments_per_s']:>11.1f} "
+                  f"{result['seconds']:>8.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="payment_service bounded-concurrency benchmark")
+    parser.add_argument("-n", type=int, default=200, help="eventos InventoryReserved por corrida")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="pagos en vuelo a comparar")
+    parser.add_argument("--latency-ms", type=int, default=100, help="latencia simulada del gateway")
+    parser.add_argument("--verbose", action="store_true", help="muestra los logs de los adaptadores")
+    run(parser.parse_args())
@@ -0,0 +1,88 @@
+"""
+publish_throughput.py
+
+Mide mensajes publicados por segundo contra un RabbitMQ real, comparando:
+
+- legacy:    exchange_declare antes de cada mensaje, sin confirmación (comportamiento anterior)
+- declared:  topología declarada una vez por canal, sin confirmación
+- confirms:  publisher confirms, un Basic.Ack por mensaje
+- batch:     publish_batch, una confirmación por lote
+- pool:      publisher confirms desde N hilos con RabbitMQChannelPool (simula el threadpool de FastAPI)
+
+Uso (desde IntegraHub/, con RabbitMQ levantado):
+    PYTHONPATH=. python benchmarks/publish_throughput.py --host localhost -n 5000 --batch-size 100 --threads 8
+"""
+
+import argparse
+import threading
+import time
+from shared.infrastructure.messaging import RabbitMQConnection, RabbitMQChannelPool, BasePublisher
+
+PAYLOAD = {
+    "order_id": "bench-order",
+    "customer_id": "bench-customer",
+    "total_amount": 100.0,
+    "items": [{"product_id": "prod_1", "quantity": 1}],
+    "status": "PENDING"
+}
+
+def _legacy_publish(publisher: BasePublisher, n: int):
+    # Reproduce el publish original: un exchange_declare extra por mensaje.
+    for _ in range(n):
+        channel = publisher.connection_wrapper.get_channel()
+        channel.exchange_declare(exchange=publisher.exchange_name, exchange_type='topic', durable=True)
+        routing_key, body, properties = publisher._build_message("bench", "BenchEvent", PAYLOAD)
+        channel.basic_publish(exchange=publisher.exchange_name, routing_key=routing_key, body=body, properties=properties)
+
+def _single_publish(publisher: BasePublisher, n: int):
+    for _ in range(n):
+        publisher.publish("bench", "BenchEvent", PAYLOAD)
+
+def _batch_publish(publisher: BasePublisher, n: int, batch_size: int):
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        publisher.publish_batch([("bench", "BenchEvent", PAYLOAD)] * size)
+
+def _threaded_publish(publisher: BasePublisher, n: int, threads: int):
+    # Reparte n entre los hilos (los primeros n % threads publican uno más).
+    shares = [n // threads + (1 if i < n % threads else 0) for i in range(threads)]
+    workers = [threading.Thread(target=_single_publish, args=(publisher, share)) for share in shares]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def run(host: str, user: str, password: str, n: int, batch_size: int, threads: int):
+    scenarios = {
+        "legacy": (False, lambda p: _legacy_publish(p, n)),
+        "declared": (False, lambda p: _single_publish(p, n)),
+        "confirms": (True, lambda p: _single_publish(p, n)),
+        "batch": (True, lambda p: _batch_publish(p, n, batch_size)),
+        "pool": (True, lambda p: _threaded_publish(p, n, threads)),
+    }
+
+    print(f"{'scenario':<10} {'messages':>9} {'seconds':>9} {'msg/s':>10}")
+    for name, (confirms, scenario) in scenarios.items():
+        if name == "pool":
+            connection = RabbitMQChannelPool(host=host, user=user, password=password, max_size=threads)
+        else:
+            connection = RabbitMQConnection(host=host, user=user, password=password)
+        publisher = BasePublisher(connection, confirm_delivery=confirms)
+        try:
+            started = time.perf_counter()
+            scenario(publisher)
+            elapsed = time.perf_counter() - started
+        finally:
+            connection.close()
+        print(f"{name:<10} {n:>9} {elapsed:>9.3f} {n / elapsed:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publisher throughput benchmark")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="user")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("-n", type=int, default=5000, help="mensajes por escenario")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8, help="hilos del escenario pool")
+    args = parser.parse_args()
+    run(args.host, args.user, args.password, args.n, args.batch_size, args.threads)
@@ -0,0 +1,285 @@
+"""
+saga_benchmark.py
+
+Benchmark end-to-end del saga order -> inventory -> payment -> order/analytics/notification
+en un solo proceso, sin RabbitMQ ni Postgres:
+
+- Transporte: broker en memoria (memory://saga-bench, shared/infrastructure/memory_broker.py)
+  con la misma topología que en producción (topic exchange, DLX/DLQ, retry tiers).
+- Persistencia: los repositorios SQLAlchemy reales de cada servicio sobre archivos SQLite.
+- Casos de uso reales: CreateOrderUseCase (+ OutboxRelay, que publica el outbox en lotes), ReserveInventoryUseCase, ProcessPaymentUseCase,
+  UpdateOrderStatusUseCase, ProcessEventUseCase y NotificationUseCase, con los consumidores
+  de cada servicio.
+- Fakes: gateway de pago con latencia fija y sin fallas; canal de notificación nulo.
+
+Reporta órdenes/segundo, percentiles de latencia de CreateOrderUseCase (lo que paga POST /orders),
+percentiles de latencia end-to-end (desde CreateOrderUseCase hasta que el order_service
+registra CONFIRMED/REJECTED) y el desglose por salto
+(queue_wait / handler / ack por cola y event_type, shared/infrastructure/latency.py).
+
+Uso (desde IntegraHub/):
+    PYTHONPATH=. python benchmarks/saga_benchmark.py -n 2000 --clients 8 --payment-workers 4
+"""
+
+import argparse
+import importlib
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from shared.infrastructure.latency import HOP_LATENCIES, QUEUE_WAIT, HANDLER, ACK
+from shared.infrastructure.memory_broker import InMemoryBroker
+from shared.infrastructure.messaging import connection_from_url, BaseConsumer
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent / "services"
+BROKER_NAME = "saga-bench"
+AMQP_URL = f"memory://{BROKER_NAME}"
+PRODUCT_ID = "prod_1"
+
+def _load_service(service: str, *modules: str):
+    """
+    Importa módulos de services/<service>/src bajo el alias "<service>_src".
+    Cada servicio es un paquete "src" distinto: con alias conviven en un mismo proceso
+    (los imports internos son relativos).
+    """
+    alias = f"{service}_src"
+    if alias not in sys.modules:
+        path = SERVICES_DIR / service / "src"
+        spec = importlib.util.spec_from_file_location(alias, path / "__init__.py",
+                                                      submodule_search_locations=[str(path)])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[alias] = package
+        spec.loader.exec_module(package)
+    return [importlib.import_module(f"{alias}.{module}") for module in modules]
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class SagaTracker:
+    """Registra inicio (cliente) y fin (update de estado en order_service) de cada orden."""
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.started = {}
+        self.finished = {}
+        self.statuses = {}
+        self._lock = threading.Condition()
+
+    def start(self, order_id: str, started_at: float):
+        with self._lock:
+            self.started[order_id] = started_at
+
+    def finish(self, order_id: str, status: str):
+        finished_at = time.perf_counter()
+        with self._lock:
+            if order_id not in self.finished:
+                self.finished[order_id] = finished_at
+                self.statuses[order_id] = status
+                self._lock.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len(self.finished) < self.expected:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    def latencies_ms(self) -> list:
+        with self._lock:
+            return sorted((self.finished[order_id] - started) * 1000.0
+                          for order_id, started in self.started.items() if order_id in self.finished)
+
+def build_pipeline(db_dir: str, tracker: SagaTracker, args):
+    order_services, order_repo_module, order_publisher_module, order_consumer_module, order_outbox_module = \
+        _load_service("order_service", "application.services", "infrastructure.adapters.postgres_repository",
+                      "infrastructure.adapters.rabbitmq_publisher", "infrastructure.adapters.rabbitmq_consumer",
+                      "infrastructure.adapters.outbox_relay")
+    inventory_repo_module, inventory_consumer_module = _load_service(
+        "inventory_service", "infrastructure.adapters.postgres_repository",
+        "infrastructure.adapters.rabbitmq_consumer")
+    payment_ports, payment_consumer_module = _load_service(
+        "payment_service", "domain.ports", "infrastructure.adapters.rabbitmq_consumer")
+    notification_ports, notification_services, notification_consumer_module = _load_service(
+        "notification_service", "domain.ports", "application.services",
+        "infrastructure.adapters.rabbitmq_consumer")
+    analytics_services, analytics_repo_module = _load_service(
+        "analytics_service", "application.services", "infrastructure.adapters.postgres_repository")
+
+    class TrackedOrderRepository(order_repo_module.PostgresOrderRepository):
+        # Fin del saga: el consumidor de order_service persiste el estado final.
+        def update_status(self, order_id: str, status: str):
+            super().update_status(order_id, status)
+            tracker.finish(order_id, status)
+
+        def update_statuses(self, updates: dict) -> int:
+            updated = super().update_statuses(updates)
+            for order_id, status in updates.items():
+                tracker.finish(order_id, status)
+            return updated
+
+    class FakePaymentGateway(payment_ports.PaymentGateway):
+        def charge(self, order_id: str, amount: float) -> str:
+            if args.gateway_latency_ms:
+                time.sleep(args.gateway_latency_ms / 1000.0)
+            return f"trans_{order_id[:8]}"
+
+    class NullChannel(notification_ports.NotificationChannel):
+        def send(self, message: str, recipient: str = None):
+            pass
+
+    def sqlite_url(name: str) -> str:
+        return f"sqlite:///{os.path.join(db_dir, name)}.db"
+
+    order_repository = TrackedOrderRepository(sqlite_url("orders"))
+    inventory_repository = inventory_repo_module.PostgresInventoryRepository(sqlite_url("inventory"))
+    # Stock suficiente para todas las órdenes (el seed trae 100 unidades).
+    inventory_repository.update_stock(PRODUCT_ID, args.n * args.quantity)
+    metrics_repository = analytics_repo_module.PostgresMetricsRepository(sqlite_url("analytics"))
+
+    publisher = order_publisher_module.RabbitMQPublisherAdapter(amqp_url=AMQP_URL, confirm_delivery=True,
+                                                                codec=args.codec, compression=args.compression)
+    create_order = order_services.CreateOrderUseCase(order_repository)
+    outbox_relay = order_outbox_module.OutboxRelay(order_repository, publisher, batch_size=args.outbox_batch)
+
+    inventory_consumer = inventory_consumer_module.RabbitMQConsumer(
+        AMQP_URL, inventory_repository, publisher_confirms=True, workers=args.inventory_workers,
+        codec=args.codec, compression=args.compression)
+    payment_consumer = payment_consumer_module.RabbitMQConsumer(
+        AMQP_URL, publisher_confirms=True, workers=args.payment_workers, codec=args.codec,
+        compression=args.compression, gateway=FakePaymentGateway())
+    notification_consumer = notification_consumer_module.RabbitMQConsumer(
+        AMQP_URL, notification_services.NotificationUseCase(channels=[NullChannel()]),
+        workers=args.notification_workers)
+    order_consumer = order_consumer_module.RabbitMQConsumer(AMQP_URL, order_repository)
+
+    # analytics_service consume con aio-pika; acá se usa el mismo caso de uso sobre BaseConsumer
+    # con la topología del stream processor (analytics_stream_queue, "#", sin DLQ).
+    process_event = analytics_services.ProcessEventUseCase(metrics_repository)
+    analytics_consumer = BaseConsumer(connection_from_url(AMQP_URL), "analytics_stream",
+                                      workers=args.analytics_workers, use_dlq=False)
+
+    def run_analytics():
+        analytics_consumer.setup_topology()
+        analytics_consumer.bind_event("#")
+        analytics_consumer.start_consuming(lambda payload, _: process_event.execute(
+            payload.get("event_type"), payload.get("data") or {}))
+
+    for target in (inventory_consumer.start_consuming, payment_consumer.start_consuming,
+                   notification_consumer.start_consuming, run_analytics):
+        threading.Thread(target=target, daemon=True).start()
+    order_consumer.start_in_background()
+    outbox_relay.start()
+
+    return create_order, metrics_repository
+
+def wait_for_consumers(broker: InMemoryBroker, queues: list, timeout: float = 10.0):
+    # Las órdenes publicadas antes de que existan las colas se perderían (como en RabbitMQ).
+    deadline = time.monotonic() + timeout
+    while any(broker.consumer_count(queue) == 0 for queue in queues):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Consumers not ready: {queues}")
+        time.sleep(0.01)
+
+def wait_for_drain(broker: InMemoryBroker, timeout: float = 10.0):
+    # Eventos aún en cola (p.ej. OrderConfirmed camino a analytics) antes de leer métricas.
+    deadline = time.monotonic() + timeout
+    while any(queue["messages"] for queue in broker.stats()["queues"].values()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def run(args):
+    InMemoryBroker.reset(BROKER_NAME)
+    HOP_LATENCIES.reset()
+    broker = InMemoryBroker.named(BROKER_NAME)
+    tracker = SagaTracker(args.n)
+    # Los servicios loguean con print: se silencian salvo --verbose. Los consumidores siguen
+    # vivos (hilos daemon) hasta que termina el proceso, así que el reporte va al stdout original.
+    report = sys.stdout
+    if not args.verbose:
+        sys.stdout = io.StringIO()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        try:
+            create_order, metrics_repository = build_pipeline(db_dir, tracker, args)
+            wait_for_consumers(broker, ["inventory_queue", "payment_queue", "notification_queue",
+                                        "order_updates_queue", "analytics_stream_queue"])
+
+            items = [{"product_id": PRODUCT_ID, "quantity": args.quantity, "price": args.price}]
+
+            request_ms = []
+
+            def place_order(i: int):
+                started = time.perf_counter()
+                order = create_order.execute(f"bench-customer-{i}", items)
+                tracker.start(order.order_id, started)
+                request_ms.append((time.perf_counter() - started) * 1000.0)
+
+            wall_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as clients:
+                list(clients.map(place_order, range(args.n)))
+            completed = tracker.wait(args.timeout)
+            wall_seconds = time.perf_counter() - wall_started
+            wait_for_drain(broker)
+            metrics = metrics_repository.get_today_metrics()
+        finally:
+            if not args.verbose:
+                sys.stdout = open(os.devnull, "w")
+
+    latencies = tracker.latencies_ms()
+    statuses = list(tracker.statuses.values())
+    stats = broker.stats()
+    dlq_depth = {name: queue["messages"] for name, queue in stats["queues"].items()
+                 if name.endswith("_dlq") and queue["messages"]}
+
+    print(f"orders            {args.n} ({len(latencies)} completed{'' if completed else ', TIMEOUT'})", file=report)
+    print(f"confirmed         {statuses.count('CONFIRMED')}", file=report)
+    print(f"rejected          {statuses.count('REJECTED')}", file=report)
+    print(f"wall seconds      {wall_seconds:.3f}", file=report)
+    print(f"orders/s          {len(latencies) / wall_seconds:.1f}", file=report)
+    request_ms.sort()
+    for pct in (50, 99):
+        print(f"create p{pct:<2} ms     {percentile(request_ms, pct):.2f}", file=report)
+    for pct in (50, 90, 99):
+        print(f"latency p{pct:<2} ms    {percentile(latencies, pct):.2f}", file=report)
+    print(f"latency max ms    {latencies[-1] if latencies else 0.0:.2f}", file=report)
+    print(f"messages routed   {stats['published_total']}", file=report)
+    print(f"dlq messages      {dlq_depth or 0}", file=report)
+    print(f"analytics         {metrics}", file=report)
+
+    # Desglose por salto: dónde se va el tiempo del saga bajo carga.
+    print(f"\n{'queue':<24} {'event_type':<20} {'stage':<11} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+          file=report)
+    for queue, event_types in HOP_LATENCIES.snapshot().items():
+        for event_type, stages in event_types.items():
+            for stage in (QUEUE_WAIT, HANDLER, ACK):
+                if stage in stages:
+                    h = stages[stage]
+                    print(f"{queue:<24} {event_type:<20} {stage:<11} {h['count']:>7} {h['p50_ms']:>9.2f} "
+                          f"{h['p99_ms']:>9.2f} {h['max_ms']:>9.2f}", file=report)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process saga benchmark (order -> inventory -> payment)")
+    parser.add_argument("-n", type=int, default=1000, help="órdenes a crear")
+    parser.add_argument("--clients", type=int, default=8, help="hilos cliente creando órdenes")
+    parser.add_argument("--quantity", type=int, default=1, help="unidades por orden")
+    parser.add_argument("--price", type=float, default=10.0)
+    parser.add_argument("--inventory-workers", type=int, default=4)
+    parser.add_argument("--payment-workers", type=int, default=4)
+    parser.add_argument("--notification-workers", type=int, default=4)
+    parser.add_argument("--analytics-workers", type=int, default=4)
+    parser.add_argument("--gateway-latency-ms", type=float, default=0.0, help="latencia simulada del gateway de pago")
+    parser.add_argument("--outbox-batch", type=int, default=100, help="eventos por lote del outbox relay")
+    parser.add_argument("--codec", default=None, help="json / orjson / msgpack")
+    parser.add_argument("--compression", default=None, help="gzip / zstd")
+    parser.add_argument("--timeout", type=float, default=120.0, help="segundos máximos esperando el fin del saga")
+    parser.add_argument("--verbose", action="store_true", help="muestra los logs de los servicios")
+    run(parser.parse_args())
@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, Float, Date, DateTime
+from sqlalchemy import create_engine, Column, Integer, Float, Date, DateTime, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import date, datetime
 from ...domain.ports import MetricsRepository
 from ...domain.models import DailyMetrics
+from shared.infrastructure.metrics import instrument_engine
 
 Base = declarative_base()
 
@@ -18,6 +20,7 @@ class DailyMetricsModel(Base):
 class PostgresMetricsRepository(MetricsRepository):
     def __init__(self, db_url: str):
         self.engine = create_engine(db_url)
+        instrument_engine(self.engine, "analytics")
         Base.metadata.create_all(self.engine)
         self.Session = sessionmaker(bind=self.engine)
 
@@ -27,10 +30,32 @@ class PostgresMetricsRepository(MetricsRepository):
         if not record:
             record = DailyMetricsModel(date_entry=today)
             session.add(record)
-            session.commit() # Commit to get it created
+            try:
+                session.commit() # Commit to get it created
+            except IntegrityError:
+                # Another concurrent event created today's row first
+                session.rollback()
+                return session.query(DailyMetricsModel).filter_by(date_entry=today).one()
             session.refresh(record)
         return record
 
+    def _increment_today(self, **increments):
+        # Atomic "col = col + n" UPDATE: safe with concurrent stream handlers
+        # (a read-modify-write on the ORM object would lose updates).
+        session = self.Session()
+        try:
+            record = self._get_or_create_today(session)
+            values = {name: getattr(DailyMetricsModel, name) + amount for name, amount in increments.items()}
+            values["last_updated"] = datetime.utcnow()
+            session.execute(
+                update(DailyMetricsModel)
+                .where(DailyMetricsModel.date_entry == record.date_entry)
+                .values(**values)
+            )
+            session.commit()
+        finally:
+            session.close()
+
     def get_today_metrics(self) -> DailyMetrics:
         session = self.Session()
         try:
@@ -46,22 +71,7 @@ class PostgresMetricsRepository(MetricsRepository):
             session.close()
 
     def increment_orders(self, amount: float = 0.0):
-        session = self.Session()
-        try:
-            record = self._get_or_create_today(session)
-            record.total_orders += 1
-            record.total_sales += amount
-            record.last_updated = datetime.utcnow()
-            session.commit()
-        finally:
-            session.close()
+        self._increment_today(total_orders=1, total_sales=amount)
 
     def increment_rejections(self):
-        session = self.Session()
-        try:
-            record = self._get_or_create_today(session)
-            record.rejected_orders += 1
-            record.last_updated = datetime.utcnow()
-            session.commit()
-        finally:
-            session.close()
+        self._increment_today(rejected_orders=1)
@@ -1,68 +1,68 @@
-import pika
-import json
-import threading
-import time
+import asyncio
 from ...application.services import ProcessEventUseCase
+from shared.infrastructure.async_messaging import AsyncRabbitMQConnection, AsyncBaseConsumer
+from shared.infrastructure.dedup import EventDeduplicator
 
-EXCHANGE_NAME = "integrahub_exchange"
-QUEUE_NAME = "analytics_stream_queue"
+SERVICE_NAME = "analytics_stream"  # => analytics_stream_queue
 
 class AnalyticsStreamProcessor:
     """
     Acts as a Stream Processor consuming from the Event Bus.
     Although using RabbitMQ, we handle it as an unbounded stream of events.
+
+    Runs on the API's asyncio event loop (no dedicated thread): up to max_concurrency
+    events are processed at once, the blocking DB work goes through asyncio.to_thread.
     """
-    def __init__(self, amqp_url: str, use_case: ProcessEventUseCase):
+    def __init__(self, amqp_url: str, use_case: ProcessEventUseCase, max_concurrency: int = 10,
+                 deduplicator: EventDeduplicator = None):
         self.amqp_url = amqp_url
         self.use_case = use_case
-        self.connection = None
-        self.channel = None
-        self.thread = None
-        self.is_running = False
+        self.connection = AsyncRabbitMQConnection(amqp_url)
+        # use_dlq=False: the stream queue has no DLX, bad frames are logged and acked.
+        # deduplicator: redelivered events (same event_id) are not counted twice.
+        self.consumer = AsyncBaseConsumer(self.connection, SERVICE_NAME,
+                                          max_concurrency=max_concurrency, use_dlq=False,
+                                          deduplicator=deduplicator)
+        self._task = None
+
+    async def start(self):
+        # Startup hook: connects in the background so the HTTP API is not blocked by the broker.
+        self._task = asyncio.create_task(self._run_consumer())
 
-    def start(self):
-        self.is_running = True
-        self.thread = threading.Thread(target=self._run_consumer)
-        self.thread.daemon = True
-        self.thread.start()
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.consumer.stop()
+        await self.connection.close()
 
-    def _run_consumer(self):
+    async def _run_consumer(self):
         print(" [Analytics] Stream Processor Starting...")
-        # Connection Retry Loop
-        while self.is_running:
+        # Connection Retry Loop (initial connection only; the robust connection
+        # re-establishes the consumer by itself after that)
+        while True:
             try:
-                self._connect_and_consume()
+                await self._connect_and_consume()
+                return
             except Exception as e:
                 print(f" [Analytics] Connection lost: {e}. Retrying in 5s...")
-                time.sleep(5)
-
-    def _connect_and_consume(self):
-        params = pika.URLParameters(self.amqp_url)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
-
-        self.channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='topic', durable=True)
-        self.channel.queue_declare(queue=QUEUE_NAME, durable=True)
+                await asyncio.sleep(5)
 
+    async def _connect_and_consume(self):
         # "Capture all events" - Binding keys
-        self.channel.queue_bind(exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key="#")
+        await self.consumer.bind_event("#")
 
-        def callback(ch, method, properties, body):
+        async def callback(payload: dict, correlation_id: str):
             try:
-                payload = json.loads(body)
                 event_type = payload.get("event_type")
                 data = payload.get("data")
                 
-                # Stream Processing Logic
-                self.use_case.execute(event_type, data)
+                # Stream Processing Logic (sync repository => worker thread)
+                await asyncio.to_thread(self.use_case.execute, event_type, data)
                 
             except Exception as e:
                 print(f" [Analytics] Error processing frame: {e}")
             
-            # Auto-ack for high throughput streaming (At most once / At least once trade-off)
-            # For analytics, we often prefer speed here in this demo.
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            # No re-raise => the consumer acks: for analytics we prefer speed
+            # (At most once / At least once trade-off) in this demo.
 
-        self.channel.basic_qos(prefetch_count=10) # Process in batches-ish
-        self.channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
-        self.channel.start_consuming()
+        await self.consumer.start_consuming(callback)
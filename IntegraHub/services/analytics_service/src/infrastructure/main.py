@@ -1,9 +1,11 @@
 import os
 import uvicorn
-import time
 from .adapters.postgres_repository import PostgresMetricsRepository
 from .adapters.stream_consumer import AnalyticsStreamProcessor
 from .http.api import create_app
+from shared.infrastructure.metrics import start_metrics_server, instrument_fastapi
+from shared.infrastructure.readiness import StartupReadiness, probe_postgres, probe_rabbitmq, add_health_routes
+from shared.infrastructure.dedup import EventDeduplicator, SqlProcessedEventStore
 import sys
 import os
 
@@ -20,9 +22,24 @@ def main():
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
     DATABASE_URL = f"postgresql://user:password@{DB_HOST}:5432/integrahub_db"
     AMQP_URL = f"amqp://user:password@{RABBITMQ_HOST}:5672/%2f"
+    # Events processed concurrently by the async stream processor
+    STREAM_MAX_CONCURRENCY = int(os.getenv("STREAM_MAX_CONCURRENCY", "10"))
+    # Prometheus exposition on a separate port: the API's /metrics already serves business metrics (JSON)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+    # Event deduplication by event_id (LRU + processed_events table): redeliveries are not double-counted
+    EVENT_DEDUP = os.getenv("EVENT_DEDUP", "false").lower() == "true"
+    EVENT_DEDUP_CACHE_SIZE = int(os.getenv("EVENT_DEDUP_CACHE_SIZE", "100000"))
+    EVENT_DEDUP_TTL_HOURS = float(os.getenv("EVENT_DEDUP_TTL_HOURS", "24"))
+    EVENT_DEDUP_COMPACTION_SECONDS = float(os.getenv("EVENT_DEDUP_COMPACTION_SECONDS", "600"))
+    EVENT_DEDUP_LEASE_SECONDS = float(os.getenv("EVENT_DEDUP_LEASE_SECONDS", "30"))
+    # Max seconds to wait for dependencies at startup (probed with backoff, no fixed sleep)
+    STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
 
-    # Wait for DB
-    time.sleep(10)
+    # Wait for DB and RabbitMQ concurrently (also /health/live and /health/ready on METRICS_PORT while waiting)
+    readiness = StartupReadiness({"postgres": probe_postgres(DATABASE_URL), "rabbitmq": probe_rabbitmq(AMQP_URL)},
+                                 timeout=STARTUP_TIMEOUT_SECONDS)
+    start_metrics_server(METRICS_PORT, readiness=readiness)
+    readiness.wait()
 
     # 1. Infrastructure / Adapters
     repo = PostgresMetricsRepository(DATABASE_URL)
@@ -31,12 +48,23 @@ def main():
     process_use_case = ProcessEventUseCase(repo)
     get_metrics_use_case = GetMetricsUseCase(repo)
 
-    # 3. Start Stream Consumer (Background Thread)
-    stream_processor = AnalyticsStreamProcessor(AMQP_URL, process_use_case)
-    stream_processor.start()
+    # 3. Stream Consumer (runs on the API event loop, started/stopped with the app)
+    deduplicator = None
+    if EVENT_DEDUP:
+        deduplicator = EventDeduplicator("analytics_stream", SqlProcessedEventStore(DATABASE_URL),
+                                         cache_size=EVENT_DEDUP_CACHE_SIZE, ttl_seconds=EVENT_DEDUP_TTL_HOURS * 3600,
+                                         lease_seconds=EVENT_DEDUP_LEASE_SECONDS)
+        deduplicator.start_compaction(EVENT_DEDUP_COMPACTION_SECONDS)
+    stream_processor = AnalyticsStreamProcessor(AMQP_URL, process_use_case, max_concurrency=STREAM_MAX_CONCURRENCY,
+                                                deduplicator=deduplicator)
 
     # 4. Start HTTP API (Blocking)
     app = create_app(get_metrics_use_case)
+    instrument_fastapi(app)
+    app.add_event_handler("startup", stream_processor.start)
+    app.add_event_handler("shutdown", stream_processor.stop)
+    app.add_event_handler("startup", readiness.mark_ready)
+    add_health_routes(app, readiness)
     uvicorn.run(app, host="0.0.0.0", port=8004)
 
 if __name__ == "__main__":
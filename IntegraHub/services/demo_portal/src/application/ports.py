@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 from ..domain.models import DemoOrder, SystemHealth
 
 class OrderServicePort(ABC):
@@ -11,6 +11,10 @@ class OrderServicePort(ABC):
     def get_orders(self) -> List[DemoOrder]:
         pass
 
+    @abstractmethod
+    def await_order_status(self, order_id: str, timeout: float) -> Optional[str]:
+        pass
+
 class SystemStatusPort(ABC):
     @abstractmethod
     def check_health(self) -> List[SystemHealth]:
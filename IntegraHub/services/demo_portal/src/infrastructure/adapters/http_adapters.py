@@ -1,10 +1,9 @@
 import os
 import secrets
-import jwt
-import datetime
 import httpx
-from typing import List, Dict
+from typing import List, Dict, Optional
 from shared.infrastructure.http_client import BaseHttpClient
+from shared.infrastructure.security import ServiceTokenProvider
 from ...application.ports import OrderServicePort, SystemStatusPort
 from ...domain.models import DemoOrder, SystemHealth
 
@@ -12,19 +11,14 @@ class HttpOrderAdapter(BaseHttpClient, OrderServicePort):
     def __init__(self):
         url = os.getenv("ORDER_SERVICE_URL", "http://order-service:8000")
         super().__init__(url)
+        # Valid JWT for internal communication (shared JWT_SECRET), signed once and
+        # refreshed one minute before it expires instead of once per order.
+        self.token_provider = ServiceTokenProvider("demo-portal", {"role": "admin"}, ttl_seconds=600)
 
     def create_demo_order(self, customer_id: str, items: List[Dict]) -> str:
-        # Generate Valid JWT Token for Internal Communication
-        token_payload = {
-            "sub": "demo-portal",
-            "role": "admin",
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
-        }
-        token = jwt.encode(token_payload, "supersecretkey", algorithm="HS256") # Shared secret matches security.py
-
         headers = {
             "X-Idempotency-Key": secrets.token_hex(8),
-            "Authorization": f"Bearer {token}"
+            **self.token_provider.authorization_header()
         }
         payload = {"customer_id": customer_id, "items": items}
         
@@ -54,6 +48,13 @@ class HttpOrderAdapter(BaseHttpClient, OrderServicePort):
             # Fallback to empty list or logs
             return []
 
+    def await_order_status(self, order_id: str, timeout: float) -> Optional[str]:
+        # Long-poll on the order service: returns as soon as the order reaches CONFIRMED/REJECTED
+        # (or its current status when the timeout expires) instead of re-fetching the whole list.
+        # timeout must stay below the 5s httpx client timeout.
+        result = self._get(f"orders/{order_id}/await?timeout={timeout}")
+        return result.get("status") if result else None
+
 class HttpHealthAdapter(SystemStatusPort):
     def check_health(self) -> List[SystemHealth]:
         # HTTP Services
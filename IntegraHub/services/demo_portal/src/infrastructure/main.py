@@ -1,14 +1,27 @@
 from fastapi import FastAPI, Request, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pathlib import Path
 import uvicorn
+import os
+from shared.infrastructure.metrics import start_metrics_server, instrument_fastapi
 
 # Imports Hexagonales
 # from ..adapters.http_adapters import HttpOrderAdapter, HttpHealthAdapter
 from src.infrastructure.adapters.http_adapters import HttpOrderAdapter, HttpHealthAdapter
 
 app = FastAPI(title="Demo Portal")
+instrument_fastapi(app)
+
+# Métricas Prometheus (GET /metrics) en un puerto aparte; 0 => deshabilitado.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Espera máxima (long-poll) al estado final de un pedido recién creado; menor al timeout HTTP de 5s.
+ORDER_AWAIT_SECONDS = float(os.getenv("ORDER_AWAIT_SECONDS", "3"))
+
+@app.on_event("startup")
+def startup_event():
+    start_metrics_server(METRICS_PORT)
 
 # Configuración de Templates
 # Template path fix: 'web/templates' is not relative to main.py anymore if we moved main.py
@@ -48,7 +61,12 @@ async def create_demo_order(request: Request):
         ]
         
         order_id = order_adapter.create_demo_order("customer-demo", sample_items)
+        # Long-poll en un hilo (no bloquea el loop): el dashboard ya muestra el estado final
+        # sin que el usuario tenga que refrescar la lista.
+        final_status = await run_in_threadpool(order_adapter.await_order_status, order_id, ORDER_AWAIT_SECONDS)
         message = f"Pedido creado exitosamente: {order_id}"
+        if final_status:
+            message += f" ({final_status})"
     except Exception as e:
         message = f"Error al crear pedido: {str(e)}"
 
@@ -1,4 +1,5 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from ..domain.models import ReservationResult, ResultsNotPublishedError, RESERVED, REJECTED
 from ..domain.ports import InventoryRepository, EventPublisher
 
 class ReserveInventoryUseCase:
@@ -7,62 +8,52 @@ class ReserveInventoryUseCase:
         self.publisher = publisher
 
     def execute(self, order_id: str, items: List[Dict]):
-        # 1. Idempotency Check
-        if self.repository.is_order_processed(order_id):
+        # Idempotency check, stock check, conditional decrements and the processed marker
+        # happen in one repository transaction: concurrent orders cannot oversell and a
+        # failed order leaves stock untouched.
+        # If the DB fails, the exception propagates so the consumer retries.
+        result = self.repository.reserve_order(order_id, items)
+
+        # A redelivered order gets its stored decision back and it is published again: the
+        # first publish may have failed after the commit. Downstream handling is idempotent.
+        event = self._event(result)
+        if event is None:
             print(f"Order {order_id} already processed. Skipping.")
             return
+        self.publisher.publish(*event)
+        if result.duplicate:
+            print(f"Order {order_id} already processed ({result.status}). Result re-published.")
+        elif result.status == RESERVED:
+            print(f"Inventory reserved for order {order_id}")
+        else:
+            print(f"Order {order_id} rejected: {result.reason}")
 
-        # 2. Check Stock availability
-        can_fulfill = True
-        failed_reason = ""
-
-        # Using a simple check first (locking strategy would depend on specific DB isolation levels)
-        # For simplicity in this demo: Check all, then Update all.
-        # In production: Use row locking or atomic decrements.
-        
-        for item in items:
-            product_id = item['product_id']
-            qty = item['quantity']
-            product = self.repository.get_product(product_id)
-            
-            if not product:
-                can_fulfill = False
-                failed_reason = f"Product {product_id} not found"
-                break
-            
-            if product.stock < qty:
-                can_fulfill = False
-                failed_reason = f"Insufficient stock for product {product_id}"
-                break
+    @staticmethod
+    def _event(result: ReservationResult):
+        # (topic, event_type, data) for a reservation result; None if there is nothing to report.
+        if result.status == RESERVED:
+            return ("inventory", "InventoryReserved", {"order_id": result.order_id})
+        if result.status == REJECTED:
+            # Requirement says: "Si no [hay stock], publicar OrderRejected".
+            # Usually stock issues don't resolve quickly, so we reject.
+            return ("inventory", "OrderRejected", {"order_id": result.order_id, "reason": result.reason})
+        return None
 
-        # 3. Transaction Execution
-        if can_fulfill:
+    def execute_batch(self, orders: List[Tuple[str, List[Dict]]]) -> List[ReservationResult]:
+        # Micro-batch path (flash sales): every order of the batch is reserved in one DB
+        # transaction, in arrival order, and all results are published with one confirm.
+        # Redelivered orders come back with their stored decision and are published again.
+        results = self.repository.reserve_orders(orders)
+        events = [event for event in map(self._event, results) if event is not None]
+        if events:
             try:
-                # Deduct stock
-                for item in items:
-                    self.repository.update_stock(item['product_id'], -item['quantity'])
-                
-                # Mark processed
-                self.repository.mark_order_processed(order_id, "RESERVED")
-                
-                # Publish Success
-                self.publisher.publish("inventory", "InventoryReserved", {"order_id": order_id})
-                print(f"Inventory reserved for order {order_id}")
-                
+                self.publisher.publish_batch(events)
             except Exception as e:
-                # Rollback/Fail handling should be in repo adapter usually, 
-                # strictly here we might catch DB errors.
-                # If DB fails here, we re-raise to let the consumer retry.
-                raise e
-        else:
-            # Mark processed as failed so we don't retry logic unnecessarily, 
-            # Or maybe we DO want to retry later? 
-            # Requirement says: "Si no [hay stock], publicar OrderRejected".
-            # Usually stock issues don't resolve quickly, so we reject.
-            self.repository.mark_order_processed(order_id, "REJECTED")
-            
-            self.publisher.publish("inventory", "OrderRejected", {
-                "order_id": order_id, 
-                "reason": failed_reason
-            })
-            print(f"Order {order_id} rejected: {failed_reason}")
+                # Committed: re-running the reservation is not a fallback, the retry of these
+                # messages gets the stored decisions back and publishes them.
+                raise ResultsNotPublishedError(results, e) from e
+        reserved = sum(1 for result in results if result.status == RESERVED and not result.duplicate)
+        duplicates = sum(1 for result in results if result.duplicate)
+        print(f"Inventory batch: {reserved} reserved, {len(results) - reserved - duplicates} rejected, "
+              f"{duplicates} duplicates")
+        return results
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List, Optional
 
 @dataclass
 class Product:
@@ -9,3 +10,23 @@ class Product:
 class OrderTransaction:
     order_id: str
     status: str
+
+# Outcome of reserving every item of one order (all-or-nothing)
+RESERVED = "RESERVED"
+REJECTED = "REJECTED"
+DUPLICATE = "DUPLICATE"  # already processed but no stored decision (legacy marker): nothing to report
+
+@dataclass
+class ReservationResult:
+    order_id: str
+    status: str
+    reason: Optional[str] = None
+    # True when the order was already processed (redelivery): status/reason are the stored
+    # decision, nothing was changed, and the result is published again.
+    duplicate: bool = False
+
+class ResultsNotPublishedError(RuntimeError):
+    """The reservations were committed but their events were not published; `results` has the decisions."""
+    def __init__(self, results: List[ReservationResult], cause: Exception):
+        super().__init__(f"{len(results)} reservation results committed but not published: {cause}")
+        self.results = results
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import List, Tuple, Optional
-from .models import Product
+from .models import Product, ReservationResult
 
 class InventoryRepository(ABC):
     @abstractmethod
@@ -19,7 +19,31 @@ class InventoryRepository(ABC):
     def mark_order_processed(self, order_id: str, status: str):
         pass
 
+    @abstractmethod
+    def reserve_order(self, order_id: str, items: List[dict]) -> ReservationResult:
+        """
+        Reserves every item of the order in one transaction, together with the processed-order
+        marker: either all stock is decremented (RESERVED) or none is (REJECTED + reason).
+        If the order was already processed, nothing changes and the stored decision is returned
+        with duplicate=True (DUPLICATE if no decision was stored).
+        """
+        pass
+
+    @abstractmethod
+    def reserve_orders(self, orders: List[Tuple[str, List[dict]]]) -> List[ReservationResult]:
+        """
+        Reserves a batch [(order_id, items)] in one transaction, in arrival order, with an
+        all-or-nothing decision per order. Already processed orders get their stored decision
+        (duplicate=True), as in reserve_order. Raises (committing nothing) if the batch fails.
+        """
+        pass
+
 class EventPublisher(ABC):
     @abstractmethod
     def publish(self, topic: str, event_type: str, data: dict):
         pass
+
+    def publish_batch(self, events: list):
+        """Publishes several (topic, event_type, data) events. Defaults to one by one."""
+        for topic, event_type, data in events:
+            self.publish(topic, event_type, data)
@@ -0,0 +1,187 @@
+# Infrastructure Adapter: Hot-SKU reservation ledger (write-behind)
+# During promotions almost every order hits a handful of products, and the row lock on
+# products.stock serializes every reservation. For the SKUs listed in HOT_SKUS:
+#
+# - HotSkuLedger owns the available quantity in memory: grants/denials are a dict check
+#   under a lock, no row lock on products.
+# - Each granted reservation is journaled (inventory_ledger_journal) in the SAME transaction
+#   as the processed-order marker, so the decision is as durable as the marker itself.
+# - LedgerFlusher applies the journal to products.stock in periodic batched writes
+#   (one UPDATE per hot SKU per interval) and deletes the flushed rows in that transaction.
+# - On startup PostgresInventoryRepository.reconcile_ledger() flushes whatever a crash left
+#   in the journal and loads the ledger from products.stock.
+# - Each flush re-reads the hot rows: a change made by another writer since the previous
+#   read (e.g. a legacy_ingestion_service restock) is added to the available quantity.
+#   A hot SKU missing at startup joins the ledger once its row exists.
+#
+# The ledger is process-local: hot SKUs must be reserved by a single inventory_service
+# instance (any number of consumer workers inside it). Other writers may only add stock
+# (restocks): they are picked up at the next flush, while reservations or decrements made
+# outside the ledger are not coordinated with it and can oversell.
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from shared.infrastructure.metrics import counter, gauge
+
+LEDGER_DECISIONS = counter("integrahub_inventory_ledger_decisions_total",
+                           "Hot-SKU reservations decided by the in-memory ledger", ["result"])
+LEDGER_AVAILABLE = gauge("integrahub_inventory_ledger_available", "Available quantity owned by the ledger",
+                         ["product_id"])
+LEDGER_FLUSHED = counter("integrahub_inventory_ledger_flushed_total", "Journal rows written behind to products")
+LEDGER_FLUSH_FAILURES = counter("integrahub_inventory_ledger_flush_failures_total", "Failed ledger flushes")
+
+class LedgerNotReadyError(RuntimeError):
+    pass
+
+class HotSkuLedger:
+    def __init__(self, product_ids: Iterable[str]):
+        self.product_ids = frozenset(product_ids)
+        self._available: Dict[str, int] = {}
+        # products.stock as of the last read (load/sync): external changes are measured against it.
+        self._db_stock: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def is_hot(self, product_id: str) -> bool:
+        return product_id in self.product_ids
+
+    def split(self, quantities: Dict[str, int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Splits {product_id: qty} into (hot, cold), keeping item order."""
+        hot = {p: q for p, q in quantities.items() if p in self.product_ids}
+        cold = {p: q for p, q in quantities.items() if p not in self.product_ids}
+        return hot, cold
+
+    def load(self, stock: Dict[str, int]):
+        # Reconciliation result: products.stock after the journal was flushed. Hot SKUs
+        # missing from products stay out of the ledger ("not found" like any product).
+        with self._lock:
+            self._available = {p: q for p, q in stock.items() if p in self.product_ids}
+            self._db_stock = dict(self._available)
+            self._loaded = True
+        for product_id in self._available:
+            self._export(product_id)
+
+    def sync(self, flushed: Dict[str, int], stock: Dict[str, int]) -> Dict[str, int]:
+        """
+        After a flush: flushed is what the flush subtracted from products.stock, stock the hot
+        rows read right after it. Whatever else changed since the last read was done by another
+        writer and is applied to the available quantity. Returns {product_id: external change}.
+        """
+        changes, added = {}, []
+        with self._lock:
+            if not self._loaded:
+                # Startup flush: load() reads the rows next.
+                return changes
+            for product_id, db_stock in stock.items():
+                if product_id not in self.product_ids:
+                    continue
+                change = db_stock - (self._db_stock.get(product_id, 0) - flushed.get(product_id, 0))
+                self._db_stock[product_id] = db_stock
+                if product_id not in self._available:
+                    added.append(product_id)
+                if change or product_id in added:
+                    self._available[product_id] = self._available.get(product_id, 0) + change
+                    changes[product_id] = change
+        for product_id in added:
+            self._export(product_id)
+        return changes
+
+    def _export(self, product_id: str):
+        LEDGER_AVAILABLE.labels(product_id).set_function(
+            lambda product_id=product_id: self._available.get(product_id, 0))
+
+    def available(self, product_ids: Iterable[str]) -> Dict[str, int]:
+        self._check_loaded()
+        with self._lock:
+            return {p: self._available[p] for p in product_ids if p in self._available}
+
+    def hold(self, quantities: Dict[str, int]) -> Optional[str]:
+        """
+        Atomically takes every quantity, or none. Returns None when granted, otherwise the first
+        product that cannot be served. The caller releases the hold if its transaction fails.
+        """
+        self._check_loaded()
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                if self._available.get(product_id, -1) < quantity:
+                    LEDGER_DECISIONS.labels("denied").inc()
+                    return product_id
+            for product_id, quantity in quantities.items():
+                self._available[product_id] -= quantity
+        LEDGER_DECISIONS.labels("granted").inc()
+        return None
+
+    def release(self, quantities: Dict[str, int]):
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                if product_id in self._available:
+                    self._available[product_id] += quantity
+
+    def restock(self, product_id: str, quantity: int):
+        # Called together with the products.stock update (InventoryRepository.update_stock), so
+        # it is not counted again as an external change by the next sync.
+        with self._lock:
+            if product_id in self._available:
+                self._available[product_id] += quantity
+                self._db_stock[product_id] = self._db_stock.get(product_id, 0) + quantity
+
+    def _check_loaded(self):
+        if not self._loaded:
+            # The consumer retries the message; nothing was reserved.
+            raise LedgerNotReadyError("Hot-SKU ledger not reconciled yet")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"loaded": self._loaded, "available": dict(self._available)}
+
+class LedgerFlusher:
+    def __init__(self, repository, interval: float = 0.5, max_backoff: float = 10.0):
+        # repository: PostgresInventoryRepository (flush_ledger)
+        # interval: seconds between batched writes to products (the write-behind window).
+        self.repository = repository
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {"flushed": 0, "flushes": 0, "failures": 0, "last_error": None}
+
+    def flush_once(self) -> int:
+        flushed = self.repository.flush_ledger()
+        if flushed:
+            LEDGER_FLUSHED.inc(flushed)
+            self._stats["flushed"] += flushed
+            self._stats["flushes"] += 1
+        return flushed
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop_event.wait(backoff):
+            try:
+                self.flush_once()
+                backoff = self.interval
+            except Exception as e:
+                # The journal keeps the rows: nothing is lost, the next flush applies them.
+                LEDGER_FLUSH_FAILURES.inc()
+                self._stats["failures"] += 1
+                self._stats["last_error"] = str(e)
+                backoff = min(backoff * 2, self.max_backoff)
+                print(f" [!] Ledger flush failed, retrying in {backoff:.1f}s: {e}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        # Final write-behind so products.stock is current after a clean shutdown. If it fails,
+        # the rows stay journaled and the next startup reconciliation applies them.
+        try:
+            self.flush_once()
+        except Exception as e:
+            print(f" [!] Final ledger flush failed (left in the journal): {e}")
+
+    def stats(self) -> dict:
+        return dict(self._stats)
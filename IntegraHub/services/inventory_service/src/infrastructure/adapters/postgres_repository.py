@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime
+from sqlalchemy import (create_engine, bindparam, column, delete, insert, inspect, select, text, update, values,
+                        Column, String, Integer, DateTime)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+from contextlib import nullcontext
 from datetime import datetime
-from ...domain.models import Product
+from typing import Dict, Iterable, List, Tuple
+from ...domain.models import Product, ReservationResult, RESERVED, REJECTED, DUPLICATE
 from ...domain.ports import InventoryRepository
+from .hot_sku_ledger import HotSkuLedger
+from shared.infrastructure.metrics import instrument_engine
 
 Base = declarative_base()
 
@@ -15,14 +22,42 @@ class ProcessedOrderModel(Base):
     __tablename__ = "processed_orders_inventory"
     order_id = Column(String, primary_key=True)
     status = Column(String)
+    # Rejection reason: a redelivered order re-publishes the same OrderRejected.
+    reason = Column(String)
     processed_at = Column(DateTime, default=datetime.utcnow)
+class LedgerJournalModel(Base):
+    # Hot-SKU reservations granted by the ledger and not yet written behind to products.
+    __tablename__ = "inventory_ledger_journal"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(String)
+    product_id = Column(String)
+    quantity = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
 # Inventory Repository Implementation
 class PostgresInventoryRepository(InventoryRepository):
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, hot_skus: Iterable[str] = None):
         self.engine = create_engine(db_url)
+        instrument_engine(self.engine, "inventory")
         Base.metadata.create_all(self.engine)
+        self._upgrade_schema()
         self.Session = sessionmaker(bind=self.engine)
         self._seed_data()
+        # hot_skus: products whose available quantity is owned by an in-memory ledger
+        # (see hot_sku_ledger.py); reconciled against the DB before the first reservation.
+        self.ledger = HotSkuLedger(hot_skus) if hot_skus else None
+        self._flush_lock = threading.Lock()
+        if self.ledger:
+            self.reconcile_ledger()
+
+    def _upgrade_schema(self):
+        # create_all does not alter existing tables: columns added later are created here (idempotent).
+        table = ProcessedOrderModel.__table__
+        existing = {info["name"] for info in inspect(self.engine).get_columns(table.name)}
+        with self.engine.begin() as connection:
+            for table_column in table.columns:
+                if table_column.name not in existing:
+                    column_type = table_column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {table_column.name} {column_type}"))
 
     def _seed_data(self):
         """Seed some dummy products for testing"""
@@ -37,6 +72,10 @@ class PostgresInventoryRepository(InventoryRepository):
     def get_product(self, product_id: str):
         session = self.Session()
         try:
+            if self.ledger and self.ledger.is_hot(product_id):
+                # products.stock lags behind by the unflushed journal; the ledger is current.
+                available = self.ledger.available([product_id])
+                return Product(product_id=product_id, stock=available[product_id]) if available else None
             model = session.query(ProductModel).filter_by(product_id=product_id).first()
             if model:
                 return Product(product_id=model.product_id, stock=model.stock)
@@ -45,12 +84,18 @@ class PostgresInventoryRepository(InventoryRepository):
             session.close()
 
     def update_stock(self, product_id: str, quantity: int):
+        hot = self.ledger is not None and self.ledger.is_hot(product_id)
         session = self.Session()
         try:
-            product = session.query(ProductModel).filter_by(product_id=product_id).first()
-            if product:
-                product.stock += quantity
-                session.commit()
+            # Hot SKU: commit and ledger restock under the flush lock, so the flush does not
+            # also count this change as an external one.
+            with self._flush_lock if hot else nullcontext():
+                product = session.query(ProductModel).filter_by(product_id=product_id).first()
+                if product:
+                    product.stock += quantity
+                    session.commit()
+                    if hot:
+                        self.ledger.restock(product_id, quantity)
         finally:
             session.close()
 
@@ -69,3 +114,271 @@ class PostgresInventoryRepository(InventoryRepository):
             session.commit()
         finally:
             session.close()
+
+    def reserve_order(self, order_id: str, items: List[dict]) -> ReservationResult:
+        # One transaction per order (instead of a session per get_product/update_stock call):
+        # lock rows, check, conditional decrement and processed marker, then a single commit.
+        session = self.Session()
+        held: Dict[str, int] = {}
+        try:
+            result = self._reserve(session, order_id, items, held)
+            session.commit()
+            return result
+        except IntegrityError:
+            # processed_orders_inventory PK conflict: a concurrent duplicate committed first
+            # (redeliveries are answered by _reserve). Rolling back also undoes any decrement.
+            session.rollback()
+            self._release(held)
+            return self._stored_result(order_id)
+        except Exception:
+            session.rollback()
+            self._release(held)
+            raise
+        finally:
+            session.close()
+
+    def _stored_result(self, order_id: str) -> ReservationResult:
+        # Decision stored with the processed marker. The event may not have been published
+        # (the publish failed after the commit), so the caller publishes it again.
+        session = self.Session()
+        try:
+            marker = session.get(ProcessedOrderModel, order_id)
+        finally:
+            session.close()
+        return self._duplicate_result(order_id, marker.status if marker else None, marker.reason if marker else None)
+
+    @staticmethod
+    def _duplicate_result(order_id: str, status: str, reason: str) -> ReservationResult:
+        if status not in (RESERVED, REJECTED):
+            return ReservationResult(order_id, DUPLICATE, duplicate=True)
+        return ReservationResult(order_id, status, reason, duplicate=True)
+
+    def reserve_orders(self, orders: List[Tuple[str, List[dict]]]) -> List[ReservationResult]:
+        """
+        Reserves a batch [(order_id, items)] in ONE transaction, in arrival order: each order
+        still gets its own all-or-nothing decision against the stock left by the previous ones.
+        Round trips per batch, not per order: processed-marker lookup, row locks, one set-based
+        decrement and one multi-row marker insert.
+        Already processed orders (and repeats inside the batch) get the stored decision back
+        with duplicate=True, as in reserve_order.
+        Raises on any DB error (nothing is committed); the caller can fall back to reserve_order.
+        """
+        session = self.Session()
+        held: Dict[str, int] = {}
+        try:
+            table = ProcessedOrderModel.__table__
+            order_ids = [order_id for order_id, _ in orders]
+            decided = {order_id: self._duplicate_result(order_id, status, reason)
+                       for order_id, status, reason in session.execute(
+                           select(table.c.order_id, table.c.status, table.c.reason)
+                           .where(table.c.order_id.in_(order_ids)))}
+            quantities = [self._quantities(items) for _, items in orders]
+            stock = self._read_stock(session, {product_id for q in quantities for product_id in q})
+
+            results, decrements, markers, journal = [], {}, [], []
+            now = datetime.utcnow()
+            for (order_id, _), order_quantities in zip(orders, quantities):
+                if order_id in decided:
+                    # Already processed, or the same order twice in this batch (redelivery).
+                    stored = decided[order_id]
+                    results.append(ReservationResult(order_id, stored.status, stored.reason, duplicate=True))
+                    continue
+                result = self._check_stock(order_id, order_quantities, stock)
+                decided[order_id] = result
+                if result.status == RESERVED:
+                    for product_id, quantity in order_quantities.items():
+                        stock[product_id] -= quantity
+                        decrements[product_id] = decrements.get(product_id, 0) + quantity
+                    journal.append((order_id, order_quantities))
+                markers.append({"order_id": order_id, "status": result.status, "reason": result.reason,
+                                "processed_at": now})
+                results.append(result)
+
+            hot, cold = self.ledger.split(decrements) if self.ledger else ({}, decrements)
+            if hot:
+                failed = self.ledger.hold(hot)
+                if failed:
+                    # Another worker took the ledger stock after the snapshot above.
+                    raise RuntimeError(f"Hot-SKU stock changed during batch reservation ({failed})")
+                held.update(hot)
+                self._journal(session, journal)
+            if cold:
+                self._decrement_stock(session, cold)
+            if markers:
+                # A concurrent duplicate makes this INSERT fail: the whole batch rolls back.
+                session.execute(insert(table), markers)
+            session.commit()
+            return results
+        except Exception:
+            session.rollback()
+            self._release(held)
+            raise
+        finally:
+            session.close()
+
+    @staticmethod
+    def _quantities(items: List[dict]) -> Dict[str, int]:
+        # The same product may appear in several lines of an order.
+        quantities: Dict[str, int] = {}
+        for item in items:
+            quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+        return quantities
+
+    @staticmethod
+    def _lock_stock(session, product_ids) -> Dict[str, int]:
+        # Lock the product rows in a fixed order (product_id): concurrent reservations queue up
+        # on the same rows instead of deadlocking. SQLite ignores FOR UPDATE (it locks the
+        # whole database on the first write).
+        if not product_ids:
+            return {}
+        table = ProductModel.__table__
+        return dict(session.execute(
+            select(table.c.product_id, table.c.stock)
+            .where(table.c.product_id.in_(sorted(product_ids)))
+            .order_by(table.c.product_id)
+            .with_for_update()).all())
+
+    @staticmethod
+    def _check_stock(order_id: str, quantities: Dict[str, int], stock: Dict[str, int]) -> ReservationResult:
+        # Items are checked in order, so the reason names the first item that cannot be served.
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                return ReservationResult(order_id, REJECTED, f"Product {product_id} not found")
+            if stock[product_id] < quantity:
+                return ReservationResult(order_id, REJECTED, f"Insufficient stock for product {product_id}")
+        return ReservationResult(order_id, RESERVED)
+
+    def _read_stock(self, session, product_ids) -> Dict[str, int]:
+        # Cold products: locked rows. Hot products: a snapshot of the ledger (no row lock).
+        if not self.ledger:
+            return self._lock_stock(session, product_ids)
+        hot = {product_id for product_id in product_ids if self.ledger.is_hot(product_id)}
+        stock = self._lock_stock(session, set(product_ids) - hot)
+        stock.update(self.ledger.available(hot))
+        return stock
+
+    def _reserve(self, session, order_id: str, items: List[dict], held: Dict[str, int]) -> ReservationResult:
+        """
+        Reserves one order inside the caller's transaction (raises IntegrityError if a concurrent
+        duplicate inserted the marker first). Hot-SKU quantities taken from the ledger are recorded
+        in held, to be released on rollback.
+        """
+        table = ProcessedOrderModel.__table__
+        marker = session.execute(
+            select(table.c.status, table.c.reason).where(table.c.order_id == order_id)).first()
+        if marker is not None:
+            # Redelivery: answered before locking rows or holding ledger stock, so a duplicate
+            # never takes stock that a concurrent real order could be rejected for.
+            return self._duplicate_result(order_id, marker.status, marker.reason)
+        quantities = self._quantities(items)
+        result = self._check_stock(order_id, quantities, self._read_stock(session, quantities))
+        hot, cold = self.ledger.split(quantities) if self.ledger else ({}, quantities)
+        if hot and result.status == RESERVED:
+            failed = self.ledger.hold(hot)
+            if failed:
+                # Taken by a concurrent reservation between the snapshot and the hold.
+                result = ReservationResult(order_id, REJECTED, f"Insufficient stock for product {failed}")
+            else:
+                held.update(hot)
+                self._journal(session, [(order_id, hot)])
+        if cold and result.status == RESERVED:
+            self._decrement_stock(session, cold)
+        session.execute(insert(table).values(
+            order_id=order_id, status=result.status, reason=result.reason, processed_at=datetime.utcnow()))
+        return result
+
+    def _journal(self, session, reservations: List[Tuple[str, Dict[str, int]]]):
+        # Only hot-SKU lines are journaled; cold products were decremented in place.
+        now = datetime.utcnow()
+        rows = [{"order_id": order_id, "product_id": product_id, "quantity": quantity, "created_at": now}
+                for order_id, quantities in reservations
+                for product_id, quantity in quantities.items() if self.ledger.is_hot(product_id)]
+        if rows:
+            session.execute(insert(LedgerJournalModel.__table__), rows)
+
+    def _release(self, held: Dict[str, int]):
+        if held:
+            self.ledger.release(held)
+
+    def flush_ledger(self) -> int:
+        """
+        Write-behind: applies the journal to products.stock in one transaction (one UPDATE per
+        hot SKU) and deletes the applied rows. Then the hot rows are re-read in that transaction
+        and changes made by other writers (restocks) are synced into the ledger.
+        Returns the number of journal rows flushed.
+        """
+        with self._flush_lock:
+            return self._flush_ledger()
+
+    def _flush_ledger(self) -> int:
+        session = self.Session()
+        try:
+            # DELETE ... RETURNING: exactly the deleted rows are applied, even if reservations
+            # commit new journal rows while the flush runs.
+            journal = LedgerJournalModel.__table__
+            totals: Dict[str, int] = {}
+            rows = session.execute(delete(journal).returning(journal.c.product_id, journal.c.quantity)).all()
+            for product_id, quantity in rows:
+                totals[product_id] = totals.get(product_id, 0) + quantity
+            if totals:
+                table = ProductModel.__table__
+                session.execute(
+                    update(table)
+                    .where(table.c.product_id == bindparam("v_product_id"))
+                    .values(stock=table.c.stock - bindparam("v_quantity")),
+                    [{"v_product_id": product_id, "v_quantity": quantity}
+                     for product_id, quantity in sorted(totals.items())])
+            # Locked until commit: the rows read are exactly the stock the sync starts from.
+            stock = self._lock_stock(session, sorted(self.ledger.product_ids))
+            session.commit()
+            changes = self.ledger.sync(totals, stock)
+            if changes:
+                print(f"Hot-SKU ledger synced external stock changes: {changes}")
+            return len(rows)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def reconcile_ledger(self):
+        """
+        Startup reconciliation: journal rows left by a crash (committed reservations not yet
+        written behind) are applied first, then the ledger is loaded from products.stock.
+        Reservations that were not committed were never acknowledged: the broker redelivers them.
+        """
+        flushed = self.flush_ledger()
+        session = self.Session()
+        try:
+            table = ProductModel.__table__
+            stock = dict(session.execute(
+                select(table.c.product_id, table.c.stock)
+                .where(table.c.product_id.in_(sorted(self.ledger.product_ids)))).all())
+        finally:
+            session.close()
+        self.ledger.load(stock)
+        print(f"Hot-SKU ledger reconciled ({flushed} journal rows applied): {stock}")
+
+    def _decrement_stock(self, session, quantities: Dict[str, int]):
+        # Conditional set-based decrement: a row is only updated while stock >= qty, so stock
+        # can never go negative even if the rows were not locked (defense in depth).
+        table = ProductModel.__table__
+        if self.engine.dialect.name == "postgresql":
+            batch = values(column("product_id", String), column("quantity", Integer), name="v").data(
+                list(quantities.items()))
+            updated = session.execute(
+                update(table)
+                .where(table.c.product_id == batch.c.product_id, table.c.stock >= batch.c.quantity)
+                .values(stock=table.c.stock - batch.c.quantity)).rowcount
+        else:
+            # SQLite has no column aliases for VALUES: executemany of the same conditional UPDATE.
+            updated = session.execute(
+                update(table)
+                .where(table.c.product_id == bindparam("v_product_id"), table.c.stock >= bindparam("v_quantity"))
+                .values(stock=table.c.stock - bindparam("v_quantity")),
+                [{"v_product_id": product_id, "v_quantity": quantity}
+                 for product_id, quantity in quantities.items()]).rowcount
+        if updated != len(quantities):
+            # Cannot happen with the rows locked; abort (and let the consumer retry) rather
+            # than reserve part of the order.
+            raise RuntimeError(f"Stock changed during reservation ({updated}/{len(quantities)} rows updated)")
@@ -1,91 +1,110 @@
-import pika
-import json
 import os
-import time
-from tenacity import retry, stop_after_attempt, wait_fixed
+from typing import List, Tuple
 from ...application.services import ReserveInventoryUseCase
+from ...domain.models import ResultsNotPublishedError
 from ...domain.ports import InventoryRepository, EventPublisher
 from .rabbitmq_publisher import RabbitMQPublisher
+from shared.infrastructure.messaging import connection_from_url, channel_pool_from_url, BaseConsumer
+from shared.infrastructure.codecs import get_codec
+from shared.infrastructure.compression import get_compressor, DEFAULT_THRESHOLD_BYTES
+from shared.infrastructure.dedup import EventDeduplicator
 
-DLX_NAME = "integrahub_dlx"
-DLQ_NAME = "inventory_dlq"
-MAIN_EXCHANGE = "integrahub_exchange"
-MAIN_QUEUE = "inventory_queue"
+SERVICE_NAME = "inventory"  # => inventory_queue / inventory_dlq / inventory_dlq_key
+DEFAULT_RETRY_DELAYS_MS = [1000, 5000, 30000]  # => inventory_retry_1000ms, ...
 
 class RabbitMQConsumer:
-    def __init__(self, amqp_url: str, repository: InventoryRepository):
+    def __init__(self, amqp_url: str, repository: InventoryRepository, publisher_confirms: bool = False,
+                 workers: int = 0, prefetch_count: int = None, retry_delays_ms: List[int] = None,
+                 codec: str = None, compression: str = None,
+                 compression_threshold: int = DEFAULT_THRESHOLD_BYTES, batch_size: int = 0,
+                 batch_max_wait_ms: int = 20, deduplicator: EventDeduplicator = None):
         self.amqp_url = amqp_url
+        # batch_size > 0 => micro-batch mode: up to batch_size OrderCreated events (or those
+        # received within batch_max_wait_ms) are reserved in one transaction and acked together.
+        self.batch_size = batch_size
+        self.batch_max_wait_ms = batch_max_wait_ms
         self.repository = repository
-        self.connection = None
-        self.channel = None
+        self.publisher_confirms = publisher_confirms
+        self.codec = get_codec(codec)
+        self.compressor = get_compressor(compression, compression_threshold)
+        self.connection_wrapper = connection_from_url(amqp_url)
+        # Shared consumer: DLX/DLQ topology, QoS, (optional) worker pool and delayed retry tiers.
+        # The requirement says "messages that cannot be processed after 3 retries" -> DLQ:
+        # each failure is parked in a TTL delay queue (one per tier) instead of sleeping
+        # inside the callback, so healthy messages keep flowing meanwhile.
+        # deduplicator (optional): redelivered OrderCreated events are acked from the in-process
+        # cache without a DB round trip; the processed-order marker stays the authoritative check.
+        self.consumer = BaseConsumer(self.connection_wrapper, SERVICE_NAME,
+                                     prefetch_count=prefetch_count, workers=workers,
+                                     retry_delays_ms=retry_delays_ms if retry_delays_ms is not None else DEFAULT_RETRY_DELAYS_MS,
+                                     deduplicator=deduplicator)
+        # Handlers may run on worker threads, so results are published through
+        # a channel pool instead of the consumer's own (non thread-safe) connection.
+        self.publisher_pool = channel_pool_from_url(amqp_url, max_size=max(1, workers))
 
     def connect(self):
         # Connection with retry handled by main loop or orchestator, 
         # but here we establish the channel and topology.
-        params = pika.URLParameters(self.amqp_url)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
-
-        # 1. Declare DLX and DLQ
-        self.channel.exchange_declare(exchange=DLX_NAME, exchange_type='direct', durable=True)
-        self.channel.queue_declare(queue=DLQ_NAME, durable=True)
-        self.channel.queue_bind(queue=DLQ_NAME, exchange=DLX_NAME, routing_key="inventory_dlq_key")
-
-        # 2. Declare Main Exchange and Queue with DLX args
-        self.channel.exchange_declare(exchange=MAIN_EXCHANGE, exchange_type='topic', durable=True)
-        
-        args = {
-            'x-dead-letter-exchange': DLX_NAME,
-            'x-dead-letter-routing-key': 'inventory_dlq_key'
-        }
-        self.channel.queue_declare(queue=MAIN_QUEUE, durable=True, arguments=args)
+        # 1. DLX/DLQ + Main Exchange and Queue with DLX args (BaseConsumer)
+        self.consumer.setup_topology()
         
-        # 3. Bind OrderCreated events
+        # 2. Bind OrderCreated events
         # Correction: Use wildcard to match any producer (order.OrderCreated, orders.OrderCreated, etc)
-        self.channel.queue_bind(exchange=MAIN_EXCHANGE, queue=MAIN_QUEUE, routing_key="*.OrderCreated")
-
-        # Set QoS
-        self.channel.basic_qos(prefetch_count=1)
+        self.consumer.bind_event("*.OrderCreated")
 
     def start_consuming(self):
         self.connect()
-        # Initialize publisher with the same channel/connection
-        publisher = RabbitMQPublisher(host="ignored", channel=self.channel)
+        publisher = RabbitMQPublisher(self.publisher_pool, confirm_delivery=self.publisher_confirms, codec=self.codec,
+                                      compressor=self.compressor)
         use_case = ReserveInventoryUseCase(self.repository, publisher)
 
-        print(f" [*] Waiting for messages in {MAIN_QUEUE}")
+        def callback(message: dict, correlation_id: str):
+            print(f" [x] Received {message}")
+            # If we raise here, BaseConsumer schedules a delayed retry (next tier) or,
+            # once the tiers are exhausted, NACKs with requeue=False, which sends
+            # the message to the DLX (because of x-dead-letter-exchange).
+            event_data = message.get("data")
+            
+            order_id = event_data.get("order_id")
+            items = event_data.get("items")
+            
+            use_case.execute(order_id, items)
 
-        def callback(ch, method, properties, body):
-            print(f" [x] Received {body}")
+        def batch_callback(batch: List[Tuple[dict, str]]) -> List[bool]:
+            orders = [(message.get("data").get("order_id"), message.get("data").get("items"))
+                      for message, _ in batch]
+            print(f" [x] Received batch of {len(orders)} orders")
             try:
-                # Local retry logic inside functionality using Tenacity or simple loop
-                # The requirement says "messages that cannot be processed after 3 retries" -> DLQ.
-                # If we raise Exception here without catching, RabbitMQ will retry indefinitely 
-                # unless we manage 'requeue'.
-                # To implement "3 retries then DLQ", we try-catch up to 3 times here.
-                
-                self._process_message_with_retries(use_case, body)
-                
-                # If successful, Ack
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-            
+                use_case.execute_batch(orders)
+                return [True] * len(orders)
+            except ResultsNotPublishedError as e:
+                # The batch is committed: reserving again order by order would only find the
+                # markers. Fail the messages; their retry re-publishes the stored decisions.
+                print(f" [!] Batch reserved but not published ({e}); scheduling retry")
+                return [False] * len(orders)
             except Exception as e:
-                print(f" [!] Failed to process after retries: {e}")
-                # Nack with requeue=False sends it to DLX (because of x-dead-letter-exchange)
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                # One bad order (or a concurrent duplicate) must not fail its neighbours:
+                # retry order by order, so only the failing ones go to the retry tiers / DLQ.
+                print(f" [!] Batch reservation failed ({e}); retrying order by order")
+                return [self._execute_one(use_case, order_id, items) for order_id, items in orders]
 
-        self.channel.basic_consume(queue=MAIN_QUEUE, on_message_callback=callback)
-        self.channel.start_consuming()
+        try:
+            if self.batch_size > 0:
+                self.consumer.start_consuming_batch(batch_callback, batch_size=self.batch_size,
+                                                    max_wait_ms=self.batch_max_wait_ms)
+            else:
+                self.consumer.start_consuming(callback)
+        finally:
+            self.publisher_pool.close()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1), reraise=True)
-    def _process_message_with_retries(self, use_case, body):
-        data = json.loads(body)
-        event_data = data.get("data")
-        
-        order_id = event_data.get("order_id")
-        items = event_data.get("items")
-        
-        use_case.execute(order_id, items)
+    @staticmethod
+    def _execute_one(use_case: ReserveInventoryUseCase, order_id: str, items: List[dict]) -> bool:
+        try:
+            use_case.execute(order_id, items)
+            return True
+        except Exception as e:
+            print(f" [!] Reservation failed for order {order_id}: {e}")
+            return False
 
 if __name__ == "__main__":
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
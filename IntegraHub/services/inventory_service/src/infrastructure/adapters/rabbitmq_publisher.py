@@ -1,28 +1,34 @@
-import json
-import pika
-import os
+import uuid
 from ...domain.ports import EventPublisher
+from shared.infrastructure.messaging import BasePublisher, build_event
+from shared.infrastructure.codecs import EventCodec
+from shared.infrastructure.compression import PayloadCompressor
 
 class RabbitMQPublisher(EventPublisher):
-    def __init__(self, host: str, channel):
-        # We share the channel from the consumer if possible, or create new.
-        # For simplicity and thread safety, let's assume we might reuse or create.
-        # Here we accept an existing channel to Publish on the same connection.
-        self.channel = channel
-        self.exchange = 'integrahub_exchange'
+    def __init__(self, connection, confirm_delivery: bool = False, codec: EventCodec = None,
+                 compressor: PayloadCompressor = None):
+        # connection: RabbitMQConnection or RabbitMQChannelPool (required when the
+        # consumer runs handlers on worker threads).
+        # confirm_delivery=True waits for the broker to confirm each published event.
+        # codec: body serialization (None => fastest available JSON codec).
+        # compressor: optional gzip/zstd compression of large bodies (None => disabled).
+        self.publisher = BasePublisher(connection, confirm_delivery=confirm_delivery, codec=codec,
+                                       compressor=compressor)
 
     def publish(self, topic: str, event_type: str, data: dict):
-        routing_key = f"{topic}.{event_type}"
-        message = {
-            "event_type": event_type,
-            "data": data
-        }
-        
-        self.channel.basic_publish(
-            exchange=self.exchange,
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,
-            )
-        )
+        self.publisher.publish_envelope(*self._envelope(topic, event_type, data))
+
+    def publish_batch(self, events: list):
+        # One broker confirmation for the whole batch
+        self.publisher.publish_envelopes([self._envelope(*event) for event in events])
+
+    @staticmethod
+    def _envelope(topic: str, event_type: str, data: dict):
+        # A redelivered order re-publishes its stored decision (ReserveInventoryUseCase), so the
+        # event_id is derived from (event_type, order_id): the copy reaches deduplicating
+        # consumers (payment charges, analytics) with the same message_id and is skipped there.
+        routing_key, envelope = build_event(topic, event_type, data)
+        if data.get("order_id"):
+            envelope.event_id = str(uuid.uuid5(uuid.NAMESPACE_URL,
+                                               f"integrahub/inventory/{event_type}/{data['order_id']}"))
+        return routing_key, envelope
@@ -1,7 +1,10 @@
 import os
-import time
 from .adapters.postgres_repository import PostgresInventoryRepository
 from .adapters.rabbitmq_consumer import RabbitMQConsumer
+from .adapters.hot_sku_ledger import LedgerFlusher
+from shared.infrastructure.metrics import start_metrics_server, register_pool_metrics
+from shared.infrastructure.readiness import StartupReadiness, probe_postgres, probe_rabbitmq
+from shared.infrastructure.dedup import EventDeduplicator, SqlProcessedEventStore
 
 def main():
     print("Starting Inventory Service...")
@@ -11,14 +14,76 @@ def main():
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
     DATABASE_URL = f"postgresql://user:password@{DB_HOST}:5432/integrahub_db"
     AMQP_URL = f"amqp://user:password@{RABBITMQ_HOST}:5672/%2f"
+    PUBLISHER_CONFIRMS = os.getenv("RABBITMQ_PUBLISHER_CONFIRMS", "true").lower() == "true"
+    # Concurrent handlers: each order is reserved atomically (row locks + conditional
+    # decrements in one transaction), so several workers cannot oversell a product.
+    CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "4"))
+    CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "0")) or None
+    # Micro-batch mode for OrderCreated bursts (0 => one transaction and ACK per message).
+    # Batches are handled on the I/O thread, so CONSUMER_WORKERS is ignored when enabled.
+    RESERVATION_BATCH_SIZE = int(os.getenv("RESERVATION_BATCH_SIZE", "0"))
+    RESERVATION_BATCH_MAX_WAIT_MS = int(os.getenv("RESERVATION_BATCH_MAX_WAIT_MS", "20"))
+    # Hot SKUs (comma-separated product ids) reserved from an in-memory ledger and written
+    # behind to products every HOT_SKU_FLUSH_INTERVAL_MS. Only one inventory instance may own them,
+    # and no other writer may decrement their stock (restocks are picked up at each flush).
+    HOT_SKUS = [p.strip() for p in os.getenv("HOT_SKUS", "").split(",") if p.strip()]
+    HOT_SKU_FLUSH_INTERVAL_MS = int(os.getenv("HOT_SKU_FLUSH_INTERVAL_MS", "500"))
+    # Shared event deduplication by event_id (LRU + processed_events table) in front of the
+    # processed-order marker, which still guards every reservation transaction.
+    EVENT_DEDUP = os.getenv("EVENT_DEDUP", "false").lower() == "true"
+    EVENT_DEDUP_CACHE_SIZE = int(os.getenv("EVENT_DEDUP_CACHE_SIZE", "100000"))
+    EVENT_DEDUP_TTL_HOURS = float(os.getenv("EVENT_DEDUP_TTL_HOURS", "24"))
+    EVENT_DEDUP_COMPACTION_SECONDS = float(os.getenv("EVENT_DEDUP_COMPACTION_SECONDS", "600"))
+    EVENT_DEDUP_LEASE_SECONDS = float(os.getenv("EVENT_DEDUP_LEASE_SECONDS", "30"))
+    # Delayed retry tiers (ms) before a failed message goes to the DLQ
+    RETRY_DELAYS_MS = [int(d) for d in os.getenv("RETRY_DELAYS_MS", "1000,5000,30000").split(",") if d.strip()]
+    # Body codec for published events: json / orjson / msgpack (empty => fastest available JSON)
+    EVENT_CODEC = os.getenv("EVENT_CODEC") or None
+    # Optional gzip/zstd compression for published bodies >= threshold (empty => disabled)
+    PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION") or None
+    COMPRESSION_THRESHOLD_BYTES = int(os.getenv("COMPRESSION_THRESHOLD_BYTES", "1024"))
+    # Prometheus exposition (GET /metrics) on a separate port; 0 disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+    # Max seconds to wait for dependencies at startup (probed with backoff, no fixed sleep)
+    STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
 
     # Infrastructure Setup
-    # Wait for DB to be ready (Primitive wait, in prod use healthchecks/wait-for-it)
-    time.sleep(5) 
-    
-    repository = PostgresInventoryRepository(DATABASE_URL)
+    # Probe Postgres and RabbitMQ concurrently with backoff (/health/live and /health/ready on METRICS_PORT)
+    readiness = StartupReadiness({"postgres": probe_postgres(DATABASE_URL), "rabbitmq": probe_rabbitmq(AMQP_URL)},
+                                 timeout=STARTUP_TIMEOUT_SECONDS)
+    start_metrics_server(METRICS_PORT, readiness=readiness)
+    readiness.wait()
+
+    # With HOT_SKUS the ledger is reconciled against the DB here, before consuming.
+    repository = PostgresInventoryRepository(DATABASE_URL, hot_skus=HOT_SKUS)
+    flusher = None
+    if repository.ledger:
+        flusher = LedgerFlusher(repository, interval=HOT_SKU_FLUSH_INTERVAL_MS / 1000.0)
+        flusher.start()
     
-    consumer = RabbitMQConsumer(amqp_url=AMQP_URL, repository=repository)
+    deduplicator = None
+    if EVENT_DEDUP:
+        deduplicator = EventDeduplicator("inventory", SqlProcessedEventStore(DATABASE_URL),
+                                         cache_size=EVENT_DEDUP_CACHE_SIZE, ttl_seconds=EVENT_DEDUP_TTL_HOURS * 3600,
+                                         lease_seconds=EVENT_DEDUP_LEASE_SECONDS)
+        deduplicator.start_compaction(EVENT_DEDUP_COMPACTION_SECONDS)
+
+    consumer = RabbitMQConsumer(
+        amqp_url=AMQP_URL,
+        repository=repository,
+        publisher_confirms=PUBLISHER_CONFIRMS,
+        workers=CONSUMER_WORKERS,
+        prefetch_count=CONSUMER_PREFETCH,
+        retry_delays_ms=RETRY_DELAYS_MS,
+        codec=EVENT_CODEC,
+        compression=PAYLOAD_COMPRESSION,
+        compression_threshold=COMPRESSION_THRESHOLD_BYTES,
+        batch_size=RESERVATION_BATCH_SIZE,
+        batch_max_wait_ms=RESERVATION_BATCH_MAX_WAIT_MS,
+        deduplicator=deduplicator
+    )
+    register_pool_metrics(consumer.publisher_pool, "inventory_publisher")
+    readiness.mark_ready()
     
     try:
         consumer.start_consuming()
@@ -26,6 +91,9 @@ def main():
         print("Stopping...")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if flusher:
+            flusher.stop()
 
 if __name__ == "__main__":
     main()
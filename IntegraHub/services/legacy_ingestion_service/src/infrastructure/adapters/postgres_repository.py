@@ -1,10 +1,12 @@
 from sqlalchemy import create_engine, text
 from ...domain.ports import InventoryRepository
 from ...domain.models import LegacyProduct
+from shared.infrastructure.metrics import instrument_engine
 
 class PostgresInventoryRepository(InventoryRepository):
     def __init__(self, db_url: str):
         self.engine = create_engine(db_url)
+        instrument_engine(self.engine, "legacy_ingestion")
 
     def upsert_bulk(self, products: list[LegacyProduct]):
         # We assume the 'products' table exists from Inventory Service infrastructure.
@@ -1,8 +1,9 @@
 import os
-import time
 from .adapters.postgres_repository import PostgresInventoryRepository
 from .adapters.file_monitor import FileMonitorAdapter
 from ..application.services import IngestFileUseCase
+from shared.infrastructure.metrics import start_metrics_server
+from shared.infrastructure.readiness import StartupReadiness, probe_postgres
 
 def main():
     print("Starting Legacy Ingestion Service...")
@@ -12,9 +13,15 @@ def main():
     # Using the same DB as Inventory Service
     DATABASE_URL = f"postgresql://user:password@{DB_HOST}:5432/integrahub_db"
     INBOX_PATH = "/app/data" # Local Docker volume path
+    # Prometheus exposition (GET /metrics) on a separate port; 0 disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+    # Max seconds to wait for dependencies at startup (probed with backoff, no fixed sleep)
+    STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
 
-    # Wait for DB
-    time.sleep(10)
+    # Wait for DB (/health/live and /health/ready on METRICS_PORT)
+    readiness = StartupReadiness({"postgres": probe_postgres(DATABASE_URL)}, timeout=STARTUP_TIMEOUT_SECONDS)
+    start_metrics_server(METRICS_PORT, readiness=readiness)
+    readiness.wait()
 
     # 1. Adapter - Repository
     repository = PostgresInventoryRepository(DATABASE_URL)
@@ -27,6 +34,7 @@ def main():
     if not os.path.exists(INBOX_PATH):
         os.makedirs(INBOX_PATH)
 
+    readiness.mark_ready()
     monitor = FileMonitorAdapter(INBOX_PATH, use_case)
     monitor.start()
 
@@ -1,24 +1,19 @@
-import pika
-import json
 from ...application.services import NotificationUseCase
+from shared.infrastructure.messaging import connection_from_url, BaseConsumer
 
-EXCHANGE_NAME = "integrahub_exchange"
-QUEUE_NAME = "notification_queue"
+SERVICE_NAME = "notification"  # => notification_queue
 
 class RabbitMQConsumer:
-    def __init__(self, amqp_url: str, use_case: NotificationUseCase):
+    def __init__(self, amqp_url: str, use_case: NotificationUseCase, workers: int = 0, prefetch_count: int = None):
         self.amqp_url = amqp_url
         self.use_case = use_case
-        self.connection = None
-        self.channel = None
+        self.connection_wrapper = connection_from_url(amqp_url)
+        # use_dlq=False: notifications are best-effort, the queue has no DLX.
+        self.consumer = BaseConsumer(self.connection_wrapper, SERVICE_NAME,
+                                     prefetch_count=prefetch_count, workers=workers, use_dlq=False)
 
     def connect(self):
-        params = pika.URLParameters(self.amqp_url)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
-
-        self.channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='topic', durable=True)
-        self.channel.queue_declare(queue=QUEUE_NAME, durable=True)
+        self.consumer.setup_topology()
 
         # Retrieve all relevant events for Notifications
         # Binding keys: *.<Event> allows catching from any service (Source independent)
@@ -32,34 +27,30 @@ class RabbitMQConsumer:
         ]
         
         for key in binding_keys:
-            self.channel.queue_bind(exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key=key)
+            self.consumer.bind_event(key)
             
         print(f" [*] Bound to keys: {binding_keys}")
 
     def start_consuming(self):
         self.connect()
 
-        def callback(ch, method, properties, body):
+        def callback(payload: dict, correlation_id: str):
             try:
-                payload = json.loads(body)
                 event_type = payload.get("event_type")
                 data = payload.get("data")
                 
                 print(f" [x] Notification Service received: {event_type}")
                 
                 self.use_case.execute(event_type, data)
-                
-                ch.basic_ack(delivery_tag=method.delivery_tag)
             except Exception as e:
                 print(f" [!] Error processing notification: {e}")
                 # We ack to avoid loop on bad message for notifications (fire and forget mostly)
                 
                 # Diseño intencional:
                 # Notificaciones son "best-effort" / fire-and-forget.
-                # Se hace ACK para evitar loops de reintentos ante payloads inválidos.
+                # No se relanza la excepción => BaseConsumer hace ACK y se evitan loops
+                # de reintentos ante payloads inválidos.
                 # En flujos críticos (pagos/inventario), se usaría NACK(requeue=False) + DLQ.
-                ch.basic_ack(delivery_tag=method.delivery_tag)
 
-        self.channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
         print(' [*] Waiting for notification events...')
-        self.channel.start_consuming()
+        self.consumer.start_consuming(callback)
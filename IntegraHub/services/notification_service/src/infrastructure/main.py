@@ -1,8 +1,9 @@
 import os
-import time
 from .adapters.notification_channels import SlackAdapter, EmailAdapter
 from .adapters.rabbitmq_consumer import RabbitMQConsumer
 from ..application.services import NotificationUseCase
+from shared.infrastructure.metrics import start_metrics_server
+from shared.infrastructure.readiness import StartupReadiness, probe_rabbitmq
 
 def main():
     print("Starting Notification Service...")
@@ -13,8 +14,18 @@ def main():
     # Por eso `.env.example` define RABBITMQ_USER=user y RABBITMQ_PASSWORD=password,
     # para mantener consistencia con los contenedores.
     AMQP_URL = f"amqp://user:password@{RABBITMQ_HOST}:5672/%2f"
-
-    time.sleep(10) # Wait for RabbitMQ
+    # Concurrent handlers: channel calls (Slack/SMTP) are I/O bound.
+    CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "4"))
+    CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "0")) or None
+    # Prometheus exposition (GET /metrics) on a separate port; 0 disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+    # Max seconds to wait for dependencies at startup (probed with backoff, no fixed sleep)
+    STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
+
+    # Wait for RabbitMQ (/health/live and /health/ready on METRICS_PORT)
+    readiness = StartupReadiness({"rabbitmq": probe_rabbitmq(AMQP_URL)}, timeout=STARTUP_TIMEOUT_SECONDS)
+    start_metrics_server(METRICS_PORT, readiness=readiness)
+    readiness.wait()
 
     # 1. Initialize Adapters
     slack_channel = SlackAdapter()
@@ -24,7 +35,13 @@ def main():
     use_case = NotificationUseCase(channels=[slack_channel, email_channel])
 
     # 3. Initialize Consumer
-    consumer = RabbitMQConsumer(amqp_url=AMQP_URL, use_case=use_case)
+    consumer = RabbitMQConsumer(
+        amqp_url=AMQP_URL,
+        use_case=use_case,
+        workers=CONSUMER_WORKERS,
+        prefetch_count=CONSUMER_PREFETCH
+    )
+    readiness.mark_ready()
 
     try:
         consumer.start_consuming()
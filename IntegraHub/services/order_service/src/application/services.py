@@ -3,59 +3,148 @@
 # No conoce detalles de infraestructura (DB/RabbitMQ); depende de puertos (interfaces) del dominio.
  
 
-from ..domain.models import Order, OrderItem
-from ..domain.ports import OrderRepository, EventPublisher
+import hashlib
+import json
+from ..domain.models import Order, OrderItem, IdempotencyRecord, DuplicateRequestError
+from ..domain.ports import OrderRepository, OrderReadModel, OrderStatusNotifier
+
+def request_fingerprint(customer_id: str, items_data: list) -> str:
+    # Huella estable del request (independiente del orden de las claves) para detectar
+    # una idempotency key reutilizada con otro payload.
+    canonical = json.dumps({"customer_id": customer_id, "items": items_data}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def created_response(order: Order) -> dict:
+    # Respuesta de la API para una orden creada; se guarda con la idempotency key para el replay.
+    return {"order_id": order.order_id, "status": "CREATED", "message": "Order processed successfully"}
 
 class CreateOrderUseCase:
-    def __init__(self, repository: OrderRepository, publisher: EventPublisher):
-        # repository: Port para persistencia (implementado en infraestructura)
-        # publisher: Port para publicación de eventos (implementado en infraestructura)
+    def __init__(self, repository: OrderRepository, read_model: OrderReadModel = None):
+        # repository: Port para persistencia (implementado en infraestructura).
+        # La publicación de eventos ya no ocurre en la request: el evento se guarda en el
+        # outbox junto con la orden y OutboxRelay lo publica en segundo plano.
+        # read_model (opcional): vista de lectura que recibe cada orden creada.
         self.repository = repository
-        self.publisher = publisher
+        self.read_model = read_model
 
     def execute(self, customer_id: str, items_data: list, idempotency_key: str = None) -> Order:
-        # Idempotency Check:
+        # Idempotency:
         # Se aplica idempotencia en la API usando un key externo (X-Idempotency-Key).
         # Evita duplicados si el cliente reintenta la misma solicitud por timeout/red.
+        # El repositorio hace insert-or-fetch de la key en la misma transacción que la orden;
+        # si ya existía lanza DuplicateRequestError con la respuesta original (replay).
+        order, events = self._build_order(customer_id, items_data)
+        record = None
+        if idempotency_key:
+            record = IdempotencyRecord(key=idempotency_key, order_id=order.order_id,
+                                       response=created_response(order),
+                                       request_hash=request_fingerprint(customer_id, items_data))
+
+        # Persistencia vía Port (OrderRepository): orden + idempotency key + evento (outbox)
+        # en un solo commit. La latencia de POST /orders ya no depende del broker.
+        try:
+            saved_order = self.repository.save(order, idempotency=record, events=events)
+        except DuplicateRequestError as e:
+            if e.record.request_hash and e.record.request_hash != record.request_hash:
+                raise ValueError(f"Idempotency key {idempotency_key} was already used with a different request.")
+            raise
+        if self.read_model:
+            self.read_model.put(saved_order)
+        return saved_order
 
-        if idempotency_key and self.repository.exists_idempotency_key(idempotency_key):
-            raise ValueError(f"Order with idempotency key {idempotency_key} already processed.")
+    def execute_batch(self, orders_data: list) -> list:
+        """
+        Crea un lote de órdenes [{customer_id, items, idempotency_key?}] con un solo chequeo de
+        idempotencia y una sola transacción. Retorna un resultado por orden, en el mismo orden:
+        {"order_id", "status": "CREATED" | "DUPLICATE", "message"}.
+        """
+        keys = list({data.get("idempotency_key") for data in orders_data if data.get("idempotency_key")})
+        for attempt in range(2):
+            results, entries = self._plan_batch(orders_data, self.repository.find_idempotency_keys(keys))
+            try:
+                saved_orders = self.repository.save_batch(entries)
+                if self.read_model:
+                    for order in saved_orders:
+                        self.read_model.put(order)
+                return results
+            except ValueError:
+                # Otra request guardó una de las keys entre el chequeo y el commit:
+                # se re-chequean las keys y se reintenta una vez sin las duplicadas.
+                if attempt:
+                    raise
 
+    def _plan_batch(self, orders_data: list, used_keys: dict):
+        results, entries = [], []
+        used_keys = dict(used_keys)
+        for data in orders_data:
+            key = data.get("idempotency_key")
+            if key and key in used_keys:
+                # Repetida contra la DB o dentro del mismo lote: se informa la orden original.
+                results.append({"order_id": used_keys[key], "status": "DUPLICATE",
+                                "message": f"Order with idempotency key {key} already processed."})
+                continue
+            order, events = self._build_order(data["customer_id"], data["items"])
+            response = created_response(order)
+            record = None
+            if key:
+                used_keys[key] = order.order_id
+                record = IdempotencyRecord(key=key, order_id=order.order_id, response=response,
+                                           request_hash=request_fingerprint(data["customer_id"], data["items"]))
+            entries.append((order, record, events))
+            results.append(response)
+        return results, entries
+
+    def _build_order(self, customer_id: str, items_data: list):
         # Logic
         # Construcción del agregado Order desde DTOs (sin FastAPI/Pydantic aquí).
         # Domain Models deben permanecer libres de frameworks de infraestructura.
         order_items = [OrderItem(**item) for item in items_data]
         order = Order(customer_id=customer_id, items=order_items)
-        
-        # Persistencia vía Port (OrderRepository)
-        saved_order = self.repository.save(order)
-        if idempotency_key:
-            # Guardamos el idempotency key para evitar reprocesar la misma orden.
-            self.repository.save_idempotency_key(idempotency_key, saved_order.order_id)
 
-        # Publicación de evento de integración:
+        # Evento de integración:
         # - topic: "orders"
         # - event_type: "OrderCreated"
         # El payload contiene los campos necesarios para servicios consumidores (payment/inventory/notification).
         event_payload = {
-            "order_id": saved_order.order_id,
-            "customer_id": saved_order.customer_id,
-            "total_amount": saved_order.total_amount,
-            "items": [{"product_id": i.product_id, "quantity": i.quantity} for i in saved_order.items],
-            "status": saved_order.status
+            "order_id": order.order_id,
+            "customer_id": order.customer_id,
+            "total_amount": order.total_amount,
+            "items": [{"product_id": i.product_id, "quantity": i.quantity} for i in order.items],
+            "status": order.status
         }
-        
-        # Event Publisher Port: desacopla el caso de uso del broker (RabbitMQ).
-        self.publisher.publish("orders", "OrderCreated", event_payload)
-        
-        return saved_order
+        return order, [("orders", "OrderCreated", event_payload)]
 
 class UpdateOrderStatusUseCase:
-    def __init__(self, repository: OrderRepository):
+    def __init__(self, repository: OrderRepository, read_model: OrderReadModel = None,
+                 notifier: OrderStatusNotifier = None):
         # Caso de uso para sincronizar el estado de la orden
         # desde eventos externos (OrderConfirmed / OrderRejected).
+        # notifier (opcional): empuja el cambio a los clientes suscritos (SSE / long-poll).
         self.repository = repository
+        self.read_model = read_model
+        self.notifier = notifier
 
     def execute(self, order_id: str, status: str):
-        # Actualización simple delegada al repositorio.
+        # Actualización simple delegada al repositorio; después (DB ya actualizada) la vista de lectura.
         self.repository.update_status(order_id, status)
+        if self.read_model:
+            self.read_model.update_status(order_id, status)
+        if self.notifier:
+            self.notifier.publish(order_id, status)
+
+    def execute_batch(self, updates: list):
+        """
+        Aplica un lote [(order_id, status)] (en orden de llegada) con un solo UPDATE.
+        Si una orden aparece varias veces en el lote, gana el último estado.
+        """
+        latest = {}
+        for order_id, status in updates:
+            latest[order_id] = status
+        if not latest:
+            return
+        self.repository.update_statuses(latest)
+        for order_id, status in latest.items():
+            if self.read_model:
+                self.read_model.update_status(order_id, status)
+            if self.notifier:
+                self.notifier.publish(order_id, status)
@@ -31,3 +31,21 @@ class Order:
         # Regla: total = Σ(price * quantity)
         self.total_amount = sum(item.price * item.quantity for item in self.items)
 
+
+@dataclass
+class IdempotencyRecord:
+    # Resultado guardado de una request con X-Idempotency-Key: un reintento del cliente
+    # recibe la misma respuesta (replay) en lugar de crear otra orden.
+    key: str
+    order_id: str
+    # Respuesta original de la API (None en keys guardadas antes de existir el replay)
+    response: Optional[dict] = None
+    # Huella del request (customer_id + items): detecta una key reutilizada con otro payload
+    request_hash: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+class DuplicateRequestError(ValueError):
+    """La idempotency key ya fue procesada; `record` trae la orden y la respuesta originales."""
+    def __init__(self, record: IdempotencyRecord):
+        super().__init__(f"Order with idempotency key {record.key} already processed.")
+        self.record = record
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import Optional
-from .models import Order
+from .models import Order, IdempotencyRecord
 
 # Domain Ports (Interfaces)
 # Definen contratos que la infraestructura debe implementar.
@@ -9,7 +9,25 @@ from .models import Order
 class OrderRepository(ABC):
     """Port de persistencia: define operaciones mínimas para almacenar y consultar órdenes."""
     @abstractmethod
-    def save(self, order: Order) -> Order:
+    def save(self, order: Order, idempotency: IdempotencyRecord = None, events: list = None) -> Order:
+        """
+        Persiste la orden junto con su registro de idempotencia y los eventos de integración a
+        publicar [(topic, event_type, data)] en una sola transacción (transactional outbox).
+        Lanza DuplicateRequestError (con el registro original) si la idempotency key ya existe.
+        """
+        pass
+
+    @abstractmethod
+    def save_batch(self, entries: list) -> list[Order]:
+        """
+        Persiste un lote [(order, IdempotencyRecord | None, events)] en una sola transacción.
+        Lanza ValueError si alguna idempotency key ya existe (no se guarda ninguna orden).
+        """
+        pass
+
+    @abstractmethod
+    def find_idempotency_keys(self, keys: list) -> dict:
+        """Retorna {key: order_id} de las keys del lote que ya fueron procesadas."""
         pass
 
     @abstractmethod
@@ -19,6 +37,16 @@ class OrderRepository(ABC):
     @abstractmethod
     def get_all(self) -> list[Order]:
         pass
+
+    @abstractmethod
+    def list_orders(self, limit: int = 50, cursor: str = None, status: str = None,
+                    customer_id: str = None) -> tuple:
+        """
+        Página de órdenes (más recientes primero), opcionalmente filtrada por status/customer_id.
+        Retorna (orders, next_cursor); next_cursor es None en la última página.
+        Lanza ValueError si el cursor es inválido.
+        """
+        pass
     
     @abstractmethod
     def exists_idempotency_key(self, key: str) -> bool:
@@ -35,8 +63,39 @@ class OrderRepository(ABC):
         """Actualiza el estado de una orden (p.ej. CONFIRMED/REJECTED)."""
         pass
 
+    @abstractmethod
+    def update_statuses(self, updates: dict) -> int:
+        """
+        Aplica {order_id: status} en una sola sentencia y una sola transacción.
+        Retorna la cantidad de órdenes actualizadas (los ids inexistentes se ignoran).
+        """
+        pass
+
 class EventPublisher(ABC):
     """Port de mensajería: publica eventos de integración sin acoplarse al broker."""
     @abstractmethod
     def publish(self, topic: str, event_type: str, data: dict):
         pass
+
+    def publish_batch(self, events: list):
+        """Publica varios eventos (topic, event_type, data). Por defecto, uno a uno."""
+        for topic, event_type, data in events:
+            self.publish(topic, event_type, data)
+
+class OrderReadModel(ABC):
+    """Port de lectura: vista de órdenes recientes que los casos de uso mantienen al día."""
+    @abstractmethod
+    def put(self, order: Order):
+        """Agrega/reemplaza una orden (p.ej. recién creada)."""
+        pass
+
+    @abstractmethod
+    def update_status(self, order_id: str, status: str):
+        """Actualiza en el lugar el estado de una orden (eventos OrderConfirmed/OrderRejected)."""
+        pass
+
+class OrderStatusNotifier(ABC):
+    """Port de notificación: avisa a los suscriptores (SSE / long-poll) de cada cambio de estado."""
+    @abstractmethod
+    def publish(self, order_id: str, status: str):
+        pass
@@ -0,0 +1,83 @@
+# Infrastructure Adapter: Idempotency cache + janitor
+# - IdempotencyCache: LRU acotado en proceso con las keys recientes (X-Idempotency-Key) y su
+#   respuesta original. Un reintento del cliente (timeout/red) se responde sin tocar Postgres.
+# - IdempotencyKeyJanitor: borra por lotes las keys más viejas que el TTL (la tabla
+#   idempotency_keys ya no crece para siempre).
+# La fuente de verdad sigue siendo la tabla: el cache solo evita round trips.
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from ...domain.models import IdempotencyRecord
+from shared.infrastructure.metrics import counter
+
+IDEMPOTENCY_CACHE_LOOKUPS = counter("integrahub_idempotency_cache_lookups_total",
+                                    "Idempotency key lookups in the in-process LRU", ["result"])
+IDEMPOTENCY_KEYS_PURGED = counter("integrahub_idempotency_keys_purged_total", "Expired idempotency keys deleted")
+
+class IdempotencyCache:
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 86400):
+        self.max_size = max_size
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._records: "OrderedDict[str, IdempotencyRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.created_at < datetime.utcnow() - self.ttl:
+                # Expirada: la decide Postgres (puede seguir ahí hasta que pase el janitor).
+                del self._records[key]
+                record = None
+            if record is not None:
+                self._records.move_to_end(key)
+        IDEMPOTENCY_CACHE_LOOKUPS.labels("hit" if record is not None else "miss").inc()
+        return record
+
+    def put(self, record: IdempotencyRecord):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._records[record.key] = record
+            self._records.move_to_end(record.key)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+class IdempotencyKeyJanitor:
+    def __init__(self, repository, ttl_seconds: float = 86400, interval: float = 300.0, batch_size: int = 1000):
+        # repository: PostgresOrderRepository (purge_idempotency_keys)
+        self.repository = repository
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def purge_once(self) -> int:
+        # Lotes chicos: cada DELETE es una transacción corta que no bloquea los INSERTs de órdenes.
+        purged = self.repository.purge_idempotency_keys(datetime.utcnow() - self.ttl, self.batch_size)
+        IDEMPOTENCY_KEYS_PURGED.inc(purged)
+        return purged
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="idempotency-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                purged = self.purge_once()
+                if purged:
+                    print(f" [Idempotency] Purged {purged} expired keys")
+            except Exception as e:
+                print(f" [!] Idempotency key cleanup failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(5.0)
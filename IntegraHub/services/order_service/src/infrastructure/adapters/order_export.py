@@ -0,0 +1,54 @@
+# Infrastructure Adapter: Order export encoders (GET /orders/export)
+# Convierte los lotes de filas de PostgresOrderRepository.stream_order_rows en bytes NDJSON o CSV,
+# lote por lote: nunca se arma la lista completa de órdenes ni pasa por la validación de Pydantic.
+# Con gzip cada lote se comprime y se vacía (Z_SYNC_FLUSH) al salir, así el cliente recibe
+# datos apenas llega el primer lote en lugar de esperar a que el compresor llene su buffer.
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Sequence
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unsupported export value: {value!r}")
+
+def _ndjson_chunks(columns: Sequence[str], chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows).encode()
+
+def _csv_chunks(columns: Sequence[str], chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows([value.isoformat() if isinstance(value, datetime) else value for value in row]
+                         for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Export vacío: solo la cabecera.
+        yield buffer.getvalue().encode()
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 => formato gzip
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def encode_export(columns: Sequence[str], chunks: Iterable[List[tuple]], fmt: str = "ndjson",
+                  compress: bool = False) -> Iterator[bytes]:
+    """Genera el cuerpo del export (fmt: ndjson / csv), opcionalmente en gzip."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+    body = _ndjson_chunks(columns, chunks) if fmt == "ndjson" else _csv_chunks(columns, chunks)
+    return _gzip(body) if compress else body
@@ -0,0 +1,145 @@
+# Infrastructure Adapter: In-memory Order Read Model
+# Vista en proceso de las órdenes, mantenida por los casos de uso (no por lecturas a Postgres):
+#
+# - Órdenes individuales: LRU acotado (max_orders) para GET /orders/{order_id}.
+# - Órdenes recientes: las `recent_size` más nuevas (created_at, order_id DESC) para la
+#   primera página de GET /orders sin filtros (el refresh del dashboard). Se carga una vez
+#   desde la DB y después se mantiene con cada orden creada.
+# - CreateOrderUseCase agrega las órdenes nuevas y UpdateOrderStatusUseCase (consumidor de
+#   order_updates_queue) cambia el estado en el lugar: las lecturas casi nunca tocan Postgres.
+#
+# Supone una sola instancia de order_service escribiendo (el consumidor de estados compite
+# por la cola entre réplicas): con varias réplicas, ORDER_CACHE_SIZE=0 desactiva la vista.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from ...domain.models import Order
+from ...domain.ports import OrderReadModel
+from shared.infrastructure.metrics import counter
+
+READ_MODEL_LOOKUPS = counter("integrahub_order_read_model_lookups_total",
+                             "Order read model lookups", ["view", "result"])
+
+def _sort_key(order: Order):
+    return order.created_at, order.order_id
+
+def order_etag(order: Order) -> str:
+    # Lo único mutable de una orden es su estado: (order_id, status) identifica la representación.
+    return 'W/"' + hashlib.sha1(f"{order.order_id}:{order.status}".encode()).hexdigest()[:20] + '"'
+
+def page_etag(orders: Iterable[Order], next_cursor: Optional[str] = None) -> str:
+    digest = hashlib.sha1()
+    for order in orders:
+        digest.update(f"{order.order_id}:{order.status};".encode())
+    digest.update((next_cursor or "").encode())
+    return 'W/"' + digest.hexdigest()[:20] + '"'
+
+class InMemoryOrderReadModel(OrderReadModel):
+    def __init__(self, max_orders: int = 10000, recent_size: int = 200):
+        self.max_orders = max_orders
+        self.recent_size = recent_size if max_orders > 0 else 0
+        self._orders: "OrderedDict[str, Order]" = OrderedDict()
+        self._recent: dict = {}
+        # False hasta cargar la primera página desde la DB (load_recent)
+        self._recent_loaded = False
+        # True si existen órdenes más viejas que las de _recent (en la DB)
+        self._recent_truncated = False
+        # Estados que llegaron antes que la orden (el evento puede ganarle al put del caso de uso)
+        self._early_statuses: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Escrituras (casos de uso)
+
+    def put(self, order: Order):
+        if self.max_orders <= 0:
+            return
+        with self._lock:
+            early_status = self._early_statuses.pop(order.order_id, None)
+            if early_status:
+                order.status = early_status
+            self._remember(order)
+            if self._recent_loaded:
+                self._add_recent(order)
+
+    def update_status(self, order_id: str, status: str):
+        if self.max_orders <= 0:
+            return
+        with self._lock:
+            # Recent y LRU comparten la misma instancia de Order: se actualiza una sola vez.
+            order = self._orders.get(order_id) or self._recent.get(order_id)
+            if order is not None:
+                order.status = status
+                return
+            self._early_statuses[order_id] = status
+            while len(self._early_statuses) > self.recent_size:
+                self._early_statuses.popitem(last=False)
+
+    def load_recent(self, orders: List[Order], has_more: bool):
+        """
+        Carga la primera página desde la DB (las recent_size más nuevas).
+        has_more: la DB tiene más órdenes que las cargadas.
+        """
+        if self.recent_size <= 0:
+            return
+        with self._lock:
+            for order in orders:
+                # Si la orden ya estaba en el LRU (creada/actualizada acá), esa versión manda.
+                order = self._orders.get(order.order_id) or order
+                # Un estado que llegó mientras se leía la página quedó estacionado (la orden no
+                # estaba en la vista todavía): es más nuevo que la fila leída.
+                early_status = self._early_statuses.pop(order.order_id, None)
+                if early_status:
+                    order.status = early_status
+                self._remember(order)
+                self._add_recent(order)
+            # Órdenes creadas mientras se leía la página (ya están en el LRU, no en la lectura).
+            for order in list(self._orders.values()):
+                self._add_recent(order)
+            self._recent_truncated = self._recent_truncated or has_more
+            self._recent_loaded = True
+
+    def _remember(self, order: Order):
+        self._orders[order.order_id] = order
+        self._orders.move_to_end(order.order_id)
+        while len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+
+    def _add_recent(self, order: Order):
+        if (order.order_id not in self._recent and len(self._recent) >= self.recent_size
+                and _sort_key(order) < _sort_key(min(self._recent.values(), key=_sort_key))):
+            # Orden vieja leída por id (GET /orders/{order_id}): no pertenece a las recientes.
+            return
+        self._recent[order.order_id] = order
+        if len(self._recent) > self.recent_size:
+            oldest = min(self._recent.values(), key=_sort_key)
+            del self._recent[oldest.order_id]
+            self._recent_truncated = True
+
+    # Lecturas (API)
+
+    def get(self, order_id: str) -> Optional[Order]:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is not None:
+                self._orders.move_to_end(order_id)
+        READ_MODEL_LOOKUPS.labels("order", "hit" if order is not None else "miss").inc()
+        return order
+
+    def recent_page(self, limit: int) -> Optional[Tuple[List[Order], bool]]:
+        """
+        Primeras `limit` órdenes (más nuevas primero) y si hay más después, o None si la vista
+        no está cargada o no alcanza a cubrir la página.
+        """
+        with self._lock:
+            result = None
+            if self._recent_loaded and limit <= self.recent_size:
+                page = sorted(self._recent.values(), key=_sort_key, reverse=True)
+                result = page[:limit], len(page) > limit or self._recent_truncated
+        READ_MODEL_LOOKUPS.labels("recent", "hit" if result is not None else "miss").inc()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"orders": len(self._orders), "recent": len(self._recent), "recent_loaded": self._recent_loaded}
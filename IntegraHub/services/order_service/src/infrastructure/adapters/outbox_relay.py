@@ -0,0 +1,86 @@
+# Infrastructure Adapter: Outbox Relay
+# Publica en segundo plano los eventos del transactional outbox (tabla order_outbox).
+#
+# - CreateOrderUseCase guarda orden + evento en un solo commit; este relay drena el outbox
+#   en lotes de hasta batch_size con UNA confirmación del broker por lote (publish_envelopes).
+# - Las filas se borran en la misma transacción que las reservó, después de la confirmación.
+#   Si el broker falla, la transacción hace rollback y el lote se reintenta con backoff.
+# - Garantía at-least-once: si el commit de DB falla DESPUÉS de la confirmación, el lote se
+#   re-publica con los mismos event_id (message_id), que el consumidor puede deduplicar.
+
+import threading
+from datetime import datetime
+from shared.infrastructure.metrics import counter, histogram
+
+OUTBOX_RELAYED = counter("integrahub_outbox_relayed_total", "Outbox events published by the relay")
+OUTBOX_FAILURES = counter("integrahub_outbox_relay_failures_total", "Outbox batches that failed to publish")
+OUTBOX_LAG = histogram("integrahub_outbox_lag_seconds", "Time from order commit to broker confirmation")
+
+class OutboxRelay:
+    def __init__(self, repository, publisher, batch_size: int = 100, poll_interval: float = 0.5,
+                 max_backoff: float = 10.0):
+        # repository: PostgresOrderRepository (claim_outbox / add_outbox_listener)
+        # publisher: RabbitMQPublisherAdapter (publish_envelopes)
+        # poll_interval: espera máxima entre lecturas si nadie avisa de eventos nuevos (segundos).
+        self.repository = repository
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {"relayed": 0, "batches": 0, "failures": 0, "last_error": None}
+        # Cada commit con eventos despierta al relay: la latencia no depende del poll_interval.
+        repository.add_outbox_listener(self.wake)
+
+    def wake(self):
+        self._wake_event.set()
+
+    def relay_once(self) -> int:
+        """Publica un lote del outbox. Retorna la cantidad de eventos publicados."""
+        with self.repository.claim_outbox(self.batch_size) as messages:
+            if messages:
+                self.publisher.publish_envelopes(messages)
+        if messages:
+            now = datetime.utcnow()
+            for _, envelope in messages:
+                OUTBOX_LAG.observe(max(0.0, (now - envelope.timestamp).total_seconds()))
+            OUTBOX_RELAYED.inc(len(messages))
+            self._stats["relayed"] += len(messages)
+            self._stats["batches"] += 1
+        return len(messages)
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = self.poll_interval
+        while not self._stop_event.is_set():
+            # clear() ANTES de leer: un aviso que llega durante relay_once no se pierde.
+            self._wake_event.clear()
+            try:
+                relayed = self.relay_once()
+                backoff = self.poll_interval
+            except Exception as e:
+                OUTBOX_FAILURES.inc()
+                self._stats["failures"] += 1
+                self._stats["last_error"] = str(e)
+                print(f" [!] Outbox relay failed, retrying in {backoff:.1f}s: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            if relayed < self.batch_size:
+                # Outbox vacío (o lote parcial): esperar aviso de un commit o el poll_interval.
+                self._wake_event.wait(self.poll_interval)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return dict(self._stats)
@@ -2,12 +2,22 @@
 # Implementa el Port OrderRepository usando una base relacional (PostgreSQL).
 # Esta capa sí puede depender de librerías externas (SQLAlchemy).
 
-from sqlalchemy import create_engine, Column, String, Float, Integer, ForeignKey, DateTime
+from sqlalchemy import bindparam, column, create_engine, insert, inspect, or_, select, text, tuple_, update, values, Column, String, Float, Integer, ForeignKey, DateTime, Text, Index
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from typing import Optional
-from ...domain.models import Order, OrderItem
+from sqlalchemy.orm import sessionmaker, relationship, selectinload
+from sqlalchemy.dialects import postgresql, sqlite
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from ...domain.models import Order, OrderItem, IdempotencyRecord, DuplicateRequestError
 from ...domain.ports import OrderRepository
+from shared.domain.events import EventEnvelope
+from shared.infrastructure.codecs import get_codec
+from shared.infrastructure.messaging import build_event
+from shared.infrastructure.metrics import instrument_engine
+from .idempotency import IdempotencyCache
 import os
 
 Base = declarative_base()
@@ -21,10 +31,19 @@ class OrderModel(Base):
     created_at = Column(DateTime)
     items = relationship("OrderItemModel", back_populates="order")
 
+    # Índices para el listado keyset (ORDER BY created_at DESC, order_id DESC), con y sin filtros:
+    # cada página es un range scan de `limit` filas, sin importar el tamaño de la tabla.
+    __table_args__ = (
+        Index("ix_orders_created_at_order_id", "created_at", "order_id"),
+        Index("ix_orders_status_created_at_order_id", "status", "created_at", "order_id"),
+        Index("ix_orders_customer_created_at_order_id", "customer_id", "created_at", "order_id"),
+    )
+
 class OrderItemModel(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    order_id = Column(String, ForeignKey("orders.order_id"))
+    # index=True: Postgres no indexa las FK; lo usa el selectinload (WHERE order_id IN (...)).
+    order_id = Column(String, ForeignKey("orders.order_id"), index=True)
     product_id = Column(String)
     quantity = Column(Integer)
     price = Column(Float)
@@ -34,18 +53,74 @@ class IdempotencyModel(Base):
     __tablename__ = "idempotency_keys"
     key = Column(String, primary_key=True)
     order_id = Column(String)
+    response = Column(Text)  # respuesta original de la API en JSON (replay)
+    request_hash = Column(String)
+    created_at = Column(DateTime, index=True)  # TTL: IdempotencyKeyJanitor borra por created_at
+
+class OutboxModel(Base):
+    # Transactional outbox: eventos escritos en la MISMA transacción que la orden.
+    # OutboxRelay los publica por lotes y borra las filas confirmadas por el broker.
+    __tablename__ = "order_outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String, unique=True, nullable=False)
+    routing_key = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # EventEnvelope.to_dict() en JSON
+    created_at = Column(DateTime)
+
+# El sobre se guarda siempre en JSON; el codec/compresión del broker se aplica al relayar.
+_OUTBOX_CODEC = get_codec("json")
 
 class PostgresOrderRepository(OrderRepository):
-    def __init__(self, db_url: str):
-        # Inicializa engine + crea tablas si no existen (demo-friendly).
+    def __init__(self, db_url: str, idempotency_cache: IdempotencyCache = None, init_schema: bool = True):
+        # Inicializa engine (no conecta todavía) + crea tablas si no existen (demo-friendly).
+        # init_schema=False: el composition root llama init_schema() cuando la DB está lista
+        # (ver StartupReadiness), en lugar de conectar al importar el módulo.
         self.engine = create_engine(db_url)
-        Base.metadata.create_all(self.engine)
+        instrument_engine(self.engine, "orders")
+        if init_schema:
+            self.init_schema()
         self.Session = sessionmaker(bind=self.engine)
+        # LRU de keys recientes delante de idempotency_keys (ver adapters/idempotency.py).
+        self.idempotency_cache = idempotency_cache or IdempotencyCache()
+        # Callbacks invocados tras cada commit con eventos nuevos en el outbox (p.ej. OutboxRelay.wake).
+        self._outbox_listeners: List[Callable[[], None]] = []
 
-    def save(self, order: Order) -> Order:
+    def init_schema(self):
+        Base.metadata.create_all(self.engine)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        # create_all no modifica tablas que ya existían: columnas e índices agregados después
+        # se crean acá (idempotente).
+        existing = {info["name"] for info in inspect(self.engine).get_columns(IdempotencyModel.__tablename__)}
+        with self.engine.begin() as connection:
+            for table_column in IdempotencyModel.__table__.columns:
+                if table_column.name not in existing:
+                    column_type = table_column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {IdempotencyModel.__tablename__} "
+                                            f"ADD COLUMN {table_column.name} {column_type}"))
+        for table in (OrderModel.__table__, OrderItemModel.__table__, IdempotencyModel.__table__):
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def save(self, order: Order, idempotency: IdempotencyRecord = None, events: list = None) -> Order:
         # Mapea Domain -> ORM (Order/OrderItem) y persiste.
+        # Orden + idempotency key + eventos (topic, event_type, data) en UNA transacción:
+        # si algo falla no queda ni la orden ni el evento; si hace commit, el evento se publicará.
+        if idempotency:
+            cached = self.idempotency_cache.get(idempotency.key)
+            if cached is not None:
+                raise DuplicateRequestError(cached)
+
         session = self.Session()
         try:
+            if idempotency and not self._claim_idempotency_key(session, idempotency):
+                # Insert-or-fetch: la key ya existía (reintento o request concurrente que ganó).
+                existing = self._load_idempotency_record(session, idempotency.key)
+                session.rollback()
+                self.idempotency_cache.put(existing)
+                raise DuplicateRequestError(existing)
+
             db_order = OrderModel(
                 order_id=order.order_id,
                 customer_id=order.customer_id,
@@ -62,8 +137,187 @@ class PostgresOrderRepository(OrderRepository):
                 db_order.items.append(db_item)
             
             session.add(db_order)
+            for event in events or []:
+                session.add(OutboxModel(**self._outbox_row(event)))
+            session.commit()
+        finally:
+            session.close()
+
+        if idempotency:
+            self.idempotency_cache.put(idempotency)
+        if events:
+            self._notify_outbox()
+        return order
+
+    def _claim_idempotency_key(self, session, record: IdempotencyRecord) -> bool:
+        # INSERT ... ON CONFLICT (key) DO NOTHING dentro de la transacción de la orden:
+        # reemplaza el SELECT previo + el INSERT en otra sesión (sin carrera, un round trip).
+        # Retorna False si la key ya existía.
+        dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(self.engine.dialect.name)
+        values = self._idempotency_row(record)
+        if dialect_insert is None:
+            # Otros motores: SAVEPOINT + INSERT, la violación de PK indica key existente.
+            try:
+                with session.begin_nested():
+                    session.execute(insert(IdempotencyModel).values(**values))
+                return True
+            except IntegrityError:
+                return False
+        result = session.execute(dialect_insert(IdempotencyModel).values(**values)
+                                 .on_conflict_do_nothing(index_elements=["key"]))
+        return result.rowcount == 1
+
+    def _load_idempotency_record(self, session, key: str) -> IdempotencyRecord:
+        row = session.query(IdempotencyModel).filter_by(key=key).one()
+        return IdempotencyRecord(
+            key=row.key,
+            order_id=row.order_id,
+            response=_OUTBOX_CODEC.decode(row.response.encode()) if row.response else None,
+            request_hash=row.request_hash,
+            created_at=row.created_at or datetime.utcnow()
+        )
+
+    @staticmethod
+    def _idempotency_row(record: IdempotencyRecord) -> dict:
+        return {
+            "key": record.key,
+            "order_id": record.order_id,
+            "response": _OUTBOX_CODEC.encode(record.response).decode() if record.response is not None else None,
+            "request_hash": record.request_hash,
+            "created_at": record.created_at
+        }
+
+    def save_batch(self, entries: list) -> List[Order]:
+        """
+        Persiste un lote [(order, IdempotencyRecord | None, events)] en UNA transacción con INSERTs
+        multi-fila por tabla (orders, order_items, idempotency_keys, order_outbox), en lugar
+        de un flush del ORM por orden. Todo o nada: una key duplicada => ValueError y rollback.
+        """
+        order_rows, item_rows, key_rows, outbox_rows = [], [], [], []
+        for order, idempotency, events in entries:
+            order_rows.append({
+                "order_id": order.order_id,
+                "customer_id": order.customer_id,
+                "status": order.status,
+                "total_amount": order.total_amount,
+                "created_at": order.created_at
+            })
+            item_rows.extend({"order_id": order.order_id, "product_id": item.product_id,
+                              "quantity": item.quantity, "price": item.price} for item in order.items)
+            if idempotency:
+                key_rows.append(self._idempotency_row(idempotency))
+            outbox_rows.extend(self._outbox_row(event) for event in events or [])
+        if not order_rows:
+            return []
+
+        session = self.Session()
+        try:
+            # SQLAlchemy 2.0 agrupa cada executemany en INSERT ... VALUES (...), (...) (insertmanyvalues).
+            session.execute(insert(OrderModel), order_rows)
+            if item_rows:
+                session.execute(insert(OrderItemModel), item_rows)
+            if key_rows:
+                session.execute(insert(IdempotencyModel), key_rows)
+            if outbox_rows:
+                session.execute(insert(OutboxModel), outbox_rows)
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            if key_rows:
+                raise ValueError("An idempotency key in the batch was already processed.")
+            raise
+        finally:
+            session.close()
+
+        for _, idempotency, _ in entries:
+            if idempotency:
+                self.idempotency_cache.put(idempotency)
+        if outbox_rows:
+            self._notify_outbox()
+        return [order for order, _, _ in entries]
+
+    def find_idempotency_keys(self, keys: list) -> Dict[str, str]:
+        # Chequeo de idempotencia de un lote: primero el LRU, el resto en una sola query.
+        # Retorna {key: order_id} de las ya usadas.
+        found = {}
+        for key in keys:
+            cached = self.idempotency_cache.get(key)
+            if cached is not None:
+                found[key] = cached.order_id
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+        session = self.Session()
+        try:
+            rows = session.query(IdempotencyModel.key, IdempotencyModel.order_id).filter(
+                IdempotencyModel.key.in_(missing)).all()
+            found.update({key: order_id for key, order_id in rows})
+            return found
+        finally:
+            session.close()
+
+    def purge_idempotency_keys(self, older_than: datetime, batch_size: int = 1000) -> int:
+        # Borra por lotes (una transacción corta por lote) las keys creadas antes de older_than.
+        # Keys sin created_at (anteriores al TTL) también se consideran vencidas.
+        purged = 0
+        while True:
+            session = self.Session()
+            try:
+                keys = [key for key, in session.query(IdempotencyModel.key)
+                        .filter(or_(IdempotencyModel.created_at < older_than, IdempotencyModel.created_at.is_(None)))
+                        .limit(batch_size)
+                        .all()]
+                if keys:
+                    session.query(IdempotencyModel).filter(IdempotencyModel.key.in_(keys)).delete(
+                        synchronize_session=False)
+                    session.commit()
+            finally:
+                session.close()
+            purged += len(keys)
+            if len(keys) < batch_size:
+                return purged
+
+    # Outbox
+
+    def _outbox_row(self, event: tuple) -> dict:
+        # (topic, event_type, data) -> fila de order_outbox con el sobre ya construido (event_id fijo).
+        routing_key, envelope = build_event(*event)
+        return {
+            "event_id": envelope.event_id,
+            "routing_key": routing_key,
+            "body": _OUTBOX_CODEC.encode(envelope.to_dict()).decode(),
+            "created_at": envelope.timestamp
+        }
+
+    def add_outbox_listener(self, callback: Callable[[], None]):
+        self._outbox_listeners.append(callback)
+
+    def _notify_outbox(self):
+        for callback in self._outbox_listeners:
+            callback()
+
+    @contextmanager
+    def claim_outbox(self, limit: int):
+        """
+        Reserva hasta `limit` eventos pendientes (FOR UPDATE SKIP LOCKED: varias instancias
+        del relay no toman las mismas filas) y entrega [(routing_key, EventEnvelope)].
+        Si el bloque termina sin error las filas se borran; si falla, quedan para el siguiente intento.
+        """
+        session = self.Session()
+        try:
+            rows = (session.query(OutboxModel)
+                    .order_by(OutboxModel.id)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                    .all())
+            yield [(row.routing_key, EventEnvelope.from_dict(_OUTBOX_CODEC.decode(row.body.encode()))) for row in rows]
+            if rows:
+                session.query(OutboxModel).filter(OutboxModel.id.in_([row.id for row in rows])).delete(
+                    synchronize_session=False)
             session.commit()
-            return order
+        except Exception:
+            session.rollback()
+            raise
         finally:
             session.close()
 
@@ -78,13 +332,73 @@ class PostgresOrderRepository(OrderRepository):
             session.close()
 
     def get_all(self) -> list[Order]:
+        return self.list_orders(limit=50)[0]
+
+    def list_orders(self, limit: int = 50, cursor: str = None, status: str = None,
+                    customer_id: str = None) -> Tuple[List[Order], Optional[str]]:
+        # Paginación keyset sobre (created_at, order_id) DESC: en lugar de OFFSET, cada página
+        # continúa "después" de la última fila vista, usando los índices ix_orders_*.
+        # Los items se cargan con selectinload: una sola query extra por página (no N+1).
         session = self.Session()
         try:
-            db_orders = session.query(OrderModel).order_by(OrderModel.created_at.desc()).limit(50).all()
-            return [self._map(o) for o in db_orders]
+            query = session.query(OrderModel).options(selectinload(OrderModel.items))
+            if status:
+                query = query.filter(OrderModel.status == status)
+            if customer_id:
+                query = query.filter(OrderModel.customer_id == customer_id)
+            if cursor:
+                created_at, order_id = self._decode_cursor(cursor)
+                query = query.filter(tuple_(OrderModel.created_at, OrderModel.order_id) < (created_at, order_id))
+            db_orders = (query.order_by(OrderModel.created_at.desc(), OrderModel.order_id.desc())
+                         .limit(limit + 1)
+                         .all())
+            # limit + 1: si sobra una fila hay página siguiente.
+            next_cursor = self.encode_cursor(db_orders[limit - 1]) if len(db_orders) > limit else None
+            return [self._map(o) for o in db_orders[:limit]], next_cursor
         finally:
             session.close()
 
+    # Columnas del export (GET /orders/export), en el orden de las filas que retorna stream_order_rows.
+    EXPORT_COLUMNS = ("order_id", "customer_id", "status", "total_amount", "created_at")
+
+    def stream_order_rows(self, created_from: datetime = None, created_to: datetime = None,
+                          status: str = None, chunk_size: int = 1000) -> Iterator[List[tuple]]:
+        """
+        Órdenes de un rango [created_from, created_to) en lotes de chunk_size tuplas (EXPORT_COLUMNS),
+        ordenadas por (created_at, order_id) con el índice ix_orders_*.
+        Cursor del lado del servidor (stream_results => cursor con nombre en psycopg2): la memoria
+        no depende de la cantidad de filas y el primer lote sale sin esperar al resto de la query.
+        """
+        table = OrderModel.__table__
+        query = select(*(table.c[name] for name in self.EXPORT_COLUMNS))
+        if created_from:
+            query = query.where(table.c.created_at >= created_from)
+        if created_to:
+            query = query.where(table.c.created_at < created_to)
+        if status:
+            query = query.where(table.c.status == status)
+        query = query.order_by(table.c.created_at, table.c.order_id)
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+            for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+
+    @staticmethod
+    def encode_cursor(order) -> str:
+        # Cursor opaco para el cliente: base64url("<created_at ISO>|<order_id>").
+        # Acepta OrderModel u Order (la vista de lectura arma el cursor de su última orden).
+        raw = f"{order.created_at.isoformat()}|{order.order_id}"
+        return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, order_id = raw.split("|", 1)
+            return datetime.fromisoformat(created_at), order_id
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
     def _map(self, db_order):
         # Mapea ORM -> Domain (manteniendo independencia del dominio).
         order = Order(
@@ -100,6 +414,8 @@ class PostgresOrderRepository(OrderRepository):
     def exists_idempotency_key(self, key: str) -> bool:
         # Parte del patrón de idempotencia a nivel API:
         # evita procesar dos veces un POST /orders repetido.
+        if self.idempotency_cache.get(key) is not None:
+            return True
         session = self.Session()
         try:
             return session.query(IdempotencyModel).filter_by(key=key).first() is not None
@@ -109,7 +425,7 @@ class PostgresOrderRepository(OrderRepository):
     def save_idempotency_key(self, key: str, order_id: str):
         session = self.Session()
         try:
-            entry = IdempotencyModel(key=key, order_id=order_id)
+            entry = IdempotencyModel(key=key, order_id=order_id, created_at=datetime.utcnow())
             session.add(entry)
             session.commit()
         finally:
@@ -128,3 +444,25 @@ class PostgresOrderRepository(OrderRepository):
             raise e
         finally:
             session.close()
+
+    def update_statuses(self, updates: Dict[str, str]) -> int:
+        # Versión por lotes para el consumidor de estados: un solo
+        #   UPDATE orders SET status = v.status FROM (VALUES (...), ...) AS v(order_id, status)
+        #   WHERE orders.order_id = v.order_id
+        # en una transacción, en lugar de SELECT + UPDATE + commit por mensaje.
+        if not updates:
+            return 0
+        table = OrderModel.__table__
+        with self.engine.begin() as connection:
+            if self.engine.dialect.name == "postgresql":
+                batch = values(column("order_id", String), column("status", String), name="v").data(
+                    list(updates.items()))
+                statement = (update(table).where(table.c.order_id == batch.c.order_id)
+                             .values(status=batch.c.status))
+                return connection.execute(statement).rowcount
+            # Otros motores (SQLite no admite alias de columnas en VALUES): executemany en la
+            # misma transacción.
+            statement = (update(table).where(table.c.order_id == bindparam("v_order_id"))
+                         .values(status=bindparam("v_status")))
+            return connection.execute(statement, [{"v_order_id": order_id, "v_status": status}
+                                                  for order_id, status in updates.items()]).rowcount
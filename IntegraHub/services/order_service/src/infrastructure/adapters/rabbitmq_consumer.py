@@ -2,28 +2,44 @@
 # Este consumidor escucha eventos externos que impactan el estado de una orden.
 # Ej: OrderConfirmed / OrderRejected publicados por payment/inventory.
 
-import pika
-import json
 import threading
+import time
+from typing import Optional, Tuple
 from ...application.services import UpdateOrderStatusUseCase
-from ...domain.ports import OrderRepository
+from ...domain.ports import OrderRepository, OrderReadModel, OrderStatusNotifier
+from shared.infrastructure.codecs import decode_body
+from shared.infrastructure.messaging import connection_from_url, MESSAGES_CONSUMED, MESSAGES_ACKED, MESSAGES_NACKED
+from shared.infrastructure.latency import HOP_LATENCIES, HANDLER, ACK
 
 MAIN_EXCHANGE = "integrahub_exchange"
 PROCESS_QUEUE = "order_updates_queue"
 
 class RabbitMQConsumer:
-    def __init__(self, amqp_url: str, repository: OrderRepository):
+    def __init__(self, amqp_url: str, repository: OrderRepository, read_model: OrderReadModel = None,
+                 notifier: OrderStatusNotifier = None, batch_size: int = 500, batch_max_wait: float = 0.05):
         self.amqp_url = amqp_url
         self.repository = repository
+        # Vista de lectura de la API: se actualiza en el lugar con cada cambio de estado.
+        self.read_model = read_model
+        # Suscripciones de la API (SSE / long-poll) que reciben cada cambio de estado.
+        self.notifier = notifier
+        # Lotes de actualizaciones: hasta batch_size mensajes o batch_max_wait segundos desde el
+        # primero, aplicados con un UPDATE ... FROM (VALUES ...) y un ACK multiple=True.
+        self.batch_size = max(1, batch_size)
+        self.batch_max_wait = batch_max_wait
+        self.use_case = None
+        self._pending = []
+        self._flush_timer = None
         self.connection = None
         self.channel = None
         self._thread = None
         self._stop_event = threading.Event()
 
     def connect(self):
-        params = pika.URLParameters(self.amqp_url)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
+        # amqp://... => RabbitMQ; memory://<nombre> => broker en memoria (benchmarks).
+        connection_wrapper = connection_from_url(self.amqp_url)
+        self.channel = connection_wrapper.get_channel()
+        self.connection = connection_wrapper.connection
 
         # Declare Exchange (Idempotent)
         self.channel.exchange_declare(exchange=MAIN_EXCHANGE, exchange_type='topic', durable=True)
@@ -56,46 +72,111 @@ class RabbitMQConsumer:
         try:
             self.connect()
             # Use Case: actualización de estado (application layer)
-            use_case = UpdateOrderStatusUseCase(self.repository)
-            
-            print(f" [*] Order Service Consumer waiting for status updates in {PROCESS_QUEUE}")
-
-            def callback(ch, method, properties, body):
-                try:
-                    # El evento sigue el contrato: { event_type, data, correlation_id, ... }
-                    data = json.loads(body)
-                    event_type = data.get("event_type")
-                    event_data = data.get("data", {})
-                    order_id = event_data.get("order_id")
-                    
-                    # Mapeo de evento -> estado interno del dominio
-                    # - OrderConfirmed => CONFIRMED
-                    # - OrderRejected => REJECTED
-                    new_status = None
-                    if event_type == "OrderConfirmed":
-                        new_status = "CONFIRMED"
-                    elif event_type == "OrderRejected":
-                        new_status = "REJECTED"
-                        # reason = event_data.get("reason")
-                    
-                    if order_id and new_status:
-                        print(f" [x] Updating Order {order_id} to {new_status}")
-                        use_case.execute(order_id, new_status)
-                    
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-                except Exception as e:
-                    print(f" [!] Error processing status update: {e}")
-                    # In a robust system, DLQ here. For now, simple nack without requeue or similar.
-                    # Si falla, se hace NACK sin requeue para evitar loop infinito.
-                    # En una versión robusta, se configura DLQ (o usar BaseConsumer del shared).
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-
-            self.channel.basic_consume(queue=PROCESS_QUEUE, on_message_callback=callback)
+            self.use_case = UpdateOrderStatusUseCase(self.repository, self.read_model, self.notifier)
+            # Prefetch acotado: como mucho dos lotes entregados y sin ACK por consumidor.
+            self.channel.basic_qos(prefetch_count=self.batch_size * 2)
+
+            print(f" [*] Order Service Consumer waiting for status updates in {PROCESS_QUEUE} "
+                  f"(batch={self.batch_size}, max_wait={self.batch_max_wait * 1000:.0f}ms)")
+
+            self.channel.basic_consume(queue=PROCESS_QUEUE, on_message_callback=self._on_message)
             self.channel.start_consuming()
             
         except Exception as e:
             print(f" [!] Order Consumer failed: {e}")
 
+    @staticmethod
+    def _status_update(body: bytes, properties) -> Optional[Tuple[str, str]]:
+        # El evento sigue el contrato: { event_type, data, correlation_id, ... }
+        # El codec (JSON/msgpack) se elige por content_type; content_encoding indica compresión.
+        data = decode_body(body, properties.content_type, properties.content_encoding)
+        event_type = data.get("event_type")
+        order_id = data.get("data", {}).get("order_id")
+
+        # Mapeo de evento -> estado interno del dominio
+        # - OrderConfirmed => CONFIRMED
+        # - OrderRejected => REJECTED
+        new_status = None
+        if event_type == "OrderConfirmed":
+            new_status = "CONFIRMED"
+        elif event_type == "OrderRejected":
+            new_status = "REJECTED"
+        return (order_id, new_status) if order_id and new_status else None
+
+    def _on_message(self, ch, method, properties, body):
+        # Los mensajes se acumulan hasta batch_size o batch_max_wait (lo que ocurra primero) y
+        # se aplican con un solo UPDATE; todo corre en el hilo del consumidor (sin locks).
+        MESSAGES_CONSUMED.labels(PROCESS_QUEUE).inc()
+        HOP_LATENCIES.record_queue_wait(PROCESS_QUEUE, properties.type, properties.headers)
+        try:
+            update = self._status_update(body, properties)
+        except Exception as e:
+            # Mensaje ilegible: se descarta solo (NACK sin requeue), el lote sigue.
+            print(f" [!] Error processing status update: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            MESSAGES_NACKED.labels(PROCESS_QUEUE).inc()
+            return
+        # Los eventos que no cambian estado también entran al lote: se confirman con él.
+        self._pending.append((method.delivery_tag, update, properties.type))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = self.connection.call_later(self.batch_max_wait, self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        self._flush()
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self.connection.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        started = time.perf_counter()
+        updates = [update for _, update, _ in batch if update]
+        try:
+            self.use_case.execute_batch(updates)
+            print(f" [x] Updated {len(updates)} orders ({len(batch)} messages)")
+            failed = set()
+        except Exception as e:
+            # Falla el lote completo: se reintenta mensaje a mensaje para aislar al culpable
+            # y no perder el resto.
+            print(f" [!] Batch status update failed, retrying one by one: {e}")
+            failed = self._apply_one_by_one(batch)
+
+        handled_at = time.perf_counter()
+        if not failed:
+            # Un solo ACK para todo el lote (todas las entregas hasta el último tag).
+            self.channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+        else:
+            for delivery_tag, _, _ in batch:
+                if delivery_tag in failed:
+                    # Sin requeue para evitar loop infinito (no hay DLQ configurada para esta cola).
+                    self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+                else:
+                    self.channel.basic_ack(delivery_tag=delivery_tag)
+        MESSAGES_ACKED.labels(PROCESS_QUEUE).inc(len(batch) - len(failed))
+        if failed:
+            MESSAGES_NACKED.labels(PROCESS_QUEUE).inc(len(failed))
+        acked_at = time.perf_counter()
+        for _, _, event_type in batch:
+            HOP_LATENCIES.record(PROCESS_QUEUE, event_type, HANDLER, handled_at - started)
+            HOP_LATENCIES.record(PROCESS_QUEUE, event_type, ACK, acked_at - handled_at)
+
+    def _apply_one_by_one(self, batch: list) -> set:
+        failed = set()
+        for delivery_tag, update, _ in batch:
+            if not update:
+                continue
+            try:
+                self.use_case.execute(*update)
+            except Exception as e:
+                print(f" [!] Error processing status update for order {update[0]}: {e}")
+                failed.add(delivery_tag)
+        return failed
+
     def stop(self):
         if self.connection and self.connection.is_open:
             self.connection.close()
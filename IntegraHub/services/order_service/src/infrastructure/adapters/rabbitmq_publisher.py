@@ -4,16 +4,48 @@
  
 import os
 from ...domain.ports import EventPublisher
-from shared.infrastructure.messaging import RabbitMQConnection, BasePublisher
+from shared.infrastructure.messaging import RabbitMQChannelPool, BasePublisher, channel_pool_from_url
+from shared.infrastructure.codecs import get_codec
+from shared.infrastructure.compression import get_compressor, compression_stats, DEFAULT_THRESHOLD_BYTES
 
 class RabbitMQPublisherAdapter(EventPublisher):
-    def __init__(self, host: str = "rabbitmq"):
-        # Crea conexión y publisher base con exchange/topic estándar del proyecto.
-        self.connection = RabbitMQConnection(host=host)
-        self.publisher = BasePublisher(self.connection)
+    def __init__(self, host: str = "rabbitmq", confirm_delivery: bool = False, pool_size: int = 10,
+                 codec: str = None, compression: str = None,
+                 compression_threshold: int = DEFAULT_THRESHOLD_BYTES, amqp_url: str = None):
+        # Crea pool de conexiones y publisher base con exchange/topic estándar del proyecto.
+        # Los endpoints sync de FastAPI corren en un threadpool: cada request toma
+        # su propio canal del pool (BlockingConnection no es thread-safe).
+        # confirm_delivery=True => el broker confirma cada evento antes de responder al cliente.
+        # codec: "json" / "orjson" / "msgpack" (None => JSON más rápido disponible).
+        # compression: "gzip" / "zstd" para cuerpos >= compression_threshold bytes (None => sin comprimir).
+        # amqp_url (opcional) tiene prioridad sobre host; acepta memory://<nombre> (broker en memoria).
+        if amqp_url:
+            self.connection = channel_pool_from_url(amqp_url, max_size=pool_size)
+        else:
+            self.connection = RabbitMQChannelPool(host=host, max_size=pool_size)
+        self.publisher = BasePublisher(self.connection, confirm_delivery=confirm_delivery, codec=get_codec(codec),
+                                       compressor=get_compressor(compression, compression_threshold))
     #pylint: disable=arguments-differ
     def publish(self, topic: str, event_type: str, data: dict):
         # Publica evento de integración con routing_key {topic}.{event_type}
         # Ej: orders.OrderCreated
         self.publisher.publish(topic, event_type, data)
 
+    def publish_batch(self, events: list):
+        # Un solo round trip de confirmación para todo el lote.
+        self.publisher.publish_batch(events)
+
+    def publish_envelopes(self, messages: list):
+        # Lote de sobres ya construidos (outbox): conserva event_id y una sola confirmación.
+        return self.publisher.publish_envelopes(messages)
+
+    def pool_stats(self) -> dict:
+        # Uso del pool (in_use/idle/esperas) para diagnóstico en /health.
+        return self.connection.stats()
+
+    def compression_stats(self) -> dict:
+        # Ratio y tiempo de CPU de la compresión de eventos (contadores del proceso).
+        return compression_stats()
+
+    def close(self):
+        self.connection.close()
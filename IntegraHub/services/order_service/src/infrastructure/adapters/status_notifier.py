@@ -0,0 +1,118 @@
+# Infrastructure Adapter: Order status notifier (SSE / long-poll)
+# Empuja los cambios de estado que aplica UpdateOrderStatusUseCase a los clientes suscritos,
+# en vez de que re-pidan GET /orders en un loop:
+#
+# - GET /orders/events: cada suscriptor SSE es una asyncio.Queue acotada (no un hilo).
+# - GET /orders/{order_id}/await: cada long-poll es un asyncio.Future por orden.
+#
+# publish() corre en el hilo del consumidor RabbitMQ: solo agenda el reparto en el event loop
+# de uvicorn (call_soon_threadsafe). Todo el estado de suscriptores vive en ese loop, sin locks.
+# Miles de conexiones ociosas cuestan una cola/future cada una, no un hilo del threadpool.
+
+import asyncio
+from typing import Dict, Optional, Set
+from ...domain.ports import OrderStatusNotifier
+from shared.infrastructure.metrics import counter, gauge
+
+FINAL_STATES = ("CONFIRMED", "REJECTED")
+
+STATUS_SUBSCRIBERS = gauge("integrahub_order_status_subscribers", "Open order status subscriptions", ["kind"])
+STATUS_NOTIFICATIONS = counter("integrahub_order_status_notifications_total", "Order status changes pushed to subscribers")
+STATUS_DROPPED = counter("integrahub_order_status_dropped_total", "Status events dropped for slow SSE subscribers")
+
+class TooManySubscribersError(Exception):
+    pass
+
+class StatusSubscription:
+    def __init__(self, queue_size: int, order_id: Optional[str] = None):
+        # order_id: solo eventos de esa orden (None => todas)
+        self.order_id = order_id
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: dict):
+        if self.order_id and event["order_id"] != self.order_id:
+            return
+        if self.queue.full():
+            # Cliente lento: se descarta el evento más viejo; el más nuevo siempre llega.
+            self.queue.get_nowait()
+            STATUS_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+class AsyncioOrderStatusNotifier(OrderStatusNotifier):
+    def __init__(self, max_subscribers: int = 10000, queue_size: int = 100):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: Set[StatusSubscription] = set()
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        # Contador aparte: /health y /metrics lo leen desde otros hilos sin recorrer _waiters.
+        self._waiter_count = 0
+        STATUS_SUBSCRIBERS.labels("stream").set_function(lambda: len(self._subscriptions))
+        STATUS_SUBSCRIBERS.labels("await").set_function(lambda: self._waiter_count)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        # Se llama en el startup de FastAPI (dentro del loop de uvicorn).
+        self._loop = loop
+
+    # Escritura (hilo del consumidor)
+
+    def publish(self, order_id: str, status: str):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, order_id, status)
+        except RuntimeError:
+            # Loop cerrándose (shutdown): no hay suscriptores a quién avisar.
+            pass
+
+    def _dispatch(self, order_id: str, status: str):
+        STATUS_NOTIFICATIONS.inc()
+        event = {"order_id": order_id, "status": status, "final": status in FINAL_STATES}
+        for subscription in self._subscriptions:
+            subscription.offer(event)
+        if event["final"]:
+            waiters = self._waiters.pop(order_id, ())
+            self._waiter_count -= len(waiters)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(status)
+
+    # Suscripciones (event loop)
+
+    def subscribe(self, order_id: Optional[str] = None) -> StatusSubscription:
+        if self._open_subscriptions() >= self.max_subscribers:
+            raise TooManySubscribersError(f"Too many status subscribers (max {self.max_subscribers})")
+        subscription = StatusSubscription(self.queue_size, order_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StatusSubscription):
+        self._subscriptions.discard(subscription)
+
+    def register_waiter(self, order_id: str) -> asyncio.Future:
+        """
+        Future que se resuelve con el estado final de la orden. Se registra ANTES de leer el
+        estado actual: un evento que llega entre la lectura y la espera no se pierde.
+        """
+        if self._open_subscriptions() >= self.max_subscribers:
+            raise TooManySubscribersError(f"Too many status subscribers (max {self.max_subscribers})")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(order_id, set()).add(waiter)
+        self._waiter_count += 1
+        return waiter
+
+    def discard_waiter(self, order_id: str, waiter: asyncio.Future):
+        waiters = self._waiters.get(order_id)
+        if waiters is not None and waiter in waiters:
+            waiters.discard(waiter)
+            self._waiter_count -= 1
+            if not waiters:
+                del self._waiters[order_id]
+
+    def _open_subscriptions(self) -> int:
+        return len(self._subscriptions) + self._waiter_count
+
+    def stats(self) -> dict:
+        return {"streams": len(self._subscriptions), "waiters": self._waiter_count,
+                "bound": self._loop is not None}
@@ -9,17 +9,32 @@
 # - /orders requiere token y permite idempotencia via header X-Idempotency-Key
  
 
-from fastapi import FastAPI, HTTPException, Header, Depends, status
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+import json
 import os
 from shared.infrastructure.security import verify_token
+from shared.infrastructure.metrics import start_metrics_server, instrument_fastapi, register_pool_metrics
+from shared.infrastructure.readiness import StartupReadiness, probe_postgres, probe_rabbitmq, add_health_routes
 # Absolute imports to avoid relative hell
-from src.application.services import CreateOrderUseCase
+from src.application.services import CreateOrderUseCase, created_response
+from src.domain.models import DuplicateRequestError
 from src.infrastructure.adapters.postgres_repository import PostgresOrderRepository
 from src.infrastructure.adapters.rabbitmq_publisher import RabbitMQPublisherAdapter
 from src.infrastructure.adapters.rabbitmq_consumer import RabbitMQConsumer
+from src.infrastructure.adapters.outbox_relay import OutboxRelay
+from src.infrastructure.adapters.idempotency import IdempotencyCache, IdempotencyKeyJanitor
+from src.infrastructure.adapters.order_read_model import InMemoryOrderReadModel, order_etag, page_etag
+from src.infrastructure.adapters.order_export import encode_export, EXPORT_FORMATS
+from src.infrastructure.adapters.status_notifier import (AsyncioOrderStatusNotifier, TooManySubscribersError,
+                                                         FINAL_STATES)
 
 # Config:
 # DB_HOST / RABBITMQ_HOST se leen de env (docker-compose).
@@ -29,27 +44,103 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 DATABASE_URL = f"postgresql://user:password@{DB_HOST}:5432/integrahub_db"
 AMQP_URL = f"amqp://user:password@{RABBITMQ_HOST}:5672/%2f"
+# Publisher confirms en publicaciones individuales (los lotes del outbox relay siempre se confirman con tx.commit).
+PUBLISHER_CONFIRMS = os.getenv("RABBITMQ_PUBLISHER_CONFIRMS", "true").lower() == "true"
+# Máximo de canales concurrentes hacia RabbitMQ (>= hilos del threadpool que publican).
+RABBITMQ_POOL_SIZE = int(os.getenv("RABBITMQ_POOL_SIZE", "10"))
+# Codec del cuerpo de los eventos publicados: json / orjson / msgpack (vacío => JSON más rápido disponible).
+EVENT_CODEC = os.getenv("EVENT_CODEC") or None
+# Compresión opcional de eventos grandes (carritos con muchos items): gzip / zstd (vacío => deshabilitada).
+PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION") or None
+COMPRESSION_THRESHOLD_BYTES = int(os.getenv("COMPRESSION_THRESHOLD_BYTES", "1024"))
+# Outbox relay: tamaño máximo de lote publicado con una sola confirmación y espera máxima
+# entre lecturas cuando no llegan avisos de commits nuevos.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL_MS = int(os.getenv("OUTBOX_POLL_INTERVAL_MS", "500"))
+# Máximo de órdenes por request en POST /orders/batch.
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", "1000"))
+# Idempotencia: keys recientes en un LRU en proceso; las keys (y su respuesta guardada para
+# el replay) se borran de la DB después de IDEMPOTENCY_TTL_SECONDS, por lotes.
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "300"))
+# Vista de lectura en memoria: órdenes individuales (LRU) y las más recientes (dashboard).
+# ORDER_CACHE_SIZE=0 la desactiva (necesario con varias réplicas de order_service).
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "10000"))
+ORDER_CACHE_RECENT = int(os.getenv("ORDER_CACHE_RECENT", "200"))
+# Tamaño máximo de página en GET /orders (?limit=).
+ORDERS_PAGE_MAX_SIZE = int(os.getenv("ORDERS_PAGE_MAX_SIZE", "200"))
+# Consumidor de estados: OrderConfirmed/OrderRejected aplicados por lotes (un UPDATE y un ACK
+# por lote) de hasta ORDER_STATUS_BATCH_SIZE mensajes u ORDER_STATUS_BATCH_MAX_WAIT_MS de espera.
+ORDER_STATUS_BATCH_SIZE = int(os.getenv("ORDER_STATUS_BATCH_SIZE", "500"))
+ORDER_STATUS_BATCH_MAX_WAIT_MS = int(os.getenv("ORDER_STATUS_BATCH_MAX_WAIT_MS", "50"))
+# Export de órdenes (GET /orders/export): filas por lote leídas del cursor del servidor.
+ORDER_EXPORT_CHUNK_SIZE = int(os.getenv("ORDER_EXPORT_CHUNK_SIZE", "1000"))
+# Suscripciones push de estado (GET /orders/events y GET /orders/{order_id}/await):
+# máximo de conexiones abiertas por proceso, keepalive del stream SSE y espera máxima del long-poll.
+ORDER_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("ORDER_EVENTS_MAX_SUBSCRIBERS", "10000"))
+ORDER_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("ORDER_EVENTS_KEEPALIVE_SECONDS", "15"))
+ORDER_AWAIT_MAX_TIMEOUT_SECONDS = float(os.getenv("ORDER_AWAIT_MAX_TIMEOUT_SECONDS", "60"))
+# Métricas Prometheus (GET /metrics) en un puerto aparte del API; 0 => deshabilitado.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Espera máxima a Postgres/RabbitMQ al arrancar (sondeo con backoff, sin sleeps fijos).
+STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
 
 # App
 app = FastAPI(title="Order Service", version="1.0.0")
+instrument_fastapi(app)
 
 # Dependencies (Manual DI):
 # Se hace DI manual para mantener simpleza y evidenciar arquitectura hexagonal.
-repository = PostgresOrderRepository(DATABASE_URL)
-publisher = RabbitMQPublisherAdapter(host=RABBITMQ_HOST)
-create_order_use_case = CreateOrderUseCase(repository, publisher)
+# El esquema se crea en el arranque, cuando la DB responde (no al importar este módulo).
+repository = PostgresOrderRepository(DATABASE_URL, idempotency_cache=IdempotencyCache(
+    max_size=IDEMPOTENCY_CACHE_SIZE, ttl_seconds=IDEMPOTENCY_TTL_SECONDS), init_schema=False)
+idempotency_janitor = IdempotencyKeyJanitor(repository, ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+                                            interval=IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+publisher = RabbitMQPublisherAdapter(host=RABBITMQ_HOST, confirm_delivery=PUBLISHER_CONFIRMS,
+                                     pool_size=RABBITMQ_POOL_SIZE, codec=EVENT_CODEC,
+                                     compression=PAYLOAD_COMPRESSION,
+                                     compression_threshold=COMPRESSION_THRESHOLD_BYTES)
+read_model = InMemoryOrderReadModel(max_orders=ORDER_CACHE_SIZE, recent_size=ORDER_CACHE_RECENT)
+create_order_use_case = CreateOrderUseCase(repository, read_model)
+# Cambios de estado (consumidor) => clientes suscritos por SSE / long-poll, sin polling de GET /orders.
+status_notifier = AsyncioOrderStatusNotifier(max_subscribers=ORDER_EVENTS_MAX_SUBSCRIBERS)
+# Transactional outbox: POST /orders solo hace commit en DB; el relay publica en segundo plano.
+outbox_relay = OutboxRelay(repository, publisher, batch_size=OUTBOX_BATCH_SIZE,
+                           poll_interval=OUTBOX_POLL_INTERVAL_MS / 1000.0)
+register_pool_metrics(publisher.connection, "order_publisher")
 
 # Background Consumer:
 # El servicio consume eventos de estado para sincronizar orders con resultados de payment/inventory.
-consumer = RabbitMQConsumer(AMQP_URL, repository)
+consumer = RabbitMQConsumer(AMQP_URL, repository, read_model, status_notifier,
+                            batch_size=ORDER_STATUS_BATCH_SIZE,
+                            batch_max_wait=ORDER_STATUS_BATCH_MAX_WAIT_MS / 1000.0)
 
-@app.on_event("startup")
-def startup_event():
+# Arranque: el API responde enseguida (/health/live); /health/ready pasa a 200 cuando
+# Postgres y RabbitMQ respondieron (sondeados en paralelo) y los procesos de fondo arrancaron.
+readiness = StartupReadiness({"postgres": probe_postgres(DATABASE_URL), "rabbitmq": probe_rabbitmq(AMQP_URL)},
+                             timeout=STARTUP_TIMEOUT_SECONDS)
+add_health_routes(app, readiness)
+
+def start_background_workers():
+    repository.init_schema()
     consumer.start_in_background()
+    outbox_relay.start()
+    idempotency_janitor.start()
+
+@app.on_event("startup")
+async def startup_event():
+    # async: se ejecuta en el loop de uvicorn, el mismo que atiende las suscripciones.
+    status_notifier.bind(asyncio.get_running_loop())
+    start_metrics_server(METRICS_PORT)
+    readiness.start_in_background(on_ready=start_background_workers)
 
 @app.on_event("shutdown")
 def shutdown_event():
     consumer.stop()
+    outbox_relay.stop()
+    idempotency_janitor.stop()
+    publisher.close()
 
 # DTOs
 
@@ -63,6 +154,13 @@ class CreateOrderRequest(BaseModel):
     customer_id: str
     items: List[OrderItemDTO]
 
+class BatchOrderDTO(CreateOrderRequest):
+    # Idempotencia por orden (equivalente al header X-Idempotency-Key de POST /orders)
+    idempotency_key: Optional[str] = None
+
+class CreateOrdersBatchRequest(BaseModel):
+    orders: List[BatchOrderDTO]
+
 # Routes
 @app.post("/orders", status_code=201)
 def create_order(
@@ -73,7 +171,7 @@ def create_order(
 # Flujo:
     # 1) DTO (Pydantic) -> datos planos
     # 2) Use Case (CreateOrderUseCase) crea y persiste orden
-    # 3) Publica evento OrderCreated a RabbitMQ (integración)
+    # 3) Guarda el evento OrderCreated en el outbox (mismo commit); OutboxRelay lo publica
     # 4) Responde 201 con order_id
     try:
         # Pass DTO data to application layer
@@ -82,33 +180,203 @@ def create_order(
             items_data=[item.dict() for item in request.items],
             idempotency_key=idempotency_key
         )
-        return {"order_id": order.order_id, "status": "CREATED", "message": "Order processed successfully"}
+        return created_response(order)
+    except DuplicateRequestError as e:
+        # Reintento con la misma key y el mismo payload: se repite la respuesta original.
+        # (Keys anteriores al replay no tienen respuesta guardada => 409 como antes.)
+        if e.record.response is None:
+            raise HTTPException(status_code=409, detail=str(e))
+        return JSONResponse(status_code=201, content=e.record.response, headers={"Idempotent-Replayed": "true"})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/orders/batch")
+def create_orders_batch(
+    request: CreateOrdersBatchRequest,
+    user_payload: dict = Depends(verify_token)
+):
+    # Carga masiva (clientes B2B): un JWT, un chequeo de idempotencia para todas las keys y
+    # una transacción con INSERTs multi-fila. Los OrderCreated quedan en el outbox y el relay
+    # los publica por lotes. Respuesta: un resultado por orden, en el orden recibido.
+    if len(request.orders) > ORDER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {ORDER_BATCH_MAX_SIZE} orders)")
+    try:
+        results = create_order_use_case.execute_batch([order.dict() for order in request.orders])
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    created = sum(1 for result in results if result["status"] == "CREATED")
+    return {"created": created, "duplicates": len(results) - created, "results": results}
+
+def _order_summary(o) -> dict:
+    return {
+        "order_id": o.order_id,
+        "customer_id": o.customer_id,
+        "status": o.status,
+        "total_amount": o.total_amount,
+        "created_at": o.created_at,
+        "items": [i.product_id for i in o.items]
+    }
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Comparación débil (RFC 7232): W/"x" == "x"; admite lista de tags y "*".
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def _conditional_json(content, etag: str, if_none_match: Optional[str], headers: dict = None) -> Response:
+    # ETag + If-None-Match => 304 sin cuerpo cuando el cliente ya tiene esta versión.
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
 
 @app.get("/orders", response_model=List[dict])
-def get_orders():
+def get_orders(
+    limit: int = Query(50, ge=1, le=ORDERS_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    customer_id: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    # Paginación keyset: la respuesta sigue siendo una lista (compatible con el demo portal);
+    # el cursor de la página siguiente viaja en el header X-Next-Cursor (ausente en la última).
+    # Ej: GET /orders?status=CONFIRMED&limit=100&cursor=<X-Next-Cursor anterior>
+    # La primera página sin filtros (refresh del dashboard) sale de la vista de lectura en memoria.
     try:
-        orders = repository.get_all()
-        return [
-            {
-                "order_id": o.order_id,
-                "customer_id": o.customer_id,
-                "status": o.status,
-                "total_amount": o.total_amount,
-                "created_at": o.created_at,
-                "items": [i.product_id for i in o.items]
-            }
-            for o in orders
-        ]
+        page = None
+        if not (cursor or status_filter or customer_id):
+            page = read_model.recent_page(limit)
+            if page is None and limit <= read_model.recent_size:
+                # Carga inicial de la vista: una sola vez, después se mantiene con los eventos.
+                recent, more = repository.list_orders(limit=read_model.recent_size)
+                read_model.load_recent(recent, has_more=more is not None)
+                page = read_model.recent_page(limit)
+        if page is not None:
+            orders, has_more = page
+            next_cursor = repository.encode_cursor(orders[-1]) if has_more and orders else None
+        else:
+            orders, next_cursor = repository.list_orders(limit=limit, cursor=cursor, status=status_filter,
+                                                         customer_id=customer_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return _conditional_json([_order_summary(o) for o in orders], page_etag(orders, next_cursor),
+                             if_none_match, headers)
+
+@app.get("/orders/export")
+def export_orders(
+    fmt: str = Query("ndjson", alias="format"),
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    gzip: bool = False,
+    user_payload: dict = Depends(verify_token)
+):
+    # Export para conciliación: todas las órdenes de [from, to) en NDJSON o CSV (?gzip=true
+    # comprime). Se transmite lote por lote desde un cursor del servidor: memoria constante y
+    # primer byte en milisegundos aunque el rango tenga millones de órdenes.
+    # Ej: GET /orders/export?format=csv&from=2024-01-01&to=2024-02-01&gzip=true
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {fmt} (use {', '.join(EXPORT_FORMATS)})")
+    chunks = repository.stream_order_rows(created_from, created_to, status_filter, ORDER_EXPORT_CHUNK_SIZE)
+    body = encode_export(repository.EXPORT_COLUMNS, chunks, fmt, compress=gzip)
+    filename = f"orders.{fmt}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    # Se entrega como archivo .gz (sin Content-Encoding): el cliente guarda exactamente lo comprimido.
+    media_type = "application/gzip" if gzip else EXPORT_FORMATS[fmt]
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+def _sse(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/orders/events")
+async def order_events(request: Request, order_id: Optional[str] = None):
+    # Server-Sent Events con los cambios de estado (OrderConfirmed / OrderRejected) a medida que
+    # llegan al consumidor. ?order_id=... filtra una sola orden y arranca con su estado actual.
+    # Declarado antes de /orders/{order_id} para que "events" no se tome como un id.
+    try:
+        subscription = status_notifier.subscribe(order_id)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def stream():
+        try:
+            if order_id:
+                order = read_model.get(order_id) or await run_in_threadpool(repository.get_by_id, order_id)
+                if order is not None:
+                    yield _sse({"order_id": order_id, "status": order.status, "final": order.status in FINAL_STATES})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), ORDER_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies.
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            status_notifier.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/orders/{order_id}/await")
+async def await_order(order_id: str, timeout: float = Query(30.0, ge=0)):
+    # Long-poll: responde apenas la orden llega a CONFIRMED/REJECTED, o con final=false al
+    # vencer el timeout (el cliente vuelve a llamar). No ocupa un hilo mientras espera.
+    try:
+        waiter = status_notifier.register_waiter(order_id)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        order = read_model.get(order_id)
+        if order is None:
+            try:
+                order = await run_in_threadpool(repository.get_by_id, order_id)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            if order is None:
+                raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+            read_model.put(order)
+        current = order.status
+        if current not in FINAL_STATES:
+            try:
+                current = await asyncio.wait_for(waiter, min(timeout, ORDER_AWAIT_MAX_TIMEOUT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        status_notifier.discard_waiter(order_id, waiter)
+    return {"order_id": order_id, "status": current, "final": current in FINAL_STATES}
+
+@app.get("/orders/{order_id}")
+def get_order(order_id: str, if_none_match: Optional[str] = Header(None, alias="If-None-Match")):
+    # Vista de lectura primero; en un miss se lee de Postgres y se guarda para las siguientes.
+    order = read_model.get(order_id)
+    if order is None:
+        try:
+            order = repository.get_by_id(order_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if order is None:
+            raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+        read_model.put(order)
+    body = {
+        **_order_summary(order),
+        "items": [{"product_id": i.product_id, "quantity": i.quantity, "price": i.price} for i in order.items]
+    }
+    return _conditional_json(body, order_etag(order), if_none_match)
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "publisher_pool": publisher.pool_stats(), "compression": publisher.compression_stats(),
+            "outbox": outbox_relay.stats(), "read_model": read_model.stats(),
+            "status_subscriptions": status_notifier.stats()}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -16,3 +16,8 @@ class EventPublisher(ABC):
     @abstractmethod
     def publish(self, topic: str, event_type: str, data: dict):
         pass
+
+    def publish_batch(self, events: list):
+        """Publishes several (topic, event_type, data) events. Defaults to one by one."""
+        for topic, event_type, data in events:
+            self.publish(topic, event_type, data)
@@ -0,0 +1,71 @@
+import threading
+import time
+import pybreaker
+
+def _replay(outcome):
+    succeeded, value = outcome
+    if succeeded:
+        return value
+    raise value
+
+class ConcurrentCircuitBreaker(pybreaker.CircuitBreakerListener):
+    """
+    Lets several gateway calls run at once without changing the pybreaker state machine.
+
+    pybreaker holds its lock for the whole guarded call, so decorating a 0.5s gateway call
+    with @breaker serializes every payment no matter how many consumer workers there are.
+    Here the real call runs outside that lock and its outcome is then replayed through
+    breaker.call(), so counters, trips, CircuitBreakerError and excluded exceptions behave
+    exactly as with the decorator:
+
+    - closed: calls run concurrently; the call that reaches fail_max raises CircuitBreakerError.
+    - open: calls fail fast with CircuitBreakerError until reset_timeout elapses.
+    - half-open (timeout elapsed): ONE trial call at a time, like the serial decorator; the
+      others fail fast. The trial's outcome closes or re-opens the breaker.
+
+    A call that was already in flight when another one tripped the breaker reports its own
+    outcome (the charge did happen) and does not touch the breaker counters.
+    """
+    def __init__(self, breaker: pybreaker.CircuitBreaker):
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        # Already open (e.g. shared breaker): count the reset timeout from now.
+        self._opened_at = time.monotonic() if breaker.current_state == pybreaker.STATE_OPEN else None
+        self._trial_in_progress = False
+        breaker.add_listener(self)
+
+    def state_change(self, cb, old_state, new_state):
+        # Runs inside breaker.call (under self._lock): track when the breaker opened.
+        if new_state.name == pybreaker.STATE_OPEN:
+            self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        trial = self._admit()
+        try:
+            try:
+                outcome = (True, func(*args, **kwargs))
+            except Exception as e:
+                outcome = (False, e)
+            with self._lock:
+                if not trial and self.breaker.current_state != pybreaker.STATE_CLOSED:
+                    # Opened by other calls while this one was in flight.
+                    return _replay(outcome)
+                return self.breaker.call(_replay, outcome)
+        finally:
+            if trial:
+                with self._lock:
+                    self._trial_in_progress = False
+
+    def _admit(self) -> bool:
+        # Returns True if this call is the half-open trial; raises CircuitBreakerError to fail fast.
+        with self._lock:
+            state = self.breaker.current_state
+            if state == pybreaker.STATE_CLOSED:
+                return False
+            if (state == pybreaker.STATE_OPEN and self._opened_at is not None
+                    and time.monotonic() < self._opened_at + self.breaker.reset_timeout):
+                raise pybreaker.CircuitBreakerError("Timeout not elapsed yet, circuit breaker still open")
+            if self._trial_in_progress:
+                raise pybreaker.CircuitBreakerError("Trial call in progress, circuit breaker half-open")
+            self._trial_in_progress = True
+            return True
@@ -2,6 +2,7 @@ import random
 import time
 import pybreaker
 from ...domain.ports import PaymentGateway
+from .circuit_breaker import ConcurrentCircuitBreaker
 
 # Configure Circuit Breaker
 # Opens after 3 consecutive failures.
@@ -10,11 +11,16 @@ db_breaker = pybreaker.CircuitBreaker(
     fail_max=3,
     reset_timeout=10
 )
+# Same breaker, but charges run concurrently (the @db_breaker decorator would hold the
+# breaker lock during the 0.5s call and serialize every consumer worker).
+gateway_breaker = ConcurrentCircuitBreaker(db_breaker)
 
 class MockPaymentGateway(PaymentGateway):
     
-    @db_breaker
     def charge(self, order_id: str, amount: float) -> str:
+        return gateway_breaker.call(self._charge, order_id, amount)
+
+    def _charge(self, order_id: str, amount: float) -> str:
         """
         Simulates an external payment call.
         Includes simulated failures to test Resiliency/Circuit Breaker.
@@ -1,84 +1,78 @@
-import pika
-import json
 import pybreaker
 from ...application.services import ProcessPaymentUseCase
 from ...domain.ports import PaymentGateway
 from .rabbitmq_publisher import RabbitMQPublisher
 from .mock_payment_gateway import MockPaymentGateway
+from shared.infrastructure.messaging import connection_from_url, channel_pool_from_url, BaseConsumer
+from shared.infrastructure.codecs import get_codec
+from shared.infrastructure.compression import get_compressor, DEFAULT_THRESHOLD_BYTES
+from shared.infrastructure.dedup import EventDeduplicator
 
-DLX_NAME = "integrahub_dlx"
-DLQ_NAME = "payment_dlq"
-MAIN_EXCHANGE = "integrahub_exchange"
-MAIN_QUEUE = "payment_queue"
+SERVICE_NAME = "payment"  # => payment_queue / payment_dlq / payment_dlq_key
 
 class RabbitMQConsumer:
-    def __init__(self, amqp_url: str):
+    def __init__(self, amqp_url: str, publisher_confirms: bool = False, workers: int = 0, prefetch_count: int = None,
+                 codec: str = None, compression: str = None,
+                 compression_threshold: int = DEFAULT_THRESHOLD_BYTES, gateway: PaymentGateway = None,
+                 deduplicator: EventDeduplicator = None, ordered_acks: bool = True):
         self.amqp_url = amqp_url
-        self.connection = None
-        self.channel = None
-        # Dependencies
-        self.gateway = MockPaymentGateway()
+        self.publisher_confirms = publisher_confirms
+        self.codec = get_codec(codec)
+        self.compressor = get_compressor(compression, compression_threshold)
+        self.connection_wrapper = connection_from_url(amqp_url)
+        # Shared consumer: DLX/DLQ topology, QoS and (optional) worker pool.
+        # workers = payments in flight (the gateway call is I/O bound and runs outside the
+        # circuit breaker lock, see circuit_breaker.py).
+        # ordered_acks: acks/DLQ rejections still go out in delivery order, as with one worker.
+        # deduplicator: a redelivered InventoryReserved (same event_id) is acked without
+        # charging the gateway again.
+        self.consumer = BaseConsumer(self.connection_wrapper, SERVICE_NAME,
+                                     prefetch_count=prefetch_count, workers=workers, deduplicator=deduplicator,
+                                     ordered_acks=ordered_acks)
+        # Handlers may run on worker threads: publish through a channel pool.
+        self.publisher_pool = channel_pool_from_url(amqp_url, max_size=max(1, workers))
+        # Dependencies (the gateway can be injected, e.g. a fake one in benchmarks)
+        self.gateway = gateway or MockPaymentGateway()
 
     def connect(self):
-        params = pika.URLParameters(self.amqp_url)
-        self.connection = pika.BlockingConnection(params)
-        self.channel = self.connection.channel()
-
-        # 1. Topology
-        self.channel.exchange_declare(exchange=DLX_NAME, exchange_type='direct', durable=True)
-        self.channel.queue_declare(queue=DLQ_NAME, durable=True)
-        self.channel.queue_bind(queue=DLQ_NAME, exchange=DLX_NAME, routing_key="payment_dlq_key")
-
-        self.channel.exchange_declare(exchange=MAIN_EXCHANGE, exchange_type='topic', durable=True)
-        
-        args = {
-            'x-dead-letter-exchange': DLX_NAME,
-            'x-dead-letter-routing-key': 'payment_dlq_key'
-        }
-        self.channel.queue_declare(queue=MAIN_QUEUE, durable=True, arguments=args)
+        # 1. Topology (DLX/DLQ + main queue, BaseConsumer)
+        self.consumer.setup_topology()
         
         # 2. Bind - Listen to InventoryReserved
-        self.channel.queue_bind(exchange=MAIN_EXCHANGE, queue=MAIN_QUEUE, routing_key="inventory.InventoryReserved")
-        
-        self.channel.basic_qos(prefetch_count=1)
+        self.consumer.bind_event("inventory.InventoryReserved")
 
     def start_consuming(self):
         self.connect()
-        publisher = RabbitMQPublisher(channel=self.channel)
+        publisher = RabbitMQPublisher(self.publisher_pool, confirm_delivery=self.publisher_confirms, codec=self.codec,
+                                      compressor=self.compressor)
         use_case = ProcessPaymentUseCase(self.gateway, publisher)
 
-        print(f" [*] Waiting for messages in {MAIN_QUEUE}")
+        def callback(data: dict, correlation_id: str):
+            print(f" [x] Received {data}")
+            # Extract needed data. 
+            # Note: InventoryReserved might not contain amount if it wasn't passed down.
+            # Assuming the event chain carries E2E context or we query Order Service.
+            # For this implementation, we assume Inventory Service passed the original order data inside 'data'
+            # OR we Mock the amount if missing just to demonstrate the Payment Logic.
+            
+            event_data = data.get("data", {})
+            order_id = event_data.get("order_id")
+            
+            # Hack: In a real system, InventoryReserved usually echoes the full order 
+            # or we fetch Order details. To stick to P2P flow without extra lookups:
+            # We assume 'total_amount' is somehow propagated or we fake it.
+            amount = event_data.get("total_amount", 100.0) 
 
-        def callback(ch, method, properties, body):
-            print(f" [x] Received {body}")
             try:
-                data = json.loads(body)
-                # Extract needed data. 
-                # Note: InventoryReserved might not contain amount if it wasn't passed down.
-                # Assuming the event chain carries E2E context or we query Order Service.
-                # For this implementation, we assume Inventory Service passed the original order data inside 'data'
-                # OR we Mock the amount if missing just to demonstrate the Payment Logic.
-                
-                event_data = data.get("data", {})
-                order_id = event_data.get("order_id")
-                
-                # Hack: In a real system, InventoryReserved usually echoes the full order 
-                # or we fetch Order details. To stick to P2P flow without extra lookups:
-                # We assume 'total_amount' is somehow propagated or we fake it.
-                amount = event_data.get("total_amount", 100.0) 
-
                 use_case.execute(order_id, amount)
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-
             except pybreaker.CircuitBreakerError:
                 print(" [!] Circuit Breaker OPEN. Rejecting message to DLQ.")
-                # Rejecting without requeue sends to DLQ
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                # Re-raise: BaseConsumer rejects without requeue, which sends to DLQ
+                raise
 
-            except Exception as e:
-                print(f" [!] Unexpected error: {e}")
-                # For non-circuit errors (e.g. malformed JSON), also DLQ or retry
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            # For non-circuit errors (e.g. malformed JSON) BaseConsumer also NACKs to DLQ
 
-        self.channel.basic_consume(queue=MAIN_QUEUE, on_message_callback=callback)
-        self.channel.start_consuming()
+        try:
+            self.consumer.start_consuming(callback)
+        finally:
+            self.publisher_pool.close()
@@ -1,31 +1,22 @@
-import json
-import pika
-import os
 from ...domain.ports import EventPublisher
+from shared.infrastructure.messaging import BasePublisher
+from shared.infrastructure.codecs import EventCodec
+from shared.infrastructure.compression import PayloadCompressor
 
 class RabbitMQPublisher(EventPublisher):
-    def __init__(self, channel=None):
-        self.channel = channel
-        self.exchange = 'integrahub_exchange'
-        # If channel not provided, we might need to create one, 
-        # but usually we share from consumer in this simple setup.
+    def __init__(self, connection, confirm_delivery: bool = False, codec: EventCodec = None,
+                 compressor: PayloadCompressor = None):
+        # connection: RabbitMQConnection or RabbitMQChannelPool (required when the
+        # consumer runs handlers on worker threads).
+        # confirm_delivery=True waits for the broker to confirm each published event.
+        # codec: body serialization (None => fastest available JSON codec).
+        # compressor: optional gzip/zstd compression of large bodies (None => disabled).
+        self.publisher = BasePublisher(connection, confirm_delivery=confirm_delivery, codec=codec,
+                                       compressor=compressor)
 
     def publish(self, topic: str, event_type: str, data: dict):
-        if not self.channel:
-            print("Constructor Warning: No channel provided for publisher")
-            return
+        self.publisher.publish(topic, event_type, data)
 
-        routing_key = f"{topic}.{event_type}"
-        message = {
-            "event_type": event_type,
-            "data": data
-        }
-        
-        self.channel.basic_publish(
-            exchange=self.exchange,
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,
-            )
-        )
+    def publish_batch(self, events: list):
+        # One broker confirmation for the whole batch
+        self.publisher.publish_batch(events)
@@ -1,17 +1,65 @@
 import os
-import time
 from .adapters.rabbitmq_consumer import RabbitMQConsumer
+from shared.infrastructure.metrics import start_metrics_server, register_pool_metrics
+from shared.infrastructure.readiness import StartupReadiness, probe_postgres, probe_rabbitmq
+from shared.infrastructure.dedup import EventDeduplicator, SqlProcessedEventStore
 
 def main():
     print("Starting Payment Service...")
     
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
     AMQP_URL = f"amqp://user:password@{RABBITMQ_HOST}:5672/%2f"
+    DB_HOST = os.getenv("DB_HOST", "localhost")
+    DATABASE_URL = f"postgresql://user:password@{DB_HOST}:5432/integrahub_db"
+    PUBLISHER_CONFIRMS = os.getenv("RABBITMQ_PUBLISHER_CONFIRMS", "true").lower() == "true"
+    # Payments in flight: the gateway call is I/O bound (0.5s in the mock) and the circuit
+    # breaker no longer serializes it, so throughput scales with this limit.
+    CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "16"))
+    CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "0")) or None
+    # Body codec for published events: json / orjson / msgpack (empty => fastest available JSON)
+    EVENT_CODEC = os.getenv("EVENT_CODEC") or None
+    # Optional gzip/zstd compression for published bodies >= threshold (empty => disabled)
+    PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION") or None
+    COMPRESSION_THRESHOLD_BYTES = int(os.getenv("COMPRESSION_THRESHOLD_BYTES", "1024"))
+    # Prometheus exposition (GET /metrics) on a separate port; 0 disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+    # Event deduplication by event_id (LRU + processed_events table): a redelivered
+    # InventoryReserved is not charged twice. Requires Postgres (DB_HOST) when enabled.
+    EVENT_DEDUP = os.getenv("EVENT_DEDUP", "false").lower() == "true"
+    EVENT_DEDUP_CACHE_SIZE = int(os.getenv("EVENT_DEDUP_CACHE_SIZE", "100000"))
+    EVENT_DEDUP_TTL_HOURS = float(os.getenv("EVENT_DEDUP_TTL_HOURS", "24"))
+    EVENT_DEDUP_COMPACTION_SECONDS = float(os.getenv("EVENT_DEDUP_COMPACTION_SECONDS", "600"))
+    EVENT_DEDUP_LEASE_SECONDS = float(os.getenv("EVENT_DEDUP_LEASE_SECONDS", "30"))
+    # Max seconds to wait for dependencies at startup (probed with backoff, no fixed sleep)
+    STARTUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_TIMEOUT_SECONDS", "60"))
 
-    # Simple wait for RabbitMQ
-    time.sleep(10)
-    
-    consumer = RabbitMQConsumer(amqp_url=AMQP_URL)
+    # Wait for RabbitMQ only as long as it actually needs (/health/live and /health/ready on METRICS_PORT)
+    checks = {"rabbitmq": probe_rabbitmq(AMQP_URL)}
+    if EVENT_DEDUP:
+        checks["postgres"] = probe_postgres(DATABASE_URL)
+    readiness = StartupReadiness(checks, timeout=STARTUP_TIMEOUT_SECONDS)
+    start_metrics_server(METRICS_PORT, readiness=readiness)
+    readiness.wait()
+
+    deduplicator = None
+    if EVENT_DEDUP:
+        deduplicator = EventDeduplicator("payment", SqlProcessedEventStore(DATABASE_URL),
+                                         cache_size=EVENT_DEDUP_CACHE_SIZE, ttl_seconds=EVENT_DEDUP_TTL_HOURS * 3600,
+                                         lease_seconds=EVENT_DEDUP_LEASE_SECONDS)
+        deduplicator.start_compaction(EVENT_DEDUP_COMPACTION_SECONDS)
+
+    consumer = RabbitMQConsumer(
+        amqp_url=AMQP_URL,
+        publisher_confirms=PUBLISHER_CONFIRMS,
+        workers=CONSUMER_WORKERS,
+        prefetch_count=CONSUMER_PREFETCH,
+        codec=EVENT_CODEC,
+        compression=PAYLOAD_COMPRESSION,
+        compression_threshold=COMPRESSION_THRESHOLD_BYTES,
+        deduplicator=deduplicator
+    )
+    register_pool_metrics(consumer.publisher_pool, "payment_publisher")
+    readiness.mark_ready()
     
     try:
         consumer.start_consuming()
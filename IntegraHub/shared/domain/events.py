@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import uuid
 
 @dataclass
 class DomainEvent:
@@ -19,6 +20,60 @@ class DomainEvent:
             "data": self.data
         }
 
+# Integration Envelope (lo que viaja por el bus)
+
+ENVELOPE_VERSION = 1
+
+@dataclass
+class EventEnvelope(DomainEvent):
+    """
+    Sobre versionado y único para todos los eventos de integración.
+    Los campos de cabecera (event_id, event_type, timestamp, correlation_id, version)
+    también viajan como properties AMQP, así el consumidor puede leerlos sin
+    decodificar el payload completo (data).
+    """
+    version: int = ENVELOPE_VERSION
+
+    @classmethod
+    def create(cls, event_type: str, data: Dict[str, Any], correlation_id: Optional[str] = None) -> "EventEnvelope":
+        return cls(
+            event_id=str(uuid.uuid4()),
+            event_type=event_type,
+            correlation_id=correlation_id or str(uuid.uuid4()),
+            data=data
+        )
+
+    def header(self) -> Dict[str, Any]:
+        return {
+            "event_id": self.event_id,
+            "event_type": self.event_type,
+            "timestamp": self.timestamp.isoformat(),
+            "correlation_id": self.correlation_id,
+            "version": self.version
+        }
+
+    def to_dict(self):
+        body = super().to_dict()
+        body["version"] = self.version
+        return body
+
+    @classmethod
+    def from_dict(cls, body: Dict[str, Any]) -> "EventEnvelope":
+        # Tolerante con mensajes previos al sobre unificado (solo event_type + data,
+        # o "timestamp" no ISO): los campos ausentes toman valores por defecto.
+        try:
+            timestamp = datetime.fromisoformat(body["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            timestamp = datetime.utcnow()
+        return cls(
+            event_id=body.get("event_id") or "",
+            event_type=body.get("event_type") or "",
+            timestamp=timestamp,
+            correlation_id=body.get("correlation_id") or "",
+            data=body.get("data") or {},
+            version=body.get("version", 0)
+        )
+
 # Specific Schemas (Reference)
 
 @dataclass
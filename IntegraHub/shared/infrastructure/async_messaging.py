@@ -0,0 +1,267 @@
+"""
+async_messaging.py
+
+Variante asyncio (aio-pika) de la mensajería compartida, con las MISMAS convenciones de
+topología que messaging.py:
+
+- Exchange principal: topic (integrahub_exchange)
+- DLQ pattern: DLX (integrahub_dlx, direct) + {service}_dlq con routing key {service}_dlq_key
+- Cola principal {service}_queue con x-dead-letter-* apuntando al DLX
+- Routing key de publicación: {topic}.{event_type}
+
+Diferencia principal: los handlers son corrutinas que corren concurrentemente en un único
+event loop (hasta max_concurrency mensajes en vuelo), sin un hilo por mensaje ni hops al
+threadpool para publicar desde endpoints async de FastAPI.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+import aio_pika
+from .codecs import EventCodec, get_codec, decode_body
+from .compression import PayloadCompressor
+from .dedup import EventDeduplicator
+from .latency import HopLatencyTracker, HOP_LATENCIES, HANDLER, ACK
+from .messaging import (build_event, encode_envelope, envelope_properties, stamp_enqueued, retry_queue_name,
+                        count_retry_attempts, retry_queue_arguments,
+                        MESSAGES_PUBLISHED, MESSAGES_CONSUMED, MESSAGES_ACKED, MESSAGES_RETRIED,
+                        MESSAGES_NACKED, MESSAGES_DEAD_LETTERED)
+
+class AsyncRabbitMQConnection:
+    def __init__(self, amqp_url: str):
+        self.amqp_url = amqp_url
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+
+    async def connect(self) -> aio_pika.abc.AbstractRobustConnection:
+        if self.connection is None or self.connection.is_closed:
+            # connect_robust reconecta solo y restaura canales/colas/consumidores.
+            print(f" [RabbitMQ] Connecting (async) to {self.amqp_url.split('@')[-1]}...")
+            self.connection = await aio_pika.connect_robust(self.amqp_url)
+        return self.connection
+
+    async def channel(self, publisher_confirms: bool = True) -> aio_pika.abc.AbstractChannel:
+        connection = await self.connect()
+        return await connection.channel(publisher_confirms=publisher_confirms)
+
+    async def close(self):
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+
+class AsyncBasePublisher:
+    """
+    Publisher asyncio. Con publisher confirms, cada publish espera el Basic.Ack del broker
+    sin bloquear el event loop; publish_batch deja todo el lote en vuelo y espera sus confirms
+    en conjunto.
+    """
+    def __init__(self, connection: AsyncRabbitMQConnection, exchange_name: str = "integrahub_exchange",
+                 confirm_delivery: bool = True, codec: EventCodec = None,
+                 compressor: PayloadCompressor = None):
+        self.connection_wrapper = connection
+        self.exchange_name = exchange_name
+        self.confirm_delivery = confirm_delivery
+        self.codec = codec or get_codec()
+        self.compressor = compressor
+        self._exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+        # Se crea dentro del event loop (en Python 3.9 los locks se atan al loop de creación).
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _get_exchange(self) -> aio_pika.abc.AbstractExchange:
+        # Topología declarada una sola vez por canal (el canal robusto sobrevive reconexiones).
+        if self._exchange is None or self._channel.is_closed:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._exchange is None or self._channel.is_closed:
+                    self._channel = await self.connection_wrapper.channel(publisher_confirms=self.confirm_delivery)
+                    self._exchange = await self._channel.declare_exchange(
+                        self.exchange_name, aio_pika.ExchangeType.TOPIC, durable=True
+                    )
+        return self._exchange
+
+    def _build_message(self, topic: str, event_type: str, data: dict, correlation_id: str = None):
+        routing_key, envelope = build_event(topic, event_type, data, correlation_id)
+        body, content_encoding = encode_envelope(envelope, self.codec, self.compressor)
+        message = aio_pika.Message(
+            body=body,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            **envelope_properties(envelope, self.codec, content_encoding)
+        )
+        return routing_key, message
+
+    async def publish(self, topic: str, event_type: str, data: dict, correlation_id: str = None):
+        exchange = await self._get_exchange()
+        routing_key, message = self._build_message(topic, event_type, data, correlation_id)
+        stamp_enqueued(message.headers)
+        await exchange.publish(message, routing_key=routing_key)
+        MESSAGES_PUBLISHED.labels(self.exchange_name, event_type).inc()
+        print(f" [x] Sent {routing_key} (CorrId: {message.correlation_id})")
+
+    async def publish_batch(self, events: List[tuple]) -> int:
+        """
+        Publica varios eventos (topic, event_type, data[, correlation_id]) en paralelo y
+        espera todas sus confirmaciones. Lanza la primera excepción si algún mensaje falla.
+        """
+        exchange = await self._get_exchange()
+        messages = [self._build_message(*event) for event in events]
+        for _, message in messages:
+            stamp_enqueued(message.headers)
+        await asyncio.gather(*(exchange.publish(message, routing_key=routing_key) for routing_key, message in messages))
+        for _, message in messages:
+            MESSAGES_PUBLISHED.labels(self.exchange_name, message.type).inc()
+        print(f" [x] Sent batch of {len(messages)} events")
+        return len(messages)
+
+class AsyncBaseConsumer:
+    """
+    Consumidor asyncio con DLQ y binding automático (misma topología que BaseConsumer).
+
+    Hasta max_concurrency handlers corren a la vez como corrutinas; prefetch_count se
+    alinea con ese límite para que el broker no entregue más de lo que se puede procesar.
+    Handler OK => ACK; excepción => cola de delay del siguiente tier (retry_delays_ms)
+    o, agotados los tiers, NACK(requeue=False) => DLQ.
+    deduplicator => duplicados por event_id se confirman sin handler (ver dedup.py); las
+    consultas/marcas en la tabla corren en asyncio.to_thread.
+    """
+    def __init__(self, connection: AsyncRabbitMQConnection, service_name: str,
+                 exchange_name: str = "integrahub_exchange", max_concurrency: int = 100, use_dlq: bool = True,
+                 retry_delays_ms: List[int] = None, latency_tracker: HopLatencyTracker = None,
+                 deduplicator: EventDeduplicator = None):
+        self.connection_wrapper = connection
+        self.service_name = service_name
+        self.exchange_name = exchange_name
+        self.max_concurrency = max_concurrency
+        self.use_dlq = use_dlq
+        self.retry_delays_ms = list(retry_delays_ms or [])
+        # Histogramas queue_wait / handler / ack por (cola, event_type)
+        self.latency = latency_tracker or HOP_LATENCIES
+        self.deduplicator = deduplicator
+
+        self.dlx_name = "integrahub_dlx"
+        self.dlq_name = f"{service_name}_dlq"
+        self.queue_name = f"{service_name}_queue"
+
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self._exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._queue: Optional[aio_pika.abc.AbstractQueue] = None
+        self._consumer_tag: Optional[str] = None
+
+    async def setup_topology(self):
+        if self._queue is not None:
+            return
+        self._channel = await self.connection_wrapper.channel(publisher_confirms=False)
+        await self._channel.set_qos(prefetch_count=self.max_concurrency)
+
+        # 1. Main Exchange
+        self._exchange = await self._channel.declare_exchange(
+            self.exchange_name, aio_pika.ExchangeType.TOPIC, durable=True
+        )
+
+        # Colas de delay por tier (mismas convenciones que BaseConsumer)
+        for delay_ms in self.retry_delays_ms:
+            await self._channel.declare_queue(
+                retry_queue_name(self.service_name, delay_ms),
+                durable=True,
+                arguments=retry_queue_arguments(delay_ms, self.queue_name)
+            )
+
+        if not self.use_dlq:
+            self._queue = await self._channel.declare_queue(self.queue_name, durable=True)
+            return
+
+        # 2. DLX setup
+        dlx = await self._channel.declare_exchange(self.dlx_name, aio_pika.ExchangeType.DIRECT, durable=True)
+        dlq = await self._channel.declare_queue(self.dlq_name, durable=True)
+        await dlq.bind(dlx, routing_key=f"{self.service_name}_dlq_key")
+
+        # 3. Queue with DLQ config
+        args = {
+            'x-dead-letter-exchange': self.dlx_name,
+            'x-dead-letter-routing-key': f"{self.service_name}_dlq_key"
+        }
+        self._queue = await self._channel.declare_queue(self.queue_name, durable=True, arguments=args)
+
+    async def bind_event(self, routing_key: str):
+        await self.setup_topology()
+        await self._queue.bind(self._exchange, routing_key=routing_key)
+
+    async def _schedule_retry(self, message: aio_pika.abc.AbstractIncomingMessage) -> bool:
+        attempts = count_retry_attempts(message.headers, self.service_name)
+        if attempts >= len(self.retry_delays_ms):
+            return False
+        delay_ms = self.retry_delays_ms[attempts]
+        retry_message = aio_pika.Message(
+            body=message.body,
+            headers=message.headers,
+            content_type=message.content_type,
+            content_encoding=message.content_encoding,
+            correlation_id=message.correlation_id,
+            message_id=message.message_id,
+            type=message.type,
+            timestamp=message.timestamp,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+        )
+        await self._channel.default_exchange.publish(
+            retry_message, routing_key=retry_queue_name(self.service_name, delay_ms)
+        )
+        print(f" [~] Retry {attempts + 1}/{len(self.retry_delays_ms)} in {delay_ms}ms | CorrId: {message.correlation_id}")
+        return True
+
+    async def _begin_event(self, message: aio_pika.abc.AbstractIncomingMessage):
+        # Igual que BaseConsumer._begin_event: event_id, None (no aplica) o False (duplicado).
+        if self.deduplicator is None or not message.message_id:
+            return None
+        if await asyncio.to_thread(self.deduplicator.begin, message.message_id):
+            return message.message_id
+        print(f" [=] Duplicate event {message.message_id} ({message.type}) skipped")
+        return False
+
+    async def start_consuming(self, callback_function: Callable[[dict, str], Awaitable[None]]):
+        """Registra el consumidor y retorna; los mensajes se procesan en el event loop actual."""
+        await self.setup_topology()
+        # Límite de handlers concurrentes (creado dentro del event loop que consume).
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage):
+            async with semaphore:
+                print(f" [x] Received {message.routing_key} | CorrId: {message.correlation_id}")
+                MESSAGES_CONSUMED.labels(self.queue_name).inc()
+                self.latency.record_queue_wait(self.queue_name, message.type, message.headers)
+                started = time.perf_counter()
+                event_id = None
+                try:
+                    event_id = await self._begin_event(message)
+                    if event_id is not False:
+                        await callback_function(decode_body(message.body, message.content_type, message.content_encoding), message.correlation_id)
+                except Exception as e:
+                    handled_at = time.perf_counter()
+                    print(f" [!] Error processing: {e}")
+                    if event_id:
+                        await asyncio.to_thread(self.deduplicator.abort, event_id)
+                    if self.retry_delays_ms and await self._schedule_retry(message):
+                        await message.ack()
+                        MESSAGES_RETRIED.labels(self.queue_name).inc()
+                    else:
+                        # Reject -> DLQ (o descarte si la cola no tiene DLX)
+                        await message.nack(requeue=False)
+                        MESSAGES_NACKED.labels(self.queue_name).inc()
+                        if self.use_dlq:
+                            MESSAGES_DEAD_LETTERED.labels(self.queue_name).inc()
+                else:
+                    handled_at = time.perf_counter()
+                    if event_id:
+                        await asyncio.to_thread(self.deduplicator.complete, event_id)
+                    await message.ack()
+                    MESSAGES_ACKED.labels(self.queue_name).inc()
+                self.latency.record(self.queue_name, message.type, HANDLER, handled_at - started)
+                self.latency.record(self.queue_name, message.type, ACK, time.perf_counter() - handled_at)
+
+        self._consumer_tag = await self._queue.consume(on_message)
+        print(f" [*] Waiting for messages in {self.queue_name} (max_concurrency={self.max_concurrency})")
+
+    async def stop(self):
+        if self._queue is not None and self._consumer_tag is not None:
+            await self._queue.cancel(self._consumer_tag)
+            self._consumer_tag = None
+        if self._channel is not None and not self._channel.is_closed:
+            await self._channel.close()
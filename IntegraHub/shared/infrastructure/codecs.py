@@ -0,0 +1,113 @@
+"""
+codecs.py
+
+Codecs de serialización para el cuerpo de los eventos, seleccionados por content_type:
+
+- JsonCodec     (stdlib json)   application/json
+- OrjsonCodec   (orjson)        application/json     -> mismo formato, más rápido
+- MsgpackCodec  (msgpack)       application/msgpack  -> binario, más compacto
+
+orjson y msgpack son opcionales: si la librería no está instalada el codec no se registra.
+Para decodificar, "application/json" usa el codec JSON más rápido disponible, así un
+productor con stdlib y un consumidor con orjson siguen siendo compatibles.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from .compression import decompress
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # dependencia opcional
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+class EventCodec(ABC):
+    name: str = ""
+    content_type: str = ""
+
+    @abstractmethod
+    def encode(self, body: Dict[str, Any]) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        pass
+
+class JsonCodec(EventCodec):
+    name = "json"
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, body: Dict[str, Any]) -> bytes:
+        # separators compactos: sin espacios después de ',' y ':'
+        return json.dumps(body, separators=(",", ":")).encode()
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        return json.loads(payload)
+
+class OrjsonCodec(EventCodec):
+    name = "orjson"
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, body: Dict[str, Any]) -> bytes:
+        return orjson.dumps(body)
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        return orjson.loads(payload)
+
+class MsgpackCodec(EventCodec):
+    name = "msgpack"
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, body: Dict[str, Any]) -> bytes:
+        return msgpack.packb(body, use_bin_type=True)
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(payload, raw=False)
+
+# Registro de codecs disponibles
+_CODECS_BY_NAME: Dict[str, EventCodec] = {"json": JsonCodec()}
+if orjson is not None:
+    _CODECS_BY_NAME["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    _CODECS_BY_NAME["msgpack"] = MsgpackCodec()
+
+_DECODERS_BY_CONTENT_TYPE: Dict[str, EventCodec] = {
+    JSON_CONTENT_TYPE: _CODECS_BY_NAME.get("orjson", _CODECS_BY_NAME["json"])
+}
+if msgpack is not None:
+    _DECODERS_BY_CONTENT_TYPE[MSGPACK_CONTENT_TYPE] = _CODECS_BY_NAME["msgpack"]
+
+def available_codecs() -> Dict[str, EventCodec]:
+    return dict(_CODECS_BY_NAME)
+
+def get_codec(name: Optional[str] = None) -> EventCodec:
+    """Codec para publicar. Sin nombre => el JSON más rápido disponible."""
+    if not name:
+        return _DECODERS_BY_CONTENT_TYPE[JSON_CONTENT_TYPE]
+    try:
+        return _CODECS_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f"Unknown or unavailable event codec '{name}'. Available: {sorted(_CODECS_BY_NAME)}")
+
+def codec_for_content_type(content_type: Optional[str]) -> EventCodec:
+    """Codec para consumir. Mensajes sin content_type (productores antiguos) se tratan como JSON."""
+    if not content_type:
+        return _DECODERS_BY_CONTENT_TYPE[JSON_CONTENT_TYPE]
+    try:
+        return _DECODERS_BY_CONTENT_TYPE[content_type]
+    except KeyError:
+        raise ValueError(f"No codec registered for content_type '{content_type}'")
+
+def decode_body(payload: bytes, content_type: Optional[str] = None,
+                content_encoding: Optional[str] = None) -> Dict[str, Any]:
+    # content_encoding (gzip/zstd) se revierte antes de decodificar; ver compression.py.
+    return codec_for_content_type(content_type).decode(decompress(payload, content_encoding))
@@ -0,0 +1,136 @@
+"""
+compression.py
+
+Compresión opcional del cuerpo de los eventos (después del codec), señalizada con la
+property AMQP content_encoding:
+
+- gzip  (stdlib zlib)
+- zstd  (zstandard, opcional: si no está instalada el algoritmo no se registra)
+
+Solo se comprimen cuerpos de al menos threshold_bytes: en eventos chicos el costo de CPU
+no compensa. El consumidor descomprime siempre que content_encoding lo indique, tenga o
+no compresión habilitada para publicar.
+
+Los contadores (ratio, bytes, tiempo de CPU) son por proceso y thread-safe.
+"""
+
+import gzip
+import threading
+import time
+from typing import Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+GZIP_ENCODING = "gzip"
+ZSTD_ENCODING = "zstd"
+DEFAULT_THRESHOLD_BYTES = 1024
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compressed_total = 0
+        self.skipped_total = 0
+        self.bytes_in_total = 0
+        self.bytes_out_total = 0
+        self.compress_cpu_seconds_total = 0.0
+        self.decompressed_total = 0
+        self.decompress_cpu_seconds_total = 0.0
+
+    def record_compress(self, bytes_in: int, bytes_out: int, cpu_seconds: float):
+        with self._lock:
+            self.compressed_total += 1
+            self.bytes_in_total += bytes_in
+            self.bytes_out_total += bytes_out
+            self.compress_cpu_seconds_total += cpu_seconds
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped_total += 1
+
+    def record_decompress(self, cpu_seconds: float):
+        with self._lock:
+            self.decompressed_total += 1
+            self.decompress_cpu_seconds_total += cpu_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "compressed_total": self.compressed_total,
+                "skipped_total": self.skipped_total,
+                "bytes_in_total": self.bytes_in_total,
+                "bytes_out_total": self.bytes_out_total,
+                # bytes comprimidos / originales (menor es mejor); 1.0 si aún no se comprimió nada
+                "ratio": round(self.bytes_out_total / self.bytes_in_total, 4) if self.bytes_in_total else 1.0,
+                "compress_cpu_seconds_total": round(self.compress_cpu_seconds_total, 6),
+                "decompressed_total": self.decompressed_total,
+                "decompress_cpu_seconds_total": round(self.decompress_cpu_seconds_total, 6)
+            }
+
+# Contadores compartidos por todos los publishers/consumidores del proceso.
+STATS = CompressionStats()
+
+def _gzip_compress(payload: bytes, level: Optional[int]) -> bytes:
+    return gzip.compress(payload, compresslevel=6 if level is None else level)
+
+def _zstd_compress(payload: bytes, level: Optional[int]) -> bytes:
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(payload)
+
+def _zstd_decompress(payload: bytes) -> bytes:
+    # ZstdCompressor.compress escribe el tamaño original en el frame, así que no hace falta max_output_size.
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+_COMPRESSORS = {GZIP_ENCODING: _gzip_compress}
+_DECOMPRESSORS = {GZIP_ENCODING: gzip.decompress}
+if zstandard is not None:
+    _COMPRESSORS[ZSTD_ENCODING] = _zstd_compress
+    _DECOMPRESSORS[ZSTD_ENCODING] = _zstd_decompress
+
+def available_algorithms() -> list:
+    return sorted(_COMPRESSORS)
+
+class PayloadCompressor:
+    """Comprime cuerpos >= threshold_bytes con el algoritmo elegido (gzip o zstd)."""
+    def __init__(self, algorithm: str = GZIP_ENCODING, threshold_bytes: int = DEFAULT_THRESHOLD_BYTES,
+                 level: Optional[int] = None, stats: CompressionStats = None):
+        if algorithm not in _COMPRESSORS:
+            raise ValueError(f"Unknown or unavailable compression '{algorithm}'. Available: {available_algorithms()}")
+        self.algorithm = algorithm
+        self.threshold_bytes = threshold_bytes
+        self.level = level
+        self.stats = stats or STATS
+
+    def compress(self, payload: bytes) -> Tuple[bytes, Optional[str]]:
+        """Retorna (cuerpo, content_encoding). content_encoding=None => cuerpo sin comprimir."""
+        if len(payload) < self.threshold_bytes:
+            self.stats.record_skip()
+            return payload, None
+        started = time.thread_time()
+        compressed = _COMPRESSORS[self.algorithm](payload, self.level)
+        self.stats.record_compress(len(payload), len(compressed), time.thread_time() - started)
+        return compressed, self.algorithm
+
+def get_compressor(algorithm: Optional[str], threshold_bytes: int = DEFAULT_THRESHOLD_BYTES,
+                   level: Optional[int] = None) -> Optional[PayloadCompressor]:
+    """Compresor para publicar; sin algoritmo (None/"") la compresión queda deshabilitada."""
+    if not algorithm:
+        return None
+    return PayloadCompressor(algorithm, threshold_bytes=threshold_bytes, level=level)
+
+def decompress(payload: bytes, content_encoding: Optional[str], stats: CompressionStats = None) -> bytes:
+    """Descomprime según content_encoding; sin encoding (o "identity") retorna el cuerpo tal cual."""
+    if not content_encoding or content_encoding == "identity":
+        return payload
+    try:
+        decompressor = _DECOMPRESSORS[content_encoding]
+    except KeyError:
+        raise ValueError(f"No decompressor registered for content_encoding '{content_encoding}'")
+    started = time.thread_time()
+    body = decompressor(payload)
+    (stats or STATS).record_decompress(time.thread_time() - started)
+    return body
+
+def compression_stats() -> dict:
+    return STATS.snapshot()
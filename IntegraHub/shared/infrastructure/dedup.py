@@ -0,0 +1,302 @@
+"""
+dedup.py
+
+Deduplicación genérica de eventos por event_id (message_id AMQP) para los consumidores
+(BaseConsumer / AsyncBaseConsumer con deduplicator=...). Reemplaza los chequeos ad-hoc por
+servicio: un InventoryReserved re-entregado ya no cobra dos veces en payment, ni un
+OrderConfirmed re-entregado suma dos veces en analytics.
+
+Dos niveles:
+- L1 en proceso: LRU exacto de event_ids ya procesados + event_ids en vuelo. Un duplicado
+  reciente (re-entrega, re-publicación del outbox) se descarta sin ir a la DB.
+- L2 persistente: tabla processed_events (consumer, event_id, status, claim_id, processed_at),
+  compartida por las réplicas del consumidor y compactada por TTL (DELETE de filas más viejas
+  que ttl_seconds).
+
+Antes de llamar al handler el evento se RESERVA de forma atómica: INSERT de la fila con
+status "in_progress" (ON CONFLICT DO NOTHING). Solo la réplica cuyo INSERT entró procesa el
+evento; una copia entregada a otra réplica mientras tanto ve la reserva y falla con
+EventInProgressError, así sigue el camino de retry por tiers (no se confirma ni se descarta):
+en el reintento la fila ya dice "done" (duplicado) o ya no existe (la primera copia falló).
+Un consumidor sin tiers (payment) la manda al DLQ: queda estacionada, sin cobrarse dos veces.
+Si el handler termina bien la fila pasa a "done"; si falla se borra y la re-entrega se procesa.
+La reserva tiene un lease (lease_seconds): si la réplica que la tomó muere sin liberarla, otra
+la retoma cuando vence. Dentro de un proceso, una copia que llega mientras la primera está en
+vuelo se descarta: esa copia termina o se reintenta.
+
+NOTA: no hay filtro Bloom delante de la tabla. Con varias réplicas consumiendo la misma cola,
+un "no visto" del filtro local no es confiable (la primera copia pudo procesarla otra réplica) y
+un "visto" igual requiere confirmar en la DB; el LRU exacto ya cubre los duplicados recientes.
+"""
+
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from .metrics import counter
+
+DEDUP_LOOKUPS = counter("integrahub_dedup_lookups_total", "Event deduplication decisions",
+                        ["consumer", "result"])
+
+# Resultado de ProcessedEventStore.claim
+CLAIMED = "claimed"          # reserva tomada: procesar
+PROCESSED = "processed"      # ya procesado: duplicado
+IN_PROGRESS = "in_progress"  # reservado por otra réplica (lease vigente)
+
+IN_PROGRESS_STATUS = "in_progress"
+DONE_STATUS = "done"
+
+class EventInProgressError(RuntimeError):
+    """Otra réplica está procesando el evento: el consumidor lo reintenta más tarde."""
+    pass
+
+class ProcessedEventStore(ABC):
+    """Nivel persistente (L2). La implementación por defecto es SqlProcessedEventStore."""
+    @abstractmethod
+    def claim(self, consumer: str, event_id: str, claim_id: str, lease_seconds: float) -> str:
+        """Reserva atómica del evento: CLAIMED, PROCESSED o IN_PROGRESS."""
+        pass
+
+    @abstractmethod
+    def release(self, consumer: str, event_id: str, claim_id: str):
+        """Borra la reserva claim_id (el handler falló)."""
+        pass
+
+    @abstractmethod
+    def add(self, consumer: str, event_id: str):
+        """Marca el evento como procesado."""
+        pass
+
+    def compact(self, ttl_seconds: float) -> int:
+        return 0
+
+class SqlProcessedEventStore(ProcessedEventStore):
+    def __init__(self, db_url: str, table_name: str = "processed_events"):
+        # Import diferido: los servicios sin DB (p.ej. payment sin dedup) no necesitan SQLAlchemy.
+        from sqlalchemy import create_engine, inspect, text, MetaData, Table, Column, String, DateTime
+        from .metrics import instrument_engine
+
+        self.engine = create_engine(db_url)
+        instrument_engine(self.engine, "dedup")
+        metadata = MetaData()
+        self.table = Table(table_name, metadata,
+                           Column("consumer", String, primary_key=True),
+                           Column("event_id", String, primary_key=True),
+                           # in_progress (reservado, processed_at = inicio del lease) o done.
+                           # NULL en filas anteriores a la reserva atómica: equivale a done.
+                           Column("status", String),
+                           Column("claim_id", String),
+                           Column("processed_at", DateTime, index=True))
+        metadata.create_all(self.engine)
+        # create_all no modifica tablas que ya existían: las columnas agregadas después se crean acá.
+        existing = {info["name"] for info in inspect(self.engine).get_columns(table_name)}
+        with self.engine.begin() as connection:
+            for table_column in self.table.columns:
+                if table_column.name not in existing:
+                    column_type = table_column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {table_column.name} {column_type}"))
+
+    def _insert(self):
+        # INSERT ... ON CONFLICT DO NOTHING donde el dialecto lo soporta (PostgreSQL, SQLite).
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif self.engine.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return None
+        return insert(self.table).on_conflict_do_nothing(index_elements=["consumer", "event_id"])
+
+    def _key(self, consumer: str, event_id: str):
+        return (self.table.c.consumer == consumer) & (self.table.c.event_id == event_id)
+
+    def claim(self, consumer: str, event_id: str, claim_id: str, lease_seconds: float) -> str:
+        from sqlalchemy import insert, select, update
+        from sqlalchemy.exc import IntegrityError
+
+        now = datetime.utcnow()
+        row = {"consumer": consumer, "event_id": event_id, "status": IN_PROGRESS_STATUS,
+               "claim_id": claim_id, "processed_at": now}
+        statement = self._insert()
+        try:
+            with self.engine.begin() as connection:
+                if statement is not None:
+                    inserted = connection.execute(statement.values(**row)).rowcount == 1
+                else:
+                    connection.execute(insert(self.table).values(**row))
+                    inserted = True
+        except IntegrityError:
+            inserted = False
+        if inserted:
+            return CLAIMED
+
+        with self.engine.begin() as connection:
+            # Reserva de una réplica que murió sin liberarla: se retoma al vencer el lease
+            # (el UPDATE condicional lo gana una sola réplica).
+            taken_over = connection.execute(
+                update(self.table)
+                .where(self._key(consumer, event_id), self.table.c.status == IN_PROGRESS_STATUS,
+                       self.table.c.processed_at < now - timedelta(seconds=lease_seconds))
+                .values(claim_id=claim_id, processed_at=now)).rowcount == 1
+            if taken_over:
+                return CLAIMED
+            row = connection.execute(
+                select(self.table.c.status).where(self._key(consumer, event_id))).first()
+        if row is None:
+            # La otra copia falló y liberó la reserva recién: el reintento la toma.
+            return IN_PROGRESS
+        return IN_PROGRESS if row.status == IN_PROGRESS_STATUS else PROCESSED
+
+    def release(self, consumer: str, event_id: str, claim_id: str):
+        from sqlalchemy import delete
+
+        with self.engine.begin() as connection:
+            # Solo la propia reserva: si el lease venció y otra réplica la retomó, sigue siendo suya.
+            connection.execute(delete(self.table).where(
+                self._key(consumer, event_id), self.table.c.status == IN_PROGRESS_STATUS,
+                self.table.c.claim_id == claim_id))
+
+    def add(self, consumer: str, event_id: str):
+        from sqlalchemy import insert, update
+        from sqlalchemy.exc import IntegrityError
+
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            updated = connection.execute(
+                update(self.table).where(self._key(consumer, event_id))
+                .values(status=DONE_STATUS, processed_at=now)).rowcount
+        if updated:
+            return
+        try:
+            # Sin reserva previa (p.ej. compactada): se inserta ya procesado.
+            with self.engine.begin() as connection:
+                connection.execute(insert(self.table).values(consumer=consumer, event_id=event_id,
+                                                             status=DONE_STATUS, processed_at=now))
+        except IntegrityError:
+            # Otra réplica ya lo marcó: mismo resultado.
+            pass
+
+    def compact(self, ttl_seconds: float) -> int:
+        from sqlalchemy import delete
+
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        with self.engine.begin() as connection:
+            return connection.execute(delete(self.table).where(self.table.c.processed_at < cutoff)).rowcount
+
+class EventDeduplicator:
+    def __init__(self, consumer: str, store: Optional[ProcessedEventStore] = None, cache_size: int = 100000,
+                 ttl_seconds: float = 86400.0, lease_seconds: float = 30.0):
+        # consumer: nombre lógico (p.ej. "payment"); cada consumidor deduplica por separado.
+        # store: nivel persistente (None => solo LRU en proceso, no sobrevive reinicios).
+        # ttl_seconds: ventana de deduplicación del nivel persistente (compactación).
+        # lease_seconds: duración de la reserva en la tabla; debe superar al handler más lento.
+        self.consumer = consumer
+        self.store = store
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self._processed: "OrderedDict[str, None]" = OrderedDict()
+        # event_id -> claim_id de la reserva en la tabla (None sin store o mientras se reserva)
+        self._in_flight: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._stop_event = threading.Event()
+
+    def begin(self, event_id: str) -> bool:
+        """
+        True => procesar (queda "en vuelo" hasta complete/abort). False => duplicado: ACK sin handler.
+        Solo va a la DB si el evento no está en el LRU ni en vuelo. Lanza EventInProgressError si
+        otra réplica lo tiene reservado (el consumidor lo reintenta).
+        """
+        with self._lock:
+            if event_id in self._processed:
+                self._processed.move_to_end(event_id)
+                result = "cache_hit"
+            elif event_id in self._in_flight:
+                result = "in_flight"
+            else:
+                self._in_flight[event_id] = None
+                result = None
+        if result is None:
+            claim_id = str(uuid.uuid4())
+            try:
+                claim = (self.store.claim(self.consumer, event_id, claim_id, self.lease_seconds)
+                         if self.store is not None else CLAIMED)
+            except Exception:
+                self.abort(event_id)
+                raise
+            with self._lock:
+                if claim == CLAIMED:
+                    self._in_flight[event_id] = claim_id if self.store is not None else None
+                else:
+                    self._in_flight.pop(event_id, None)
+                    if claim == PROCESSED:
+                        self._remember(event_id)
+            if claim == CLAIMED:
+                DEDUP_LOOKUPS.labels(self.consumer, "new").inc()
+                return True
+            if claim == IN_PROGRESS:
+                DEDUP_LOOKUPS.labels(self.consumer, "claimed_elsewhere").inc()
+                raise EventInProgressError(f"Event {event_id} is being processed by another {self.consumer} replica")
+            result = "store_hit"
+        DEDUP_LOOKUPS.labels(self.consumer, result).inc()
+        return False
+
+    def complete(self, event_id: str):
+        """El handler terminó bien: se marca como procesado (LRU + tabla)."""
+        with self._lock:
+            self._in_flight.pop(event_id, None)
+            self._remember(event_id)
+        if self.store is not None:
+            try:
+                self.store.add(self.consumer, event_id)
+            except Exception as e:
+                # El efecto ya ocurrió: el mensaje se confirma igual. La reserva queda
+                # "in_progress": las copias en otras réplicas se reintentan hasta que vence el
+                # lease (el LRU de esta réplica sigue deduplicándolo).
+                print(f" [!] Could not persist processed event {event_id}: {e}")
+
+    def abort(self, event_id: str):
+        """El handler falló: se libera la reserva y la re-entrega (retry) debe procesarse."""
+        with self._lock:
+            claim_id = self._in_flight.pop(event_id, None)
+        if self.store is not None and claim_id is not None:
+            try:
+                self.store.release(self.consumer, event_id, claim_id)
+            except Exception as e:
+                # La reserva vence sola (lease): el retry la retoma entonces.
+                print(f" [!] Could not release claim of event {event_id}: {e}")
+
+    def _remember(self, event_id: str):
+        # Llamado con _lock tomado.
+        self._processed[event_id] = None
+        self._processed.move_to_end(event_id)
+        while len(self._processed) > self.cache_size:
+            self._processed.popitem(last=False)
+
+    def compact(self) -> int:
+        return self.store.compact(self.ttl_seconds) if self.store is not None else 0
+
+    def start_compaction(self, interval_seconds: float = 600.0) -> threading.Thread:
+        """Compactación periódica por TTL en un hilo daemon."""
+        def run():
+            while not self._stop_event.wait(interval_seconds):
+                try:
+                    removed = self.compact()
+                    if removed:
+                        print(f" [Dedup] {self.consumer}: compacted {removed} processed events")
+                except Exception as e:
+                    print(f" [!] Dedup compaction failed: {e}")
+
+        self._stop_event.clear()
+        self._compactor = threading.Thread(target=run, name=f"{self.consumer}-dedup-compaction", daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._processed), "in_flight": len(self._in_flight)}
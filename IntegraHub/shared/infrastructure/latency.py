@@ -0,0 +1,142 @@
+"""
+latency.py
+
+Histogramas de latencia estilo HDR (log-lineales) en memoria, para medir dónde se va el
+tiempo en cada salto del saga:
+
+- queue_wait: desde que el publisher entregó el mensaje al broker (header x-enqueued-at)
+              hasta que el handler del consumidor empieza a procesarlo
+- handler:    duración del callback del servicio
+- ack:        desde que termina el handler hasta que el ACK/NACK/retry quedó enviado
+
+Cada histograma es por (cola, event_type, etapa). Los valores se guardan en microsegundos
+con ~1.5% de error relativo (64 sub-buckets por potencia de 2), en un dict disperso: el
+costo por registro es O(1) y la memoria crece solo con los rangos de valores observados.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Headers de tiempo agregados por el publisher (epoch en microsegundos)
+PUBLISHED_AT_HEADER = "x-published-at"
+ENQUEUED_AT_HEADER = "x-enqueued-at"
+
+QUEUE_WAIT = "queue_wait"
+HANDLER = "handler"
+ACK = "ack"
+
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKET_COUNT = 1 << _SUB_BUCKET_BITS  # 128
+_SUB_BUCKET_HALF = _SUB_BUCKET_COUNT >> 1   # 64
+
+def now_us() -> int:
+    return int(time.time() * 1_000_000)
+
+def _bucket_index(value: int) -> int:
+    # Valores < 128us exactos; después, 64 sub-buckets por cada potencia de 2.
+    if value < _SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BUCKET_BITS
+    return shift * _SUB_BUCKET_HALF + (value >> shift)
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < _SUB_BUCKET_COUNT:
+        return index
+    shift = index // _SUB_BUCKET_HALF - 1
+    sub_bucket = index - shift * _SUB_BUCKET_HALF
+    return ((sub_bucket + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Histograma thread-safe de latencias en microsegundos."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def record_us(self, value_us: int):
+        value_us = max(0, int(value_us))
+        index = _bucket_index(value_us)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.total_us += value_us
+            if self.min_us is None or value_us < self.min_us:
+                self.min_us = value_us
+            if value_us > self.max_us:
+                self.max_us = value_us
+
+    def record_seconds(self, seconds: float):
+        self.record_us(seconds * 1_000_000)
+
+    def percentile_us(self, pct: float) -> int:
+        with self._lock:
+            if not self.count:
+                return 0
+            target = max(1, int(round(pct / 100.0 * self.count)))
+            seen = 0
+            for index in sorted(self._counts):
+                seen += self._counts[index]
+                if seen >= target:
+                    # Cota superior del bucket, acotada por el máximo real observado.
+                    return min(_bucket_upper_bound(index), self.max_us)
+            return self.max_us
+
+    def snapshot(self) -> dict:
+        # Resumen en milisegundos (lo que se lee en logs / /health / benchmarks).
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_us / self.count / 1000.0, 3) if self.count else 0.0,
+            "min_ms": round((self.min_us or 0) / 1000.0, 3),
+            "p50_ms": round(self.percentile_us(50) / 1000.0, 3),
+            "p90_ms": round(self.percentile_us(90) / 1000.0, 3),
+            "p99_ms": round(self.percentile_us(99) / 1000.0, 3),
+            "max_ms": round(self.max_us / 1000.0, 3)
+        }
+
+class HopLatencyTracker:
+    """Histogramas por (cola, event_type, etapa)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+
+    def histogram(self, queue: str, event_type: str, stage: str) -> LatencyHistogram:
+        key = (queue, event_type or "unknown", stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def record_queue_wait(self, queue: str, event_type: str, headers: Optional[dict]):
+        # Reloj de pared entre procesos: asume relojes sincronizados (NTP); negativos => 0.
+        enqueued_at = (headers or {}).get(ENQUEUED_AT_HEADER)
+        if enqueued_at is not None:
+            self.histogram(queue, event_type, QUEUE_WAIT).record_us(now_us() - int(enqueued_at))
+
+    def record(self, queue: str, event_type: str, stage: str, seconds: float):
+        self.histogram(queue, event_type, stage).record_seconds(seconds)
+
+    def items(self):
+        with self._lock:
+            return list(self._histograms.items())
+
+    def snapshot(self) -> dict:
+        # {cola: {event_type: {etapa: resumen}}}
+        result: Dict[str, dict] = {}
+        for (queue, event_type, stage), histogram in sorted(self.items()):
+            result.setdefault(queue, {}).setdefault(event_type, {})[stage] = histogram.snapshot()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+# Tracker compartido por todos los consumidores del proceso.
+HOP_LATENCIES = HopLatencyTracker()
+
+def hop_latency_snapshot() -> dict:
+    return HOP_LATENCIES.snapshot()
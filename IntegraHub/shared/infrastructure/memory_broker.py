@@ -0,0 +1,493 @@
+"""
+memory_broker.py
+
+Transporte en memoria (un solo proceso) con la misma interfaz que RabbitMQConnection /
+BlockingChannel que usan BasePublisher y BaseConsumer. Pensado para benchmarks del saga
+completo y pruebas locales sin levantar RabbitMQ.
+
+Semántica soportada (la que usa la topología del proyecto):
+
+- Exchanges topic ("*" = una palabra, "#" = cero o más), direct y default exchange ("")
+- Colas compartidas entre consumidores (competing consumers) con prefetch por canal
+- ACK / NACK (requeue o dead-letter), ack/nack con multiple=True
+- Dead-lettering vía x-dead-letter-exchange / x-dead-letter-routing-key, con headers x-death
+- TTL por cola (x-message-ttl), usado por las colas de retry por tiers
+- add_callback_threadsafe para settle desde hilos worker
+- call_later / remove_timeout (timers en el hilo de start_consuming, como BlockingConnection)
+
+Se selecciona con URLs "memory://<nombre>" (ver connection_from_url en messaging.py):
+todas las conexiones a un mismo nombre comparten el broker.
+
+No hay persistencia ni publisher confirms reales: publicar es síncrono, así que
+confirm_delivery/tx_select/tx_commit son no-ops.
+"""
+
+import copy
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import pika
+from pika.spec import Basic
+
+DEFAULT_EXCHANGE = ""
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """Match de routing keys de exchanges topic: "*" = exactamente una palabra, "#" = cero o más."""
+    pattern_words = pattern.split(".") if pattern else []
+    key_words = routing_key.split(".") if routing_key else []
+
+    def match(p: int, k: int) -> bool:
+        if p == len(pattern_words):
+            return k == len(key_words)
+        word = pattern_words[p]
+        if word == "#":
+            # "#" puede consumir de 0 a todas las palabras restantes.
+            return any(match(p + 1, i) for i in range(k, len(key_words) + 1))
+        if k == len(key_words):
+            return False
+        return (word == "*" or word == key_words[k]) and match(p + 1, k + 1)
+
+    return match(0, 0)
+
+class _Message:
+    __slots__ = ("body", "properties", "exchange", "routing_key", "redelivered")
+
+    def __init__(self, body: bytes, properties: pika.BasicProperties, exchange: str, routing_key: str):
+        self.body = body
+        self.properties = properties
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.redelivered = False
+
+class _Queue:
+    def __init__(self, name: str, arguments: Optional[dict]):
+        self.name = name
+        self.arguments = dict(arguments or {})
+        self.messages = deque()
+        self.consumers = 0
+        self.unacked = 0  # entregados y todavía sin ACK/NACK (todos los canales)
+
+class InMemoryBroker:
+    _registry: Dict[str, "InMemoryBroker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self):
+        # Un solo Condition protege todo el estado y despierta a los canales consumidores.
+        self.condition = threading.Condition()
+        self._exchanges: Dict[str, str] = {DEFAULT_EXCHANGE: "direct"}
+        self._bindings: Dict[str, List[tuple]] = {}
+        self._queues: Dict[str, _Queue] = {}
+        self._published_total = 0
+        self._dead_lettered_total = 0
+
+    @classmethod
+    def named(cls, name: str = "default") -> "InMemoryBroker":
+        with cls._registry_lock:
+            broker = cls._registry.get(name)
+            if broker is None:
+                broker = cls._registry[name] = cls()
+            return broker
+
+    @classmethod
+    def reset(cls, name: str = None):
+        # Descarta un broker nombrado (o todos): el siguiente named() parte vacío.
+        with cls._registry_lock:
+            if name is None:
+                cls._registry.clear()
+            else:
+                cls._registry.pop(name, None)
+
+    # Topología
+
+    def exchange_declare(self, exchange: str, exchange_type: str = "direct"):
+        with self.condition:
+            declared = self._exchanges.setdefault(exchange, exchange_type)
+            if declared != exchange_type:
+                raise pika.exceptions.ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - exchange '{exchange}' is {declared}, not {exchange_type}"
+                )
+
+    def queue_declare(self, queue: str, arguments: dict = None):
+        with self.condition:
+            if queue not in self._queues:
+                self._queues[queue] = _Queue(queue, arguments)
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str):
+        with self.condition:
+            if exchange not in self._exchanges:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+            if queue not in self._queues:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+            binding = (routing_key, queue)
+            bindings = self._bindings.setdefault(exchange, [])
+            if binding not in bindings:
+                bindings.append(binding)
+
+    # Publicación / ruteo
+
+    def _route(self, exchange: str, routing_key: str) -> List[str]:
+        if exchange == DEFAULT_EXCHANGE:
+            return [routing_key] if routing_key in self._queues else []
+        exchange_type = self._exchanges.get(exchange)
+        if exchange_type is None:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+        queues = []
+        for pattern, queue in self._bindings.get(exchange, []):
+            matched = topic_matches(pattern, routing_key) if exchange_type == "topic" else pattern == routing_key
+            if matched and queue not in queues:
+                queues.append(queue)
+        return queues
+
+    def publish(self, exchange: str, routing_key: str, body: bytes, properties: pika.BasicProperties = None) -> int:
+        """Entrega una copia del mensaje a cada cola que matchea. Retorna la cantidad de colas."""
+        properties = properties or pika.BasicProperties()
+        with self.condition:
+            queues = self._route(exchange, routing_key)
+            for queue in queues:
+                self._enqueue(self._queues[queue], _Message(body, properties, exchange, routing_key))
+            self._published_total += 1
+            if queues:
+                self.condition.notify_all()
+            return len(queues)
+
+    def _enqueue(self, queue: _Queue, message: _Message):
+        queue.messages.append(message)
+        ttl_ms = queue.arguments.get("x-message-ttl")
+        if ttl_ms is not None:
+            timer = threading.Timer(ttl_ms / 1000.0, self._expire, args=(queue.name, message))
+            timer.daemon = True
+            timer.start()
+
+    def _expire(self, queue_name: str, message: _Message):
+        with self.condition:
+            queue = self._queues.get(queue_name)
+            if queue is None:
+                return
+            try:
+                queue.messages.remove(message)
+            except ValueError:
+                return  # ya fue consumido
+            self._dead_letter(queue, message, "expired")
+            self.condition.notify_all()
+
+    def _dead_letter(self, queue: _Queue, message: _Message, reason: str):
+        # Misma lógica que RabbitMQ: sin x-dead-letter-exchange el mensaje se descarta.
+        if "x-dead-letter-exchange" not in queue.arguments:
+            return
+        dlx = queue.arguments["x-dead-letter-exchange"]
+        routing_key = queue.arguments.get("x-dead-letter-routing-key", message.routing_key)
+
+        properties = copy.copy(message.properties)
+        headers = dict(properties.headers or {})
+        deaths = [dict(death) for death in headers.get("x-death") or []]
+        for death in deaths:
+            if death.get("queue") == queue.name and death.get("reason") == reason:
+                death["count"] = int(death.get("count", 1)) + 1
+                deaths.remove(death)
+                deaths.insert(0, death)
+                break
+        else:
+            deaths.insert(0, {
+                "count": 1,
+                "reason": reason,
+                "queue": queue.name,
+                "time": int(time.time()),
+                "exchange": message.exchange,
+                "routing-keys": [message.routing_key]
+            })
+        headers["x-death"] = deaths
+        properties.headers = headers
+        # Al expirar, el TTL deja de aplicar (como RabbitMQ al dead-letterear).
+        properties.expiration = None
+
+        self._dead_lettered_total += 1
+        for target in self._route(dlx, routing_key):
+            self._enqueue(self._queues[target], _Message(message.body, properties, dlx, routing_key))
+
+    # Consumo
+
+    def _pop(self, queue_name: str) -> Optional[_Message]:
+        queue = self._queues.get(queue_name)
+        if queue is None or not queue.messages:
+            return None
+        return queue.messages.popleft()
+
+    def _acked(self, queue_name: str):
+        queue = self._queues.get(queue_name)
+        if queue is not None:
+            queue.unacked -= 1
+
+    def _settle(self, queue_name: str, message: _Message, requeue: bool):
+        # NACK: requeue => vuelve al frente de la cola; si no => dead-letter.
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return
+        queue.unacked -= 1
+        if requeue:
+            message.redelivered = True
+            queue.messages.appendleft(message)
+        else:
+            self._dead_letter(queue, message, "rejected")
+
+    def consumer_count(self, queue: str) -> int:
+        with self.condition:
+            return self._queues[queue].consumers if queue in self._queues else 0
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "published_total": self._published_total,
+                "dead_lettered_total": self._dead_lettered_total,
+                "queues": {name: {"messages": len(queue.messages), "consumers": queue.consumers,
+                                  "unacked": queue.unacked}
+                           for name, queue in self._queues.items()}
+            }
+
+class InMemoryChannel:
+    """Subconjunto de pika BlockingChannel usado por BasePublisher/BaseConsumer."""
+    def __init__(self, connection: "InMemoryConnection", channel_number: int):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.is_open = True
+        self._prefetch_count = 0
+        self._consumers: List[tuple] = []  # (consumer_tag, queue, callback)
+        self._unacked: Dict[int, tuple] = {}  # delivery_tag -> (queue, message)
+        self._delivery_tags = itertools.count(1)
+        self._consuming = False
+        self._next_consumer = 0
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def _check_open(self):
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+
+    def exchange_declare(self, exchange: str, exchange_type: str = "direct", **kwargs):
+        self._check_open()
+        self.broker.exchange_declare(exchange, exchange_type)
+
+    def queue_declare(self, queue: str, arguments: dict = None, **kwargs):
+        self._check_open()
+        self.broker.queue_declare(queue, arguments)
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str = None, **kwargs):
+        self._check_open()
+        self.broker.queue_bind(queue, exchange, routing_key if routing_key is not None else queue)
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs):
+        self._prefetch_count = prefetch_count
+
+    def confirm_delivery(self):
+        # Publicar en memoria es síncrono: el mensaje ya está "confirmado" al retornar.
+        pass
+
+    def tx_select(self):
+        pass
+
+    def tx_commit(self):
+        pass
+
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes, properties: pika.BasicProperties = None,
+                      mandatory: bool = False):
+        self._check_open()
+        if isinstance(body, str):
+            body = body.encode()
+        routed = self.broker.publish(exchange, routing_key, body, properties)
+        if mandatory and not routed:
+            raise pika.exceptions.UnroutableError([])
+
+    def basic_consume(self, queue: str, on_message_callback: Callable, auto_ack: bool = False,
+                      consumer_tag: str = None, **kwargs) -> str:
+        self._check_open()
+        consumer_tag = consumer_tag or f"ctag{self.channel_number}.{len(self._consumers) + 1}"
+        with self.broker.condition:
+            if queue not in self.broker._queues:
+                raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+            self.broker._queues[queue].consumers += 1
+        self._consumers.append((consumer_tag, queue, on_message_callback, auto_ack))
+        return consumer_tag
+
+    def _tags_up_to(self, delivery_tag: int, multiple: bool) -> List[int]:
+        if not multiple:
+            return [delivery_tag] if delivery_tag in self._unacked else []
+        return [tag for tag in self._unacked if tag <= delivery_tag]
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self._check_open()
+        with self.broker.condition:
+            for tag in self._tags_up_to(delivery_tag, multiple):
+                queue, _ = self._unacked.pop(tag)
+                self.broker._acked(queue)
+            self.broker.condition.notify_all()
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True):
+        self._check_open()
+        with self.broker.condition:
+            for tag in self._tags_up_to(delivery_tag, multiple):
+                queue, message = self._unacked.pop(tag)
+                self.broker._settle(queue, message, requeue)
+            self.broker.condition.notify_all()
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True):
+        self.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def _next_delivery(self):
+        # Llamado con broker.condition tomado. Round-robin entre los consumidores del canal.
+        if self._prefetch_count and len(self._unacked) >= self._prefetch_count:
+            return None
+        for offset in range(len(self._consumers)):
+            index = (self._next_consumer + offset) % len(self._consumers)
+            consumer_tag, queue, callback, auto_ack = self._consumers[index]
+            message = self.broker._pop(queue)
+            if message is None:
+                continue
+            self._next_consumer = index + 1
+            delivery_tag = next(self._delivery_tags)
+            if not auto_ack:
+                self._unacked[delivery_tag] = (queue, message)
+                self.broker._queues[queue].unacked += 1
+            method = Basic.Deliver(consumer_tag=consumer_tag, delivery_tag=delivery_tag,
+                                   redelivered=message.redelivered, exchange=message.exchange,
+                                   routing_key=message.routing_key)
+            return callback, method, message
+        return None
+
+    def start_consuming(self):
+        """Loop de entrega: corre los callbacks en este hilo (como BlockingChannel)."""
+        self._consuming = True
+        while self._consuming and self.is_open:
+            self.connection._run_callbacks()
+            with self.broker.condition:
+                delivery = self._next_delivery() if self._consuming else None
+                if delivery is None:
+                    if not self.connection._has_callbacks():
+                        # El timeout cubre timers de TTL y cierres desde otros hilos.
+                        self.broker.condition.wait(timeout=self.connection._next_timer_wait(0.1))
+                    continue
+            callback, method, message = delivery
+            callback(self, method, message.properties, message.body)
+
+    def stop_consuming(self, consumer_tag: str = None):
+        self._consuming = False
+        with self.broker.condition:
+            self.broker.condition.notify_all()
+
+    def close(self):
+        if not self.is_open:
+            return
+        self._consuming = False
+        with self.broker.condition:
+            # Como RabbitMQ: los mensajes sin ACK vuelven a la cola al cerrar el canal.
+            for queue, message in self._unacked.values():
+                self.broker._settle(queue, message, requeue=True)
+            self._unacked.clear()
+            for _, queue, _, _ in self._consumers:
+                if queue in self.broker._queues:
+                    self.broker._queues[queue].consumers -= 1
+            self._consumers.clear()
+            self.is_open = False
+            self.broker.condition.notify_all()
+
+class InMemoryConnection:
+    """
+    Reemplazo de RabbitMQConnection (y de RabbitMQChannelPool: es thread-safe, así que
+    lease() entrega la misma conexión a todos los hilos).
+    """
+    def __init__(self, broker: InMemoryBroker = None, name: str = "default"):
+        self.broker = broker or InMemoryBroker.named(name)
+        self.host = f"memory://{name}"
+        # BaseConsumer usa connection_wrapper.connection.add_callback_threadsafe:
+        # esta clase cumple ambos roles (wrapper y conexión).
+        self.connection = self
+        self.channel: Optional[InMemoryChannel] = None
+        self.is_open = True
+        self._callbacks = deque()
+        # Timers de call_later: heap de (deadline, timer_id, callback)
+        self._timers = []
+        self._timer_ids = itertools.count(1)
+        self._cancelled_timers = set()
+        self._channel_numbers = itertools.count(1)
+        self._channels: List[InMemoryChannel] = []
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def _new_channel(self) -> InMemoryChannel:
+        channel = InMemoryChannel(self, next(self._channel_numbers))
+        self._channels = [c for c in self._channels if c.is_open] + [channel]
+        return channel
+
+    def connect(self):
+        self.is_open = True
+        if self.channel is None or not self.channel.is_open:
+            self.channel = self._new_channel()
+
+    def get_channel(self) -> InMemoryChannel:
+        self.connect()
+        return self.channel
+
+    def open_channel(self) -> InMemoryChannel:
+        self.connect()
+        return self._new_channel()
+
+    @contextmanager
+    def lease(self):
+        yield self
+
+    def is_healthy(self) -> bool:
+        return self.is_open
+
+    def add_callback_threadsafe(self, callback: Callable):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed.")
+        with self.broker.condition:
+            self._callbacks.append(callback)
+            self.broker.condition.notify_all()
+
+    def call_later(self, delay: float, callback: Callable) -> int:
+        # Solo desde el hilo que consume (igual que BlockingConnection.call_later).
+        timer_id = next(self._timer_ids)
+        heapq.heappush(self._timers, (time.monotonic() + delay, timer_id, callback))
+        return timer_id
+
+    def remove_timeout(self, timer_id: int):
+        self._cancelled_timers.add(timer_id)
+
+    def _next_timer_wait(self, default: float) -> float:
+        if not self._timers:
+            return default
+        return max(0.0, min(default, self._timers[0][0] - time.monotonic()))
+
+    def _has_callbacks(self) -> bool:
+        return bool(self._callbacks)
+
+    def _run_callbacks(self):
+        while self._timers and self._timers[0][0] <= time.monotonic():
+            _, timer_id, callback = heapq.heappop(self._timers)
+            if timer_id in self._cancelled_timers:
+                self._cancelled_timers.discard(timer_id)
+                continue
+            callback()
+        while True:
+            try:
+                callback = self._callbacks.popleft()
+            except IndexError:
+                return
+            callback()
+
+    def stats(self) -> dict:
+        return self.broker.stats()
+
+    def close(self):
+        for channel in self._channels:
+            channel.close()
+        self._channels = []
+        self.is_open = False
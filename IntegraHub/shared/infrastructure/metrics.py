@@ -0,0 +1,395 @@
+"""
+metrics.py
+
+Registro de métricas en proceso con exposición en formato texto de Prometheus (0.0.4),
+sin dependencias externas:
+
+- Counter / Gauge / Histogram con labels (los hijos por combinación de labels se cachean)
+- Collectors: funciones que generan muestras al momento del scrape (estadísticas de pools,
+  compresión, histogramas HDR de latency.py, etc.) sin costo en el hot path
+- start_metrics_server(port): endpoint HTTP mínimo (GET /metrics) en un hilo daemon, para
+  servicios worker que no tienen servidor HTTP (también /health/live y /health/ready)
+- instrument_engine(engine): tiempo de sesión de DB (connection checkout -> checkin)
+- instrument_fastapi(app): latencia de requests HTTP por método/ruta/status
+
+Costo por evento: un lookup de dict + un lock por incremento/observación.
+"""
+
+import bisect
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets por defecto (segundos): de 1ms a 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def sample_line(name: str, labels: Sequence[Tuple[str, str]], value: float) -> str:
+    return f"{name}{_format_labels(labels)} {_format_value(value)}"
+
+class _Metric(ABC):
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+
+    @abstractmethod
+    def _new_child(self):
+        pass
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        if not self.labelnames:
+            return [((), self._default)]
+        with self._lock:
+            return list(self._children.items())
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for values, child in self._items():
+            lines.extend(child.samples(self.name, list(zip(self.labelnames, values))))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name: str, labels) -> List[str]:
+        return [sample_line(name, labels, self._value)]
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock", "_function")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        # Valor calculado en el scrape (p.ej. conexiones en uso de un pool).
+        self._function = function
+
+    def samples(self, name: str, labels) -> List[str]:
+        value = self._function() if self._function is not None else self._value
+        return [sample_line(name, labels, value)]
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)  # último = +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def samples(self, name: str, labels) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(self._upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            lines.append(sample_line(f"{name}_bucket", labels + [("le", _format_value(float(upper_bound)))], cumulative))
+        lines.append(sample_line(f"{name}_sum", labels, total))
+        lines.append(sample_line(f"{name}_count", labels, cumulative))
+        return lines
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        # Idempotente: varios módulos (o instancias) pueden pedir la misma métrica.
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]):
+        """collector() retorna líneas de exposición (incluyendo # HELP / # TYPE)."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        for collector in collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                # Un collector roto no debe tumbar el scrape completo.
+                lines.append(f"# collector error: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+# Registro por defecto del proceso
+REGISTRY = MetricsRegistry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.counter(name, documentation, labelnames)
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+# Collectors estándar
+
+def _hop_latency_collector() -> List[str]:
+    # Histogramas HDR de latency.py expuestos como summary (cuantiles precalculados).
+    from .latency import HOP_LATENCIES
+    name = "integrahub_message_stage_seconds"
+    lines = [f"# HELP {name} Message latency per hop stage (queue_wait, handler, ack)",
+             f"# TYPE {name} summary"]
+    for (queue, event_type, stage), histogram in sorted(HOP_LATENCIES.items()):
+        labels = [("queue", queue), ("event_type", event_type), ("stage", stage)]
+        for quantile in (0.5, 0.9, 0.99):
+            lines.append(sample_line(name, labels + [("quantile", str(quantile))],
+                                     histogram.percentile_us(quantile * 100) / 1_000_000))
+        lines.append(sample_line(f"{name}_sum", labels, histogram.total_us / 1_000_000))
+        lines.append(sample_line(f"{name}_count", labels, histogram.count))
+    return lines
+
+def _compression_collector() -> List[str]:
+    from .compression import compression_stats
+    stats = compression_stats()
+    lines = []
+    for key, metric_type in (("compressed_total", "counter"), ("skipped_total", "counter"),
+                             ("bytes_in_total", "counter"), ("bytes_out_total", "counter"),
+                             ("compress_cpu_seconds_total", "counter"), ("decompressed_total", "counter"),
+                             ("decompress_cpu_seconds_total", "counter"), ("ratio", "gauge")):
+        name = f"integrahub_compression_{key}"
+        lines += [f"# HELP {name} Event body compression {key.replace('_', ' ')}",
+                  f"# TYPE {name} {metric_type}", sample_line(name, [], stats[key])]
+    return lines
+
+REGISTRY.register_collector(_hop_latency_collector)
+REGISTRY.register_collector(_compression_collector)
+
+def register_pool_metrics(pool, name: str, registry: MetricsRegistry = None):
+    """Gauges del uso de un pool con stats() (p.ej. RabbitMQChannelPool), leídos en el scrape."""
+    registry = registry or REGISTRY
+    for key in ("max_size", "created", "in_use", "idle", "leases_total", "waits_total",
+                "wait_seconds_total", "reconnects_total"):
+        gauge_metric = registry.gauge(f"integrahub_channel_pool_{key}", f"Channel pool {key.replace('_', ' ')}", ["pool"])
+        gauge_metric.labels(name).set_function(lambda key=key: pool.stats().get(key, 0))
+
+# Instrumentación de DB / HTTP
+
+def instrument_engine(engine, db: str, registry: MetricsRegistry = None):
+    """
+    Tiempo que cada sesión retiene una conexión del pool de SQLAlchemy (checkout -> checkin).
+    Incluye queries, commit y el trabajo hecho con la conexión tomada.
+    """
+    from sqlalchemy import event
+
+    registry = registry or REGISTRY
+    session_seconds = registry.histogram("integrahub_db_session_seconds",
+                                         "Time a DB connection is held by a session", ["db"]).labels(db)
+    checkouts = registry.counter("integrahub_db_checkouts_total", "DB pool connection checkouts", ["db"]).labels(db)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["integrahub_checkout_at"] = time.perf_counter()
+        checkouts.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("integrahub_checkout_at", None)
+        if started is not None:
+            session_seconds.observe(time.perf_counter() - started)
+
+    return engine
+
+def instrument_fastapi(app, registry: MetricsRegistry = None):
+    """Middleware de latencia HTTP; la ruta se etiqueta con su template (/orders/{order_id})."""
+    registry = registry or REGISTRY
+    request_seconds = registry.histogram("integrahub_http_request_duration_seconds",
+                                         "HTTP request latency", ["method", "route", "status"])
+
+    @app.middleware("http")
+    async def _metrics_middleware(request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            request_seconds.labels(request.method, path, status).observe(time.perf_counter() - started)
+
+    return app
+
+# Endpoint de exposición
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+    # StartupReadiness (readiness.py) para /health/live y /health/ready en workers sin API.
+    readiness = None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if self.readiness is not None and path in ("/health/live", "/health/ready"):
+            ok = self.readiness.is_live() if path == "/health/live" else self.readiness.is_ready()
+            self._send(200 if ok else 503, "application/json", json.dumps(self.readiness.status()).encode())
+            return
+        if path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        self._send(200, CONTENT_TYPE, self.registry.render().encode())
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Sin log por scrape.
+        pass
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = None,
+                         readiness=None) -> Optional[ThreadingHTTPServer]:
+    """
+    Sirve GET /metrics en un hilo daemon. port=0 deshabilita el endpoint.
+    readiness (StartupReadiness): agrega GET /health/live y GET /health/ready.
+    """
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY, "readiness": readiness})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        # Las métricas no deben impedir que el servicio arranque (p.ej. puerto ocupado en local).
+        print(f" [Metrics] Could not start endpoint on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f" [Metrics] Prometheus endpoint on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,154 @@
+"""
+readiness.py
+
+Arranque de servicios sin esperas fijas: en lugar de time.sleep(10) antes de conectar,
+cada servicio sondea sus dependencias (Postgres, RabbitMQ) en paralelo, con backoff
+exponencial (con jitter) y un deadline, y sigue apenas todas responden.
+
+- probe_postgres / probe_rabbitmq: sondas que abren y cierran una conexión real.
+- StartupReadiness: corre las sondas (wait() bloqueante o start_in_background() para APIs)
+  y expone el estado para los endpoints de salud:
+    liveness  => el proceso funciona (falla solo si se venció el deadline de arranque)
+    readiness => dependencias listas y servicio inicializado (recibir tráfico)
+- add_health_routes: GET /health/live y GET /health/ready en una app FastAPI. Los workers
+  sin API los exponen en el puerto de métricas (start_metrics_server(..., readiness=...)).
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict
+
+class DependencyTimeoutError(TimeoutError):
+    pass
+
+def probe_postgres(db_url: str, timeout: float = 3.0) -> Callable[[], None]:
+    """Sonda: conecta a la DB y ejecuta SELECT 1 (sin pool: no deja conexiones abiertas)."""
+    def probe():
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.pool import NullPool
+
+        connect_args = {"connect_timeout": max(1, int(timeout))} if db_url.startswith("postgresql") else {}
+        engine = create_engine(db_url, poolclass=NullPool, connect_args=connect_args)
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        finally:
+            engine.dispose()
+    return probe
+
+def probe_rabbitmq(amqp_url: str, timeout: float = 3.0) -> Callable[[], None]:
+    """Sonda: abre y cierra una conexión AMQP (memory://... siempre está listo)."""
+    def probe():
+        if amqp_url.startswith("memory://"):
+            return
+        import pika
+
+        parameters = pika.URLParameters(amqp_url)
+        parameters.connection_attempts = 1
+        parameters.socket_timeout = timeout
+        parameters.blocked_connection_timeout = timeout
+        pika.BlockingConnection(parameters).close()
+    return probe
+
+class StartupReadiness:
+    def __init__(self, checks: Dict[str, Callable[[], None]], timeout: float = 60.0,
+                 initial_delay: float = 0.1, max_delay: float = 5.0):
+        # checks: {nombre: sonda}; una sonda lista retorna, una no lista lanza excepción.
+        # timeout: deadline total del arranque (segundos).
+        self.checks = dict(checks)
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._dependencies = {name: {"ready": False, "attempts": 0, "seconds": None, "error": None}
+                              for name in self.checks}
+        self._ready = False
+        self._failed = None
+        self._started_at = None
+
+    def _wait_for(self, name: str, probe: Callable[[], None], deadline: float):
+        delay = self.initial_delay
+        while True:
+            try:
+                probe()
+                with self._lock:
+                    self._dependencies[name].update(ready=True, error=None,
+                                                    seconds=round(time.monotonic() - self._started_at, 3))
+                print(f" [Startup] {name} ready after {self._dependencies[name]['seconds']}s")
+                return
+            except Exception as e:
+                with self._lock:
+                    self._dependencies[name]["attempts"] += 1
+                    self._dependencies[name]["error"] = str(e) or type(e).__name__
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # Backoff exponencial con jitter (evita que todas las réplicas reintenten a la vez).
+            time.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+            delay = min(delay * 2, self.max_delay)
+
+    def wait(self):
+        """Espera a todas las dependencias en paralelo. Lanza DependencyTimeoutError al vencer el deadline."""
+        self._started_at = time.monotonic()
+        deadline = self._started_at + self.timeout
+        threads = [threading.Thread(target=self._wait_for, args=(name, probe, deadline),
+                                    name=f"startup-{name}", daemon=True)
+                   for name, probe in self.checks.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pending = {name: state["error"] for name, state in self._dependencies.items() if not state["ready"]}
+        if pending:
+            self._failed = f"Dependencies not ready after {self.timeout:g}s: {pending}"
+            raise DependencyTimeoutError(self._failed)
+
+    def mark_ready(self):
+        # Llamar después de inicializar el servicio (esquema, consumidores...), no solo al tener dependencias.
+        self._ready = True
+
+    def start_in_background(self, on_ready: Callable[[], None] = None) -> threading.Thread:
+        """
+        Para APIs: el servidor HTTP arranca enseguida (liveness responde) y /health/ready
+        pasa a 200 cuando las dependencias están listas y on_ready() terminó.
+        """
+        def run():
+            try:
+                self.wait()
+                if on_ready:
+                    on_ready()
+                self.mark_ready()
+            except Exception as e:
+                self._failed = self._failed or f"Startup failed: {e}"
+                print(f" [!] {self._failed}")
+
+        thread = threading.Thread(target=run, name="startup-readiness", daemon=True)
+        thread.start()
+        return thread
+
+    def is_live(self) -> bool:
+        return self._failed is None
+
+    def is_ready(self) -> bool:
+        return self._ready and self._failed is None
+
+    def status(self) -> dict:
+        with self._lock:
+            dependencies = {name: dict(state) for name, state in self._dependencies.items()}
+        return {"live": self.is_live(), "ready": self.is_ready(), "error": self._failed,
+                "dependencies": dependencies}
+
+def add_health_routes(app, readiness: StartupReadiness):
+    """GET /health/live y GET /health/ready (503 mientras no corresponda) en una app FastAPI."""
+    from fastapi.responses import JSONResponse
+
+    @app.get("/health/live")
+    def liveness():
+        return JSONResponse(status_code=200 if readiness.is_live() else 503, content=readiness.status())
+
+    @app.get("/health/ready")
+    def readiness_check():
+        return JSONResponse(status_code=200 if readiness.is_ready() else 503, content=readiness.status())
+
+    return app
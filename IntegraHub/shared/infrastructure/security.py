@@ -1,23 +1,92 @@
 import jwt
 from fastapi import HTTPException, Header, status
+import datetime
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from shared.infrastructure.metrics import counter
 
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecretkey")
 ALGORITHM = "HS256"
+# Cache de tokens ya verificados (0 => deshabilitado). Los tokens sin "exp" se guardan
+# como mucho JWT_CACHE_MAX_TTL_SECONDS.
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_MAX_TTL_SECONDS = float(os.getenv("JWT_CACHE_MAX_TTL_SECONDS", "300"))
+
+TOKEN_CACHE_LOOKUPS = counter("integrahub_jwt_cache_lookups_total", "Verified JWT cache lookups", ["result"])
+
+class VerifiedTokenCache:
+    """
+    LRU acotado de tokens ya verificados: digest SHA-256 del token -> (payload, expira).
+    Cada entrada vence en el "exp" del token (o max_ttl si no tiene), así un token vencido
+    nunca se acepta desde el cache. Solo se guardan verificaciones exitosas.
+    """
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300.0):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Digest en lugar del token: el cache no retiene credenciales utilizables.
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        TOKEN_CACHE_LOOKUPS.labels("hit" if entry is not None else "miss").inc()
+        return dict(entry[0]) if entry is not None else None
+
+    def put(self, token: str, payload: dict):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        with self._lock:
+            self._entries[self._key(token)] = (dict(payload), expires_at)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+token_cache = VerifiedTokenCache(max_size=JWT_CACHE_SIZE, max_ttl=JWT_CACHE_MAX_TTL_SECONDS)
 
 def verify_token(authorization: str = Header(...)):
     """
     Validates JWT token from Authorization header.
     Returns the payload if valid.
+    Tokens verified before (and not yet expired) are served from token_cache.
     """
     try:
         scheme, token = authorization.split()
         if scheme.lower() != 'bearer':
             raise HTTPException(status_code=401, detail="Invalid auth scheme")
-        
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            token_cache.put(token, payload)
         return payload
-        
+
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -30,3 +99,33 @@ def verify_token(authorization: str = Header(...)):
             detail=f"Invalid token: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+class ServiceTokenProvider:
+    """
+    Token de servicio reutilizable para llamadas internas (p.ej. demo_portal -> order_service).
+    Firma un JWT una vez y lo reutiliza hasta refresh_margin segundos antes de su "exp";
+    así el servidor también lo encuentra en su cache de tokens verificados.
+    """
+    def __init__(self, subject: str, claims: Dict = None, ttl_seconds: int = 600, refresh_margin: int = 60,
+                 secret_key: str = None):
+        self.subject = subject
+        self.claims = dict(claims or {})
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = min(refresh_margin, ttl_seconds // 2)
+        self.secret_key = secret_key or SECRET_KEY
+        self._token = None
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+
+    def token(self) -> str:
+        with self._lock:
+            if self._token is None or time.time() >= self._refresh_at:
+                now = datetime.datetime.utcnow()
+                payload = {**self.claims, "sub": self.subject, "iat": now,
+                           "exp": now + datetime.timedelta(seconds=self.ttl_seconds)}
+                self._token = jwt.encode(payload, self.secret_key, algorithm=ALGORITHM)
+                self._refresh_at = time.time() + self.ttl_seconds - self.refresh_margin
+            return self._token
+
+    def authorization_header(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token()}"}